@@ -1,8 +1,10 @@
 
 
+from functools import lru_cache
 from numba import jit
 import numpy as np
-np.random.seed(1)
+from biosim.parameters import Parameters, HerbivoreParams, CarnivoreParams
+from biosim.rng import get_rng
 
 __author__ = "Haris Karovic", "Isak Finnøy"
 __email__ = "harkarov@nmbu.no", "isfi@nmbu.no"
@@ -14,11 +16,22 @@ class Animals:
     Superclass that represents an animal. Contains all the features for for creating the animals.
     herbivores and carnivores are subclasses of this superclass.
 
+    The methods that draw random numbers take the stream to draw from as the argument rng, which
+    is the RandomPool of the cell the animal lives in, or any numpy.random.Generator. Without it,
+    the default generator of biosim.rng is used.
+
     Methods:
     ---------------
     _q
     set_params
+    with_params
+    species
+    from_arrays
+    _create
     set_has_migrated
+    fitness_batch
+    update_fitness_batch
+    mark_fitness_stale
     update_fitness
     eat
     yearly_weight loss
@@ -32,8 +45,16 @@ class Animals:
     slay
     eat_carn
     ---------------
+
+    The animals have no instance dictionary, only the slots below, since the simulation keeps
+    hundreds of thousands of them alive. Subclasses must declare __slots__ as well.
+
+    The subclasses made by with_params can not be found by name, so an animal is pickled as its
+    species, its parameters and its attributes, see __reduce__.
     """
-    params = {}
+    params = Parameters()
+    _base_species = None
+    __slots__ = ('_age', '_weight', '_fitness', '_fitness_params', 'has_migrated')
 
     @staticmethod
     @jit
@@ -52,7 +73,8 @@ class Animals:
     @classmethod
     def set_params(cls, new_params):
         """
-        Updates the parameters
+        Updates the parameters. The parameters are frozen, so the class gets a new Parameters
+        object, which also marks the fitness of all its animals as stale.
         :param new_params: dict, dictionary over new parameters
         :return: None
         """
@@ -60,18 +82,128 @@ class Animals:
         if not isinstance(new_params, dict):
             raise TypeError('params must be of type dict')
 
-        # Taken from bacteria.py from the biolab example folder. Modified to the current project
-        for key in new_params:
-            if key not in cls.params.keys():
-                raise KeyError('Invalid parameter name: ' + key)
+        cls.params = cls.params.replace(new_params)
 
-        cls.params.update(new_params)
+    @classmethod
+    def with_params(cls, params=None):
+        """
+        Creates a subclass of the species with its own parameters, used to give every simulation
+        its own parameters. set_params on the subclass does not affect the species or any other
+        subclass of it.
+        :param params: Parameters, defaults to the current parameters of the species
+        :return: class, subclass of the species with the same name
+        """
+        return type(cls.__name__, (cls,),
+                    {'params': cls.params if params is None else params,
+                     '_base_species': cls.species(),
+                     '__module__': cls.__module__, '__slots__': ()})
+
+    @classmethod
+    def species(cls):
+        """
+        The species of the class, i.e Herbivore or Carnivore, also for the subclasses made by
+        with_params.
+        :return: class
+        """
+        return cls._base_species or cls
 
-    def __init__(self, age=0, weight=None):
+    @classmethod
+    def from_arrays(cls, ages, weights=None, rng=None):
+        """
+        Creates many animals of the species in one call. The checks of the constructor are done
+        once on the arrays, instead of once per animal.
+        :param ages: array-like of int, ages of the animals
+        :param weights: array-like of int or float, weights of the animals, where the weights
+                        that are None are drawn from the birth weight distribution, all of them
+                        if weights is None
+        :param rng: RandomPool or numpy.random.Generator, used to draw the weights
+        :return: list of animals of the species
+        """
+        ages = np.asarray(ages)
+        if ages.dtype.kind not in 'iuf' or np.any(ages != np.floor(ages)):
+            raise TypeError("'age' must be of type int ")
+
+        if weights is None:
+            weights = np.full(ages.shape, None)
+        weights = np.asarray(weights)
+        if weights.dtype == object:
+            # copy, so the weights that are drawn are not written into the array of the caller
+            weights = np.array(weights, dtype=object)
+            drawn = np.equal(weights, None)
+            weights[drawn] = get_rng(rng).normal(cls.params.w_birth, cls.params.sigma_birth,
+                                                 np.count_nonzero(drawn))
+            weights = np.array(weights.tolist())
+        if weights.dtype.kind not in 'iuf':
+            raise TypeError('Weight must be either of type int or type float')
+        if weights.shape != ages.shape:
+            raise ValueError('ages and weights must have the same length')
+        if np.any(weights < 0):
+            raise ValueError("'weight' must be greater than or equal to zero")
+
+        if np.any(ages < 0):
+            raise ValueError("'age' must be greater than or equal to zero")
+
+        return [cls._create(age, weight)
+                for age, weight in zip(ages.astype(int).tolist(), weights.tolist())]
+
+    @classmethod
+    def _create(cls, age, weight):
+        """
+        Creates an animal without the checks of the constructor, for ages and weights that are
+        known to be valid, such as those of newborns.
+        :param age: int, age of the animal
+        :param weight: int or float, weight of the animal
+        :return: animal of the species
+        """
+        animal = cls.__new__(cls)
+        animal._age = age
+        animal._weight = weight
+        animal._fitness = None
+        animal._fitness_params = None
+        animal.has_migrated = False
+        return animal
+
+    @classmethod
+    def fitness_batch(cls, ages, weights, params):
+        """
+        Computes the fitness of many animals of one species in one call.
+        :param ages: array-like, ages of the animals
+        :param weights: array-like, weights of the animals
+        :param params: Parameters, parameters of the species
+        :return: 1D numpy array, fitness of every animal, 0 for animals without weight
+        """
+        ages = np.asarray(ages, dtype=float)
+        weights = np.asarray(weights, dtype=float)
+        q_positive = cls._q(1, ages, params.a_half, params.phi_age)
+        q_negative = cls._q(-1, weights, params.w_half, params.phi_weight)
+        return np.where(weights <= 0, 0.0, q_positive * q_negative)
+
+    @classmethod
+    def update_fitness_batch(cls, animals):
+        """
+        Updates the fitness of every animal in the list that is marked as stale, with one call to
+        fitness_batch per species.
+        :param animals: list, animals of any species
+        :return: None
+        """
+        stale = {}
+        for animal in animals:
+            if animal._fitness_params is not animal.params:
+                stale.setdefault(type(animal), []).append(animal)
+
+        for species, stale_animals in stale.items():
+            ages = [animal.age for animal in stale_animals]
+            weights = [animal.weight for animal in stale_animals]
+            fitness = cls.fitness_batch(ages, weights, species.params).tolist()
+            for animal, value in zip(stale_animals, fitness):
+                animal.fitness = value
+
+    def __init__(self, age=0, weight=None, rng=None):
         """
         This is init
         :param age:
-        :param weight:
+        :param weight: weight of the animal, drawn from the birth weight distribution if None
+        :param rng: RandomPool or numpy.random.Generator, used to draw the weight
         """
 
         if age != int(age):
@@ -86,19 +218,95 @@ class Animals:
         if age < 0:
             raise ValueError("'age' must be greater than or equal to zero")
 
+        self._fitness = None
+        self._fitness_params = None
         self.age = age
 
         if weight is None:
-            self.weight = np.random.normal(self.params['w_birth'], self.params['sigma_birth'])
+            self.weight = get_rng(rng).normal(self.params.w_birth, self.params.sigma_birth)
         else:
             self.weight = weight
 
-        self.fitness = self.update_fitness()
         self.has_migrated = False
 
+    def __reduce__(self):
+        """
+        Pickles the animal as its species and parameters instead of its class, which may be a
+        subclass made by with_params.
+        :return: tuple, see the pickle module
+        """
+        return _restore_animal, (self.species(), self.params, self._age, self._weight,
+                                 self.has_migrated)
+
+    @property
+    def age(self):
+        """
+        Age of the animal. Setting it marks the fitness as stale.
+        :return: int
+        """
+        return self._age
+
+    @age.setter
+    def age(self, value):
+        self._age = value
+        self._fitness_params = None
+
+    @property
+    def weight(self):
+        """
+        Weight of the animal. Setting it marks the fitness as stale.
+        :return: float
+        """
+        return self._weight
+
+    @weight.setter
+    def weight(self, value):
+        self._weight = value
+        self._fitness_params = None
+
+    @property
+    def fitness_stale(self):
+        """
+        Whether the cached fitness is out of date, i.e age or weight of the animal or the
+        parameters of its species have changed since it was computed.
+        :return: bool
+        """
+        return self._fitness_params is not self.params
+
+    @property
+    def fitness(self):
+        """
+        Fitness of the animal. The value is cached, and only computed when it is read after
+        being marked as stale.
+        :return: float, value between 0 and 1
+        """
+        if self._fitness_params is not self.params:
+            self.update_fitness()
+        return self._fitness
+
+    @fitness.setter
+    def fitness(self, value):
+        """
+        Sets the fitness of the animal, which is then no longer stale.
+        :param value: float
+        :return: None
+        """
+        self._fitness = value
+        self._fitness_params = self.params
+
+    def mark_fitness_stale(self):
+        """
+        Marks the fitness as stale, so that it is computed the next time it is read, or by
+        update_fitness_batch.
+        :return: None
+        """
+        self._fitness_params = None
+
     def set_has_migrated(self, boolean):
         """
-        Sets new values for the has_migrated status of the animal.
+        Sets new values for the has_migrated status of the animal. The island moves every animal
+        at most once a year without reading this status, it is only kept so that code using it
+        keeps working.
         :param boolean: bool
         :return: None
         """
@@ -115,8 +323,8 @@ class Animals:
         if self.weight <= 0:
             self.fitness = 0
         else:
-            q_positive = self._q(1, self.age, self.params['a_half'], self.params['phi_age'])
-            q_negative = self._q(-1, self.weight, self.params['w_half'], self.params['phi_weight'])
+            q_positive = self._q(1, self.age, self.params.a_half, self.params.phi_age)
+            q_negative = self._q(-1, self.weight, self.params.w_half, self.params.phi_weight)
             self.fitness = q_positive * q_negative
         return self.fitness
 
@@ -129,14 +337,13 @@ class Animals:
 
         if fodder <= 0:
             raise ValueError('Fodder available must be greater than or equal to 0')
-        if fodder < self.params['F']:
+        if fodder < self.params.F:
             food_eaten = fodder
         else:
-            food_eaten = self.params['F']
+            food_eaten = self.params.F
 
-        added_weight = self.params['beta']*food_eaten
+        added_weight = self.params.beta*food_eaten
         self.weight += added_weight
-        self.update_fitness()
 
         return food_eaten
 
@@ -145,9 +352,8 @@ class Animals:
         Every year, the weight of the animal decreases by ηw.
         :return: float, amount the animals weight decreases by
         """
-        subtracted_weight = self.weight * self.params['eta']
+        subtracted_weight = self.weight * self.params.eta
         self.weight -= subtracted_weight
-        self.update_fitness()
 
     def update_age(self):
         """
@@ -155,56 +361,55 @@ class Animals:
         :return: int, positive integer greater or equal than zero, age of the animal
         """
         self.age += 1
-        self.update_fitness()
 
-    def birth(self, num_animals):
+    def birth(self, num_animals, rng=None):
         """
         Decides probability for each animal in each cell whether it will give birth or not.
         Does also provide the conditions that have to be met in order to give birth.
+        :param num_animals: int, number of animals of the same species in the cell
+        :param rng: RandomPool or numpy.random.Generator
         :return:
         """
-        g = self.params['gamma']
-        xi = self.params['xi']
-        zeta = self.params['zeta']
+        g = self.params.gamma
+        xi = self.params.xi
+        zeta = self.params.zeta
 
-        if self.weight < zeta * (self.params['w_birth'] + self.params['sigma_birth']):
+        if self.weight < zeta * (self.params.w_birth + self.params.sigma_birth):
             return None
 
         p_birth = min(1, g * self.fitness * (num_animals-1))
 
-        if np.random.uniform(0, 1) < p_birth:
-            birth_weight = np.random.normal(self.params['w_birth'], self.params['sigma_birth'])
+        rng = get_rng(rng)
+        if rng.random() < p_birth:
+            birth_weight = rng.normal(self.params.w_birth, self.params.sigma_birth)
 
             if xi*birth_weight < self.weight:
                 self.weight -= xi * birth_weight
-                self.update_fitness()
-
-                if isinstance(self, Herbivore):
-                    return Herbivore(0, birth_weight)
 
-                elif isinstance(self, Carnivore):
-                    return Carnivore(0, birth_weight)
+                return self._create(0, birth_weight)
 
-    def migrate(self):
+    def migrate(self, rng=None):
         """
         Decides the probability that the animal will move to one of the neighbouring four cells.
         All four cells have equal probability and the animal will not move if the chosen cell
         is water.
+        :param rng: RandomPool or numpy.random.Generator
         :return: Bool, decides whether the animal moves to a neighboring cell or not
         """
-        prob_mig = self.params['mu'] * self.fitness
-        random_num = np.random.uniform(0, 1)
+        prob_mig = self.params.mu * self.fitness
+        random_num = get_rng(rng).random()
         return prob_mig > random_num
 
-    def death(self):
+    def death(self, rng=None):
         """
         Function that returns True if the animal is dead, false if it is alive
+        :param rng: RandomPool or numpy.random.Generator
         :return: Bool, where True represents dead and False alive
         """
         if self.weight <= 0:
             return True
-        prob_death = self.params['omega'] * (1 - self.fitness)
-        random_num = np.random.uniform(0, 1)
+        prob_death = self.params.omega * (1 - self.fitness)
+        random_num = get_rng(rng).random()
         return prob_death > random_num
 
 
@@ -216,14 +421,15 @@ class Herbivore(Animals):
     food it can eat depends on the amount of food in the cell. Herbivores eat in a random order.
     """
 
-    params = {
+    params = HerbivoreParams({
         'w_birth': 8.0, 'sigma_birth': 1.5, 'beta': 0.9, 'eta': 0.05, 'a_half': 40.0,
         'phi_age': 0.6, 'w_half': 10.0, 'phi_weight': 0.1, 'mu': 0.25,
         'gamma': 0.2, 'zeta': 3.5, 'xi': 1.2, 'omega': 0.4, 'F': 10.0
-        }
+        })
+    __slots__ = ()
 
-    def __init__(self, age=0, weight=None):
-        super().__init__(age, weight)
+    def __init__(self, age=0, weight=None, rng=None):
+        super().__init__(age, weight, rng)
 
 
 class Carnivore(Animals):
@@ -238,48 +444,78 @@ class Carnivore(Animals):
     try to kill one herbivore at a time, trying to kill the herbivore with the lowest fitness first.
     """
 
-    params = {
+    params = CarnivoreParams({
         'w_birth': 6.0, 'sigma_birth': 1.0, 'beta': 0.75, 'eta': 0.125, 'a_half': 40.0,
         'phi_age': 0.3, 'w_half': 4.0, 'phi_weight': 0.4, 'mu': 0.4, 'gamma': 0.8,
         'zeta': 3.5, 'xi': 1.1, 'omega': 0.8, 'F': 50.0, 'DeltaPhiMax': 10.0
-        }
+        })
+    __slots__ = ()
 
-    def __init__(self, age=0, weight=None):
-        super().__init__(age, weight)
+    def __init__(self, age=0, weight=None, rng=None):
+        super().__init__(age, weight, rng)
 
-    def slay(self, herb):
+    def slay(self, herb, rng=None):
         if self.fitness <= herb.fitness:
             return False
 
-        elif 0 < self.fitness - herb.fitness < self.params['DeltaPhiMax']:
-            prob_kill = (self.fitness - herb.fitness) / self.params['DeltaPhiMax']
-            return np.random.uniform(0, 1) < prob_kill
+        elif 0 < self.fitness - herb.fitness < self.params.DeltaPhiMax:
+            prob_kill = (self.fitness - herb.fitness) / self.params.DeltaPhiMax
+            return get_rng(rng).random() < prob_kill
 
         else:
             return True
 
-    def eat_carn(self, herbivore_list):
+    def eat_carn(self, herbivore_list, rng=None):
 
         dead_herbs = []
         amount_eaten = 0
 
         for herbivore in herbivore_list:
 
-            if amount_eaten >= self.params['F']:
+            if amount_eaten >= self.params.F:
                 break
 
             if self.fitness <= herbivore.fitness:
                 break
 
-            if self.slay(herbivore):
-                if amount_eaten + herbivore.weight > self.params['F']:
-                    reduced_amount_eaten = self.params['F'] - amount_eaten
-                    self.weight += self.params['beta']*reduced_amount_eaten
+            if self.slay(herbivore, rng):
+                if amount_eaten + herbivore.weight > self.params.F:
+                    reduced_amount_eaten = self.params.F - amount_eaten
+                    self.weight += self.params.beta*reduced_amount_eaten
                     amount_eaten += reduced_amount_eaten
                 else:
-                    self.weight += self.params['beta'] * herbivore.weight
+                    self.weight += self.params.beta * herbivore.weight
                     amount_eaten += herbivore.weight
 
-                self.update_fitness()
                 dead_herbs.append(herbivore)
         return dead_herbs
+
+
+def species_with_params(species, params):
+    """
+    Returns a class of the species with the given parameters. Equal parameters give the same
+    class, so animals that are unpickled together share their class.
+    :param species: class, Herbivore or Carnivore
+    :param params: Parameters of the species
+    :return: class, the species itself if it has these parameters, otherwise a subclass of it
+    """
+    if params == species.params:
+        return species
+    return _cached_species(species, type(params), tuple(params.items()))
+
+
+@lru_cache(maxsize=None)
+def _cached_species(species, params_type, items):
+    """
+    Subclass of a species made by with_params, cached on the parameter values.
+    """
+    return species.with_params(params_type(dict(items)))
+
+
+def _restore_animal(species, params, age, weight, has_migrated):
+    """
+    Recreates a pickled animal, see Animals.__reduce__.
+    """
+    animal = species_with_params(species, params)._create(age, weight)
+    animal.has_migrated = has_migrated
+    return animal
@@ -1,8 +1,9 @@
 # LEGGER MAPPET MIDLERTIDIG INN I DENNE FILEN:
 
-import random
 from biosim.landscape import Highland, Lowland, Desert, Sea
 from biosim.animals import Animals, Herbivore, Carnivore
+from biosim.population import Population
+from biosim.rng import get_states, set_states, spawn_pools
 import textwrap
 
 import numpy as np
@@ -13,17 +14,29 @@ class Island:
     Methods:
     ---------------
     check length
+    params
+    set_animal_parameters
+    set_landscape_parameters
+    population_per_cell
+    statistics
     fitness_list
     age_list
     weight_list
     check_map
     set_map_coordinates
+    index_cells
     procreate_cells_map
     feed_cells_island
     age_in_cells
     weightloss_island
     die_island
+    update_fitness_island
     place_population
+    get_animals
+    set_animals
+    seed_random_streams
+    get_random_states
+    set_random_states
     get_adj_cells
     migration_island
     run_function_one_year
@@ -33,15 +46,27 @@ class Island:
                   'L': Lowland,
                   'D': Desert,
                   'W': Sea}
+    species_types = {'Herbivore': Herbivore,
+                     'Carnivore': Carnivore}
 
-    def __init__(self, insert_map, init_animals):
+    def __init__(self, insert_map, init_animals, seed=None):
         """
         Constructor for Island class
         :param insert_map: str, strings ordered in a square pattern
         :param init_animals: list, list of dictionary, places herbivores and carnivores on the map
+        :param seed: int, seed of the random numbers of the island, see biosim.rng
         """
 
+        self.species = {name: species.with_params()
+                        for name, species in Island.species_types.items()}
+        self.cell_types = {code: cell_type.with_params(self.species['Herbivore'],
+                                                       self.species['Carnivore'])
+                           for code, cell_type in Island.cell_types.items()}
         self.map = self.set_map_coordinates(insert_map)
+        self.seed_sequence = np.random.SeedSequence(seed)
+        self.index_cells()
+        self.seed_random_streams()
+        self._statistics = None
         self.place_population(init_animals)
         self._year = 0
 
@@ -73,6 +98,41 @@ class Island:
         :return: int
         """
         self._year = current_year
+        self._statistics = None
+
+    @property
+    def params(self):
+        """
+        Parameters used by this island. Every island has its own species and landscape classes,
+        created with with_params, so changing the parameters of one island does not affect any
+        other island.
+        :return: dict, species or landscape code as key and Parameters as value
+        """
+        params = {species: cls.params for species, cls in self.species.items()}
+        params.update({code: cls.params for code, cls in self.cell_types.items()})
+        return params
+
+    def set_animal_parameters(self, species, params):
+        """
+        Sets the parameters of one species on this island.
+        :param species: String, name of animal species
+        :param params: dict, new values of some of the parameters
+        :return: None
+        """
+        if species not in self.species:
+            raise KeyError('Invalid species: ' + str(species))
+        self.species[species].set_params(params)
+
+    def set_landscape_parameters(self, landscape, params):
+        """
+        Sets the parameters of one landscape type on this island.
+        :param landscape: String, code letter for landscape
+        :param params: dict, new values of some of the parameters
+        :return: None
+        """
+        if landscape not in self.cell_types:
+            raise KeyError('Invalid landscape: ' + str(landscape))
+        self.cell_types[landscape].set_params(params)
 
     @property
     def num_animals(self):
@@ -80,10 +140,7 @@ class Island:
         Returns the total number of animals currently on the island.
         :return: int, positive integer, number of animals currently on the island.
         """
-        num_animals = 0
-        for cell in self.map.values():
-            num_animals += cell.n_herbivores + cell.n_carnivores
-        return num_animals
+        return sum(self.num_animals_per_species.values())
 
     @property
     def num_animals_per_species(self):
@@ -91,13 +148,71 @@ class Island:
         Returns a dictionary with number of herbivores and carnivores.
         :return: dict
         """
+        herbivores, carnivores = self.population_per_cell()
+        return {'Herbivore': int(herbivores.sum()), 'Carnivore': int(carnivores.sum())}
+
+    def animals_in_cells(self):
+        """
+        Returns the number of herbivores and carnivores in every cell of the island.
+        :return: dict, location as key and tuple with number of herbivores and carnivores as value
+        """
+        herbivores, carnivores = self.population_per_cell()
+        return {loc: counts for loc, counts in zip(self.locations,
+                                                   zip(herbivores.ravel().tolist(),
+                                                       carnivores.ravel().tolist()))}
 
-        num_animals_per_species = {'Herbivore': 0, 'Carnivore': 0}
-        for cell in self.map.values():
-            num_animals_per_species['Herbivore'] += cell.n_herbivores
-            num_animals_per_species['Carnivore'] += cell.n_carnivores
-        return num_animals_per_species
+    def population_per_cell(self):
+        """
+        Returns the number of herbivores and carnivores in every cell, as arrays with the shape
+        of the map. The counts are kept up to date by the yearly phases, so this is cheap. Animals
+        added to or removed from the cells directly, not through the island, are only counted
+        after a call to _count_animals. The arrays are views that change as the simulation goes
+        on, copy them to keep the values.
+        :return: tuple of two 2D numpy arrays
+        """
+        counts = self.cell_counts.reshape((2,) + self.map_shape)
+        return counts[0], counts[1]
 
+    def _count_animals(self):
+        """
+        Counts the animals in every habitable cell again, after animals have been moved around.
+        :return: None
+        """
+        for index, cell in zip(self.habitable_index, self.habitable_cells):
+            self.cell_counts[:, index] = cell.n_herbivores, cell.n_carnivores
+
+    def statistics(self):
+        """
+        Returns the fitness, age and weight of all herbivores and carnivores on the island,
+        collected in one pass over the cells. The snapshot is cached, and only collected again
+        after the year has advanced or animals have been placed on the island.
+        :return: dict, species as key and dict with 'fitness', 'age' and 'weight' numpy arrays
+                 as value
+        """
+        if self._statistics is None:
+            self._statistics = self._collect_statistics()
+        return self._statistics
+
+    def _collect_statistics(self):
+        """
+        Collects the statistics returned by the statistics method.
+        :return: dict
+        """
+        self.update_fitness_island()
+        values = {'Herbivore': ([], [], []), 'Carnivore': ([], [], [])}
+        for cell in self.habitable_cells:
+            for species, animals in (('Herbivore', cell.current_herbivores),
+                                     ('Carnivore', cell.current_carnivores)):
+                fitness, age, weight = values[species]
+                for animal in animals:
+                    fitness.append(animal.fitness)
+                    age.append(animal.age)
+                    weight.append(animal.weight)
+
+        return {species: {'fitness': np.array(fitness, dtype=float),
+                          'age': np.array(age, dtype=float),
+                          'weight': np.array(weight, dtype=float)}
+                for species, (fitness, age, weight) in values.items()}
 
     def fitness_list(self):
         """
@@ -106,12 +221,12 @@ class Island:
         """
 
         herbfit_list = []
-        for cell in self.map.values():
+        for cell in self.habitable_cells:
             for herb in cell.current_herbivores:
                 herbfit_list.append(herb.fitness)
 
         carnfit_list = []
-        for cell in self.map.values():
+        for cell in self.habitable_cells:
             for carn in cell.current_carnivores:
                 carnfit_list.append(carn.fitness)
 
@@ -124,12 +239,12 @@ class Island:
         """
 
         herbage_list = []
-        for cell in self.map.values():
+        for cell in self.habitable_cells:
             for herb in cell.current_herbivores:
                 herbage_list.append(herb.age)
 
         carnage_list = []
-        for cell in self.map.values():
+        for cell in self.habitable_cells:
             for carn in cell.current_carnivores:
                 carnage_list.append(carn.age)
 
@@ -142,12 +257,12 @@ class Island:
         """
 
         herbweight_list = []
-        for cell in self.map.values():
+        for cell in self.habitable_cells:
             for herb in cell.current_herbivores:
                 herbweight_list.append(herb.weight)
 
         carnweight_list = []
-        for cell in self.map.values():
+        for cell in self.habitable_cells:
             for carn in cell.current_carnivores:
                 carnweight_list.append(carn.weight)
 
@@ -205,13 +320,41 @@ class Island:
 
         return coordinates_map
 
+    def index_cells(self):
+        """
+        Builds the lookup tables used by the yearly phases, once the map is set. Every cell gets an
+        integer index in the row-major order of the map. The index of the four adjacent cells of
+        every cell is stored in the numpy array neighbours, in the order given by get_adj_cells,
+        and whether animals can live in a cell is stored in the numpy array habitable. Adjacent
+        cells outside the map are replaced by the cell itself, which only happens for the water
+        cells on the border. The habitable cells are also collected in a list, so that the yearly
+        phases never visit water cells.
+        :return: None
+        """
+        self.locations = list(self.map)
+        self.cell_index = {loc: index for index, loc in enumerate(self.locations)}
+
+        self.neighbours = np.array([[self.cell_index.get(adj, index)
+                                     for adj in self.get_adj_cells(loc)]
+                                    for index, loc in enumerate(self.locations)],
+                                   dtype=np.int64).reshape(-1, 4)
+        self.habitable = np.array([cell.migrate_to for cell in self.map.values()], dtype=bool)
+
+        self.habitable_index = np.flatnonzero(self.habitable)
+        self.habitable_cells = [self.map[self.locations[index]] for index in self.habitable_index]
+
+        n_rows = max(y for y, x in self.locations)
+        self.map_shape = (n_rows, len(self.locations) // n_rows)
+        self.cell_counts = np.zeros((2, len(self.locations)), dtype=np.int64)
+
     def procreate_cells_map(self):
         """
         Method that lets animals in a cell procreate and instantiates newborns.
         :return: None
         """
-        for cell in self.map.values():
+        for index, cell in zip(self.habitable_index, self.habitable_cells):
             cell.birth_cycle()
+            self.cell_counts[:, index] = cell.n_herbivores, cell.n_carnivores
 
     def feed_cells_island(self):
         """
@@ -219,15 +362,16 @@ class Island:
         and makes all the animals in it contains eat.
         :return: None
         """
-        for landscape in self.map.values():
+        for index, landscape in zip(self.habitable_index, self.habitable_cells):
             landscape.feed_all()
+            self.cell_counts[0, index] = landscape.n_herbivores
 
     def age_in_cells(self):
         """
         Method that ages the animals in the cell by one year.
         :return: None
         """
-        for cell in self.map.values():
+        for cell in self.habitable_cells:
             cell.age_animals()
 
     def weightloss_island(self):
@@ -236,7 +380,7 @@ class Island:
         lose weight on an annual basis.
         :return: None
         """
-        for cell in self.map.values():
+        for cell in self.habitable_cells:
             cell.weight_loss_cell()
 
     def die_island(self):
@@ -245,8 +389,21 @@ class Island:
         animals in them to die.
         :return: None
         """
-        for cell in self.map.values():
+        for index, cell in zip(self.habitable_index, self.habitable_cells):
             cell.death_in_cell()
+            self.cell_counts[:, index] = cell.n_herbivores, cell.n_carnivores
+
+    def update_fitness_island(self):
+        """
+        Method that computes the stale fitness values of all animals on the island in one batch
+        per species.
+        :return: None
+        """
+        animals = []
+        for cell in self.habitable_cells:
+            animals.extend(cell.current_herbivores)
+            animals.extend(cell.current_carnivores)
+        Animals.update_fitness_batch(animals)
 
     def place_population(self, init_pop):
         """
@@ -262,6 +419,76 @@ class Island:
                 raise ValueError('Animal can not live in water')
             pop = position['pop']
             self.map[loc].place_animals(pop)
+        self._count_animals()
+        self._statistics = None
+
+    def get_animals(self):
+        """
+        Returns every animal on the island as arrays, ordered by cell index, with the herbivores
+        of a cell before its carnivores. The species are coded as in Population.species_codes.
+        :return: dict, 'species', 'age', 'weight' and 'cell' numpy arrays
+        """
+        species, age, weight, cell_index = [], [], [], []
+        for index, cell in zip(self.habitable_index, self.habitable_cells):
+            for code, animals in enumerate((cell.current_herbivores, cell.current_carnivores)):
+                for animal in animals:
+                    species.append(code)
+                    age.append(animal.age)
+                    weight.append(animal.weight)
+                    cell_index.append(index)
+        return {'species': np.array(species, dtype=np.int8),
+                'age': np.array(age, dtype=np.int64),
+                'weight': np.array(weight, dtype=float),
+                'cell': np.array(cell_index, dtype=np.int64)}
+
+    def set_animals(self, animals):
+        """
+        Replaces every animal on the island, without any checks on the input.
+        :param animals: dict, 'species', 'age', 'weight' and 'cell' arrays, see get_animals
+        :return: None
+        """
+        for cell in self.habitable_cells:
+            cell.current_herbivores = []
+            cell.current_carnivores = []
+
+        species = list(self.species.values())
+        for code, age, weight, index in zip(animals['species'].tolist(), animals['age'].tolist(),
+                                            animals['weight'].tolist(),
+                                            animals['cell'].tolist()):
+            cell = self.map[self.locations[index]]
+            animal = species[code]._create(age, weight)
+            if code == 0:
+                cell.current_herbivores.append(animal)
+            else:
+                cell.current_carnivores.append(animal)
+        self._count_animals()
+        self._statistics = None
+
+    def seed_random_streams(self):
+        """
+        Gives every cell of the map its own random number stream, spawned from the seed of
+        the island in row-major order, so the random numbers drawn in a cell do not depend on
+        the order in which the cells are visited.
+        :return: None
+        """
+        self.random_streams = spawn_pools(self.seed_sequence, len(self.locations))
+        for cell, rng in zip(self.map.values(), self.random_streams):
+            cell.rng = rng
+
+    def get_random_states(self):
+        """
+        Returns the states of the random number streams of the island.
+        :return: list of dict, states that can be stored as JSON
+        """
+        return get_states(self.random_streams)
+
+    def set_random_states(self, states):
+        """
+        Restores the states returned by get_random_states.
+        :param states: list of dict, one state per random number stream
+        :return: None
+        """
+        set_states(self.random_streams, states)
 
     def get_adj_cells(self, coords):
         """
@@ -278,33 +505,40 @@ class Island:
     def migration_island(self):
         """
         Method that implements migration of animals between the cells in the matrix that represents
-        the island. It iterates through all the cells of the island, gets the adjacent cells,
-        collects the animals qualifying for migration in a dictionary of potential emigrants, then
-        checks if the destinations is possible to migrate, i.e is not of type Sea before inserting
-        the animals into the new cell. It then removes the animals from the cell which it
-        migrated from.
+        the island, in two phases. First every habitable cell decides where each of its animals
+        wants to go, based on the population before anybody has moved. Then every animal is put
+        into a fresh list for its new cell, or for its old cell if it stays or the destination is
+        not habitable, i.e of type Sea. Since all decisions are made before any animal is moved,
+        no animal can migrate twice in one year.
         :return: None
         """
 
-        for y, coords in enumerate(self.map):
-            self.get_adj_cells(coords)
-            if self.map[coords].migrate_to:
-                adjacent_cells = self.get_adj_cells(coords)
-                migrants_dict = self.map[coords].emigration(adjacent_cells)
+        moves = []
+        for index, cell in zip(self.habitable_index, self.habitable_cells):
+            if cell.current_herbivores or cell.current_carnivores:
+                moves.append((index, cell, cell.emigration(self.neighbours[index])))
 
-                for destination, migrant in migrants_dict.items():
-                    if self.map[destination].migrate_to and migrant:
-                        self.map[destination].add_immigrants(migrant)
-                        self.map[coords].remove_emigrants(migrant)
+        new_herbivores = [[] for _ in self.locations]
+        new_carnivores = [[] for _ in self.locations]
+        for index, cell, (herb_destinations, carn_destinations) in moves:
+            for animals, destinations, buffers in (
+                    (cell.current_herbivores, herb_destinations, new_herbivores),
+                    (cell.current_carnivores, carn_destinations, new_carnivores)):
+                for animal, destination in zip(animals, destinations):
+                    if destination is None or not self.habitable[destination]:
+                        destination = index
+                    buffers[destination].append(animal)
+
+        for index, cell in zip(self.habitable_index, self.habitable_cells):
+            cell.current_herbivores = new_herbivores[index]
+            cell.current_carnivores = new_carnivores[index]
+            self.cell_counts[:, index] = cell.n_herbivores, cell.n_carnivores
 
     def run_function_one_year(self):
         """
         Function that calls the methods in order to simulate one cycle of the island.
         :return: None
         """
-        self.fitness_list()
-        self.age_list()
-        self.weight_list()
         self.feed_cells_island()
         self.procreate_cells_map()
         self.migration_island()
@@ -313,11 +547,179 @@ class Island:
         self.die_island()
         self.year += 1
 
-        for cell in self.map.values():
-            for anim in cell.current_herbivores + cell.current_carnivores:
-                anim.set_has_migrated(False)
 
 
 
 
 
+
+class ArrayIsland(Island):
+    """
+    Island where the animals are stored in a Population, i.e in numpy arrays, instead of as
+    Herbivore and Carnivore objects in the cells. The cells of the map are only used for their
+    landscape type. Every yearly phase is done as a batched array operation over the whole island.
+    """
+
+    def index_cells(self):
+        """
+        Builds the lookup tables of the island, and the empty Population that uses them.
+        :return: None
+        """
+        super().index_cells()
+        self.population = Population([type(cell) for cell in self.map.values()],
+                                     self.neighbours, self.habitable,
+                                     (self.species['Herbivore'], self.species['Carnivore']))
+        self.cell_counts = self.population.cell_counts
+
+    def seed_random_streams(self):
+        """
+        Gives the population one random number stream, spawned from the seed of the island,
+        since every phase draws the numbers for all animals at once.
+        :return: None
+        """
+        self.random_streams = spawn_pools(self.seed_sequence, 1)
+        self.population.rng = self.random_streams[0]
+
+    def _collect_statistics(self):
+        """
+        Collects the statistics returned by the statistics method, directly from the arrays of
+        the population.
+        :return: dict
+        """
+        population = self.population
+        statistics = {}
+        for species, code in population.species_codes.items():
+            animals = population.species == code
+            statistics[species] = {'fitness': population.fitness[animals],
+                                   'age': population.age[animals].astype(float),
+                                   'weight': population.weight[animals]}
+        return statistics
+
+    def _per_species(self, values):
+        """
+        Splits an array with a value for every animal into herbivores and carnivores.
+        :param values: 1D numpy array
+        :return: list, two lists
+        """
+        herbivores = self.population.species == 0
+        return values[herbivores].tolist(), values[~herbivores].tolist()
+
+    def fitness_list(self):
+        """
+        Returns lists of the fitness of the carnivores and herbivores currently on the island.
+        :return: list, two lists
+        """
+        return self._per_species(self.population.fitness)
+
+    def age_list(self):
+        """
+        Returns lists of the ages of the herbivores and carnivores currently on the island
+        :return: list, two lists
+        """
+        return self._per_species(self.population.age)
+
+    def weight_list(self):
+        """
+        List of the weights of the herbivores and carnivores currently on the island.
+        :return: list, two lists
+        """
+        return self._per_species(self.population.weight)
+
+    def place_population(self, init_pop):
+        """
+        Method that places animals in the cells that constitutes the island
+        :param init_pop: list of dict, animals to be placed on the island
+        :return: None
+        """
+        for position in init_pop:
+            loc = position['loc']
+            if loc not in self.map.keys():
+                raise KeyError('nonexistent loc in the map provided')
+            if not self.map[loc].migrate_to:
+                raise ValueError('Animal can not live in water')
+            self.population.place_animals(self.cell_index[loc], position['pop'])
+        self._statistics = None
+
+    def get_animals(self):
+        """
+        Returns every animal on the island as arrays, in the order of the population.
+        :return: dict, 'species', 'age', 'weight' and 'cell' numpy arrays
+        """
+        population = self.population
+        return {'species': population.species.copy(), 'age': population.age.copy(),
+                'weight': population.weight.copy(), 'cell': population.cell.copy()}
+
+    def set_animals(self, animals):
+        """
+        Replaces every animal on the island, without any checks on the input.
+        :param animals: dict, 'species', 'age', 'weight' and 'cell' arrays, see get_animals
+        :return: None
+        """
+        self.population.replace_animals(animals['species'], animals['cell'], animals['age'],
+                                        animals['weight'])
+        self._statistics = None
+
+    def procreate_cells_map(self):
+        """
+        Method that lets animals in a cell procreate and instantiates newborns.
+        :return: None
+        """
+        self.population.birth_cycle()
+
+    def feed_cells_island(self):
+        """
+        Method that updates the fodder in the cells, and makes all the animals eat.
+        :return: None
+        """
+        self.population.grow_fodder()
+        self.population.feed_herbivores()
+        self.population.feed_carnivores()
+
+    def age_in_cells(self):
+        """
+        Method that ages the animals by one year.
+        :return: None
+        """
+        self.population.age_animals()
+
+    def weightloss_island(self):
+        """
+        Method that makes the animals lose weight on an annual basis.
+        :return: None
+        """
+        self.population.weight_loss()
+
+    def update_fitness_island(self):
+        """
+        Method that computes the fitness of all animals on the island in one batch per species.
+        :return: None
+        """
+        self.population.update_fitness()
+
+    def die_island(self):
+        """
+        Method that lets the animals die.
+        :return: None
+        """
+        self.population.death()
+
+    def migration_island(self):
+        """
+        Method that lets the animals migrate to adjacent habitable cells.
+        :return: None
+        """
+        self.population.migration()
+
+    def run_function_one_year(self):
+        """
+        Function that calls the methods in order to simulate one cycle of the island.
+        :return: None
+        """
+        self.feed_cells_island()
+        self.procreate_cells_map()
+        self.migration_island()
+        self.age_in_cells()
+        self.weightloss_island()
+        self.die_island()
+        self.year += 1
+        self.population.has_migrated[:] = False
@@ -1,7 +1,9 @@
+from functools import lru_cache
 import numpy as np
-from biosim.animals import Herbivore, Carnivore
+from biosim.animals import Animals, Herbivore, Carnivore, species_with_params
+from biosim.parameters import Parameters, FodderParams
+from biosim.rng import get_rng
 from operator import attrgetter
-np.random.seed(1)
 
 __author__ = "Haris Karovic", "Isak Finnøy"
 __email__ = "harkarov@nmbu.no", "isfi@nmbu.no"
@@ -12,41 +14,92 @@ class Cell:
     Class cell represents a single cell on the island map, the different
     landscape types are subclasses of the Cell superclass.
 
+    Every cell draws its random numbers from its own RandomPool, rng, which the island spawns
+    for it, see biosim.rng. The pool is passed on to the animals in the cell.
+
     Methods:
     ---------------
+    set_params
+    with_params
+    landscape_type
     grow_fodder
     place_animals
     birth_cycle
+    births
     weight_loss_cell
+    update_fitness_cell
     feed_all
     feed_herbivores
     feed_carnivores
     age_animals
     death_in_cell
-    add_immigrants
     remove_emigrants
-    emigratiom
+    emigration
     ---------------
 
     """
-    params = {}
+    params = Parameters()
+    herbivore_class = Herbivore
+    carnivore_class = Carnivore
+    _base_type = None
 
     @classmethod
     def set_params(cls, new_params):
         """
-        Updates the parameters
+        Updates the parameters. The parameters are frozen, so the class gets a new Parameters
+        object, and other landscape types are not affected.
         :param new_params: dict, dictionary with parameters
         :return: None
         """
         if not isinstance(new_params, dict):
             raise TypeError('Input has to be of type dict')
 
-        cls.params.update(new_params)
+        cls.params = cls.params.replace(new_params)
+
+    @classmethod
+    def with_params(cls, herbivore_class=Herbivore, carnivore_class=Carnivore, params=None):
+        """
+        Creates a subclass of the landscape type with its own parameters, whose cells hold
+        animals of the given species classes. Used to give every simulation its own parameters.
+        :param herbivore_class: class, species of the herbivores, see Animals.with_params
+        :param carnivore_class: class, species of the carnivores, see Animals.with_params
+        :param params: Parameters, defaults to the current parameters of the landscape type
+        :return: class, subclass of the landscape type with the same name
+        """
+        return type(cls.__name__, (cls,),
+                    {'params': cls.params if params is None else params,
+                     'herbivore_class': herbivore_class,
+                     'carnivore_class': carnivore_class,
+                     '_base_type': cls.landscape_type(),
+                     '__module__': cls.__module__})
+
+    @classmethod
+    def landscape_type(cls):
+        """
+        The landscape type of the class, e.g Lowland, also for the subclasses made by
+        with_params.
+        :return: class
+        """
+        return cls._base_type or cls
+
+    def __reduce__(self):
+        """
+        Pickles the cell as its landscape type and the parameters of the landscape type and
+        species, instead of its class, which may be a subclass made by with_params.
+        :return: tuple, see the pickle module
+        """
+        herbivores, carnivores = self.herbivore_class, self.carnivore_class
+        return _restore_cell, (self.landscape_type(), self.params,
+                               herbivores.species(), herbivores.params,
+                               carnivores.species(), carnivores.params), self.__dict__
 
-    def __init__(self):
+    def __init__(self, rng=None):
         """
         constructor for the cell super class.
+        :param rng: RandomPool or numpy.random.Generator, defaults to the default generator
+                    of biosim.rng
         """
+        self.rng = get_rng(rng)
         self.fodder = 0
         self.current_herbivores = []
         self.current_carnivores = []
@@ -87,52 +140,71 @@ class Cell:
 
     def place_animals(self, list_of_animals):
         """
-        Place animals from list into the cell.
+        Place animals from list into the cell. The animals of each species are created in one
+        call to from_arrays, which checks the ages and weights of all of them at once.
+        :param list_of_animals: list of dict, with the species, age and weight of every animal
         :return: None
         """
+        if not isinstance(list_of_animals, list):
+            raise TypeError('list_of_animals has to be of type list')
 
+        species_lists = {'Herbivore': (self.herbivore_class, self.current_herbivores),
+                         'Carnivore': (self.carnivore_class, self.current_carnivores)}
+        ages = {species: [] for species in species_lists}
+        weights = {species: [] for species in species_lists}
         for animal in list_of_animals:
-
-            if not isinstance(list_of_animals, list):
-                raise TypeError('list_of_animals has to be of type list')
-
-            age = animal['age']
-            weight = animal['weight']
             species = animal['species']
+            if species in species_lists:
+                ages[species].append(animal['age'])
+                weights[species].append(animal['weight'])
 
-            if species == 'Herbivore':
-                self.current_herbivores.append(Herbivore(age, weight))
-            if species == 'Carnivore':
-                self.current_carnivores.append(Carnivore(age, weight))
+        for species, (species_class, animals) in species_lists.items():
+            if ages[species]:
+                animals.extend(species_class.from_arrays(ages[species], weights[species],
+                                                         self.rng))
 
     def birth_cycle(self):
         """
-        Function that procreates the animals in a cell by iterating through all animals.
-        Appends newborn herbivores in to a list, then extends that list into list containing
-        current herbivores in cell
+        Function that procreates the animals in a cell, one species at a time, see births.
+        The newborns are added after all animals of the species have had the chance to give
+        birth, so they do not give birth themselves in the same year.
         :return: None
         """
-        newborn_herbivores = []
-        nr_herbivores = self.n_herbivores
-        if nr_herbivores > 1:
-            for herbivore in self.current_herbivores:
-                newborn_herbivore = herbivore.birth(nr_herbivores)
-                if newborn_herbivore is not None:
-
-                    newborn_herbivores.append(newborn_herbivore)
-
-        self.current_herbivores.extend(newborn_herbivores)
+        self.update_fitness_cell()
+        self.current_herbivores.extend(self.births(self.current_herbivores, self.herbivore_class))
+        self.current_carnivores.extend(self.births(self.current_carnivores, self.carnivore_class))
 
-        newborn_carnivores = []
-        nr_carnivores = self.n_carnivores
-        if nr_carnivores > 1:
-            for carnivore in self.current_carnivores:
-                newborn_carnivore = carnivore.birth(nr_carnivores)
-                if newborn_carnivore is not None:
-                    newborn_carnivores.append(newborn_carnivore)
-
-        self.current_carnivores.extend(newborn_carnivores)
-        # Can you think of a better way to implement this function? No need to do it now.
+    def births(self, animals, species_class):
+        """
+        Lets the animals of one species give birth, following the rules of Animals.birth, with
+        the conditions and probabilities of all the animals computed at once. One uniform number
+        is drawn for every animal, and one birth weight for every animal that passes the
+        probability test, in the order of the animals.
+        :param animals: list, the animals of the species in the cell, with up to date fitness
+        :param species_class: class, species of the animals
+        :return: list, the newborns
+        """
+        n_animals = len(animals)
+        if n_animals < 2:
+            return []
+        params = species_class.params
+
+        fitness = np.array([animal.fitness for animal in animals], dtype=float)
+        weight = np.array([animal.weight for animal in animals], dtype=float)
+        able = weight >= params.zeta * (params.w_birth + params.sigma_birth)
+        p_birth = np.minimum(1, params.gamma * fitness * (n_animals - 1))
+        parents = np.flatnonzero(able & (self.rng.random(n_animals) < p_birth))
+
+        birth_weight = self.rng.normal(params.w_birth, params.sigma_birth, len(parents))
+        loss = params.xi * birth_weight
+        gives_birth = loss < weight[parents]
+        parents = parents[gives_birth]
+        new_weight = weight[parents] - loss[gives_birth]
+
+        for parent, parent_weight in zip(parents.tolist(), new_weight.tolist()):
+            animals[parent].weight = parent_weight
+        return [species_class._create(0, newborn_weight)
+                for newborn_weight in birth_weight[gives_birth].tolist()]
 
     def weight_loss_cell(self):
         """
@@ -147,6 +219,13 @@ class Cell:
         for carnivore in self.current_carnivores:
             carnivore.yearly_weight_loss()
 
+    def update_fitness_cell(self):
+        """
+        Computes the stale fitness values of all animals in the cell in one batch per species.
+        :return: None
+        """
+        Animals.update_fitness_batch(self.current_herbivores + self.current_carnivores)
+
     def feed_all(self):
         """
         Function that calls the grow_fodder and feeding functions for both animals.
@@ -170,7 +249,7 @@ class Cell:
 
         :return: None
         """
-        np.random.shuffle(self.current_herbivores)
+        self.rng.shuffle(self.current_herbivores)
         for herbivore in self.current_herbivores:
             remaining_fodder = self.fodder
             if remaining_fodder <= 0:
@@ -187,19 +266,31 @@ class Cell:
         by fitness in decreasing order. The sorting is done with the sort function and attrgetter.
 
         We then iterate though each Carnivore in the list of carnivores. The eat_carn function
-        from the animals file is the called upon each Carnivore with the list of Herbivores as
-        input. The dead Herbivores are then appended to a dead_herbivores list. After that we use
-        a list comprehension to remove all the dead Herbivores from the cell.
+        from the animals file is the called upon each Carnivore with the Herbivores that are still
+        alive, in order of fitness. Killed Herbivores are only marked as dead in a list of flags,
+        which is done in constant time, and the list of Herbivores is compacted once after all
+        Carnivores have eaten. The Herbivores are offered to the Carnivores in the same order as
+        before, so the random draws in Carnivore.slay happen in the same order.
         :return:
         """
 
-        self.current_herbivores.sort(key=attrgetter('fitness'))
+        self.update_fitness_cell()
+        herbivores = sorted(self.current_herbivores, key=attrgetter('fitness'))
         self.current_carnivores.sort(key=attrgetter('fitness'), reverse=True)
 
+        position = {id(herb): index for index, herb in enumerate(herbivores)}
+        killed = [False] * len(herbivores)
+        first_alive = 0
+
         for carnivore in self.current_carnivores:
-            dead_herbivores = carnivore.eat_carn(self.current_herbivores)
-            self.current_herbivores = [herb for herb in self.current_herbivores if
-                                       herb not in dead_herbivores]
+            while first_alive < len(herbivores) and killed[first_alive]:
+                first_alive += 1
+            alive_herbivores = (herbivores[index] for index in range(first_alive, len(herbivores))
+                                if not killed[index])
+            for herb in carnivore.eat_carn(alive_herbivores, self.rng):
+                killed[position[id(herb)]] = True
+
+        self.current_herbivores = [herb for herb, dead in zip(herbivores, killed) if not dead]
 
     def age_animals(self):
 
@@ -220,78 +311,72 @@ class Cell:
     def death_in_cell(self):
 
         """
-        This function iterates through all animals in the cell. Then the death function is called
-        upon each animal. The death function determines wheter the animal dies. The dead animals
-        get appended into a list. Then a list comprehension will remove the dead animals from
-        the list of animals by using the dead animal list.
+        This function lets the animals in the cell die, following the rules of Animals.death, for
+        herbivores and carnivores together. The death probability omega * (1 - fitness) of every
+        animal is compared with one vector of random numbers drawn in a single call, and animals
+        without weight always die. The survivors are then kept in a single pass over the animals.
         :return: None
         """
 
-        dead_herbivores = []
-        for herbivore in self.current_herbivores:
-            if herbivore.death():
-                dead_herbivores.append(herbivore)
-        self.current_herbivores = [herb for herb in self.current_herbivores if
-                                   herb not in dead_herbivores]
+        self.update_fitness_cell()
+        animals = self.current_herbivores + self.current_carnivores
+        if not animals:
+            return
+        nr_herbivores = self.n_herbivores
 
-        dead_carnivores = []
-        for carnivore in self.current_carnivores:
-            if carnivore.death():
-                dead_carnivores.append(carnivore)
-        self.current_carnivores = [carn for carn in self.current_carnivores if
-                                   carn not in dead_carnivores]
+        fitness = np.array([animal.fitness for animal in animals], dtype=float)
+        weight = np.array([animal.weight for animal in animals], dtype=float)
+        omega = np.repeat([self.herbivore_class.params.omega,
+                           self.carnivore_class.params.omega],
+                          [nr_herbivores, self.n_carnivores])
 
-    def add_immigrants(self, list_animals):
-        if not isinstance(list_animals, list):
-            raise TypeError('input has to be of type list')
+        prob_death = omega * (1 - fitness)
+        dead = (weight <= 0) | (prob_death > self.rng.random(len(animals)))
 
-        herbs = [anim for anim in list_animals if anim.__class__.__name__ == 'Herbivore']
-        carns = [anim for anim in list_animals if anim.__class__.__name__ == 'Carnivore']
-        self.current_herbivores.extend(herbs)
-        self.current_carnivores.extend(carns)
+        survivors = [animal for animal, is_dead in zip(animals, dead.tolist()) if not is_dead]
+        herbivores_alive = nr_herbivores - int(np.count_nonzero(dead[:nr_herbivores]))
+        self.current_herbivores = survivors[:herbivores_alive]
+        self.current_carnivores = survivors[herbivores_alive:]
 
     def remove_emigrants(self, emigrants):
         """
         Removes emigrants from cell (removes them from self.current_herbivores and
-        self.current_carnivores.
+        self.current_carnivores. Every animal is kept or removed in a single pass, so the animals
+        that stay keep their order.
         :return:
         """
         if not isinstance(emigrants, list):
             raise TypeError('Input argument has to be of type dict')
-        self.current_herbivores = list(set(self.current_herbivores)-set(emigrants))
-        self.current_carnivores = list(set(self.current_carnivores) - set(emigrants))
+        leaving = set(emigrants)
+        self.current_herbivores = [herb for herb in self.current_herbivores
+                                   if herb not in leaving]
+        self.current_carnivores = [carn for carn in self.current_carnivores
+                                   if carn not in leaving]
 
     def emigration(self, adj_cells):
+        """
+        Decides which animals want to leave the cell, and where they want to go. Every animal
+        emigrates with probability mu * fitness, to one of the four adjacent cells chosen at
+        random. The random numbers for all animals in the cell are drawn in one call each. The
+        animals are not moved, that is left to the island.
+        :param adj_cells: list, the four cells adjacent to this cell
+        :return: tuple of two lists, destination of every herbivore and of every carnivore in the
+                 cell, in the same order as the animals, None for the animals that stay
+        """
+        self.update_fitness_cell()
+        animals = self.current_herbivores + self.current_carnivores
+        nr_herbivores = self.n_herbivores
 
-        if not isinstance(adj_cells, list):
-            raise TypeError('input have to be of type list')
-        if not len(adj_cells) == 4:
-            raise ValueError('input list has to contain 4 elements')
-        for i in range(4):
-            if not isinstance(adj_cells[i], tuple):
-                raise TypeError('Elements of input list has to be of type tuple')
-            if len(adj_cells[i]) != 2:
-                raise ValueError('Tuple elements have to contain two elements')
-            if not isinstance(adj_cells[i][0], int) and (not isinstance(adj_cells[i][1], int)):
-                raise TypeError('Tuple elements have to be of type integers')
-
-        emigrants = {}
-
-        animal_list = self.current_carnivores + self.current_herbivores
-
-        list_of_emigrants = [emi for emi in animal_list if emi.migrate()
-                             and emi.has_migrated is False]
-        for emi in list_of_emigrants:
-            destination = adj_cells[np.random.randint(0, 4)]
-            if destination in emigrants.keys():
-                emigrants[destination].append(emi)
-            else:
-                emigrants[destination] = [emi]
+        fitness = np.array([animal.fitness for animal in animals], dtype=float)
+        mu = np.repeat([self.herbivore_class.params.mu, self.carnivore_class.params.mu],
+                       [nr_herbivores, self.n_carnivores])
 
-        for animal in animal_list:
-            animal.set_has_migrated(True)
+        moves = mu * fitness > self.rng.random(len(animals))
+        directions = self.rng.integers(0, 4, len(animals))
+        destinations = [adj_cells[direction] if move else None
+                        for move, direction in zip(moves.tolist(), directions.tolist())]
 
-        return emigrants
+        return destinations[:nr_herbivores], destinations[nr_herbivores:]
 
 
 class Highland(Cell):
@@ -301,14 +386,14 @@ class Highland(Cell):
     """
 
     migrate_to = True
-    params = {'f_max': 300.0}
+    params = FodderParams(f_max=300.0)
 
-    def __init__(self):
-        super().__init__()
-        self.fodder = self.params['f_max']
+    def __init__(self, rng=None):
+        super().__init__(rng)
+        self.fodder = self.params.f_max
 
     def grow_fodder(self):
-        self.fodder = self.params['f_max']
+        self.fodder = self.params.f_max
 
 
 class Lowland(Cell):
@@ -318,14 +403,14 @@ class Lowland(Cell):
     """
 
     migrate_to = True
-    params = {'f_max': 800.0}
+    params = FodderParams(f_max=800.0)
 
-    def __init__(self):
-        super().__init__()
-        self.fodder = self.params['f_max']
+    def __init__(self, rng=None):
+        super().__init__(rng)
+        self.fodder = self.params.f_max
 
     def grow_fodder(self):
-        self.fodder = self.params['f_max']
+        self.fodder = self.params.f_max
 
 
 class Desert(Cell):
@@ -344,3 +429,24 @@ class Sea(Cell):
     """
 
     migrate_to = False
+
+
+@lru_cache(maxsize=None)
+def _cached_landscape_type(landscape_type, params_type, items, herbivore_class, carnivore_class):
+    """
+    Subclass of a landscape type made by with_params, cached on the parameter values.
+    """
+    return landscape_type.with_params(herbivore_class, carnivore_class, params_type(dict(items)))
+
+
+def _restore_cell(landscape_type, params, herbivore_species, herbivore_params, carnivore_species,
+                  carnivore_params):
+    """
+    Recreates the class of a pickled cell, see Cell.__reduce__. The attributes of the cell are
+    restored by pickle afterwards.
+    """
+    herbivore_class = species_with_params(herbivore_species, herbivore_params)
+    carnivore_class = species_with_params(carnivore_species, carnivore_params)
+    cell_type = _cached_landscape_type(landscape_type, type(params), tuple(params.items()),
+                                       herbivore_class, carnivore_class)
+    return cell_type.__new__(cell_type)
@@ -0,0 +1,225 @@
+"""
+Movies of a simulation, written while the simulation runs.
+
+The frames are rendered by Visualization.render and given to a movie writer as RGBA arrays, so
+no image files are written on the way. FFmpegWriter pipes the raw frames to an ffmpeg process
+that encodes the movie. If ffmpeg is not installed, FrameArchiveWriter stores the raw frames in
+one .npy file instead, which can be memory-mapped with np.load and encoded later.
+"""
+
+import os
+import shutil
+import struct
+import subprocess
+import tempfile
+import numpy as np
+
+__author__ = "Haris Karovic", "Isak Finnøy"
+__email__ = "harkarov@nmbu.no", "isfi@nmbu.no"
+
+_FFMPEG_BINARY = 'ffmpeg'
+_DEFAULT_FPS = 10
+
+# every frame of a .npy archive starts after a header of this length, so the header can be
+# written again with the final number of frames when the archive is closed
+_ARCHIVE_HEADER_LENGTH = 128
+
+
+def _ffmpeg_output_args(filename):
+    """
+    The ffmpeg arguments for encoding a movie, chosen from the extension of the file name. An
+    mp4 movie uses the H.264 baseline profile and yuv420p pixels, which most players can show,
+    and the frame is padded to an even size, which yuv420p needs.
+    :param filename: String, name of the movie file
+    :return: list of String
+    """
+    args = ['-vf', 'pad=ceil(iw/2)*2:ceil(ih/2)*2']
+    if filename.endswith('.mp4'):
+        args += ['-c:v', 'libx264', '-profile:v', 'baseline', '-pix_fmt', 'yuv420p']
+    return args + [filename]
+
+
+def _run_ffmpeg(args, binary=_FFMPEG_BINARY, **kwargs):
+    """
+    Starts an ffmpeg process, which overwrites the output file and only reports errors.
+    :param args: list of String, arguments after the general ones
+    :param binary: String, name or path of the ffmpeg program
+    :param kwargs: passed on to subprocess.Popen
+    :return: subprocess.Popen
+    """
+    try:
+        return subprocess.Popen([binary, '-y', '-loglevel', 'error'] + args, **kwargs)
+    except OSError as err:
+        raise RuntimeError('ERROR: ffmpeg could not be started: {}'.format(err))
+
+
+def encode_images(image_pattern, filename, fps=_DEFAULT_FPS, binary=_FFMPEG_BINARY):
+    """
+    Encodes a movie from numbered image files with ffmpeg.
+    :param image_pattern: String, name of the images with a number format, e.g 'bs_%05d.png'
+    :param filename: String, name of the movie file
+    :param fps: Integer, frames per second
+    :param binary: String, name or path of the ffmpeg program
+    :return: None
+    """
+    process = _run_ffmpeg(['-framerate', str(fps), '-i', image_pattern] +
+                          _ffmpeg_output_args(filename), binary)
+    if process.wait() != 0:
+        raise RuntimeError('ERROR: ffmpeg failed with exit code {}'.format(process.returncode))
+
+
+class FFmpegWriter:
+    """
+    Encodes a movie by piping raw RGBA frames to the standard input of an ffmpeg process. The
+    process is started when the first frame is written, since the size of the frames is given by
+    the first frame.
+
+    Methods:
+    ---------------
+    write
+    close
+    ---------------
+    """
+
+    def __init__(self, filename, fps=_DEFAULT_FPS, binary=_FFMPEG_BINARY):
+        """
+        Constructor for the FFmpegWriter class
+        :param filename: String, name of the movie file, the extension gives the format
+        :param fps: Integer, frames per second
+        :param binary: String, name or path of the ffmpeg program
+        """
+        self.filename = filename
+        self.fps = fps
+        self.binary = binary
+        self.frame_shape = None
+        self._process = None
+        self._errors = None
+        self._closed = False
+
+    def write(self, frame):
+        """
+        Sends one frame to ffmpeg.
+        :param frame: numpy array, RGBA image with shape (height, width, 4) and dtype uint8
+        :return: None
+        """
+        if self._closed:
+            raise RuntimeError('The movie {} has already been closed'.format(self.filename))
+        if self._process is None:
+            self.frame_shape = frame.shape
+            height, width = frame.shape[:2]
+            # the messages of ffmpeg go to a file, since a pipe that is never read could fill up
+            # and stop ffmpeg while we write frames to it
+            self._errors = tempfile.TemporaryFile()
+            self._process = _run_ffmpeg(['-f', 'rawvideo', '-pix_fmt', 'rgba',
+                                         '-s', '{}x{}'.format(width, height),
+                                         '-r', str(self.fps), '-i', '-'] +
+                                        _ffmpeg_output_args(self.filename),
+                                        self.binary, stdin=subprocess.PIPE, stderr=self._errors)
+        elif frame.shape != self.frame_shape:
+            raise ValueError('All frames of a movie must have the same shape')
+
+        try:
+            self._process.stdin.write(np.ascontiguousarray(frame, dtype=np.uint8))
+        except BrokenPipeError:
+            self.close()
+
+    def close(self):
+        """
+        Ends the movie and waits for ffmpeg to finish encoding it.
+        :return: None
+        """
+        self._closed = True
+        if self._process is None:
+            return
+
+        process, self._process = self._process, None
+        try:
+            try:
+                process.stdin.close()
+            except BrokenPipeError:
+                pass
+            if process.wait() != 0:
+                self._errors.seek(0)
+                message = self._errors.read().decode(errors='replace').strip()
+                raise RuntimeError('ERROR: ffmpeg failed with: {}'.format(message))
+        finally:
+            self._errors.close()
+
+
+class FrameArchiveWriter:
+    """
+    Stores the raw RGB frames of a movie in one .npy file, with shape (frames, height, width, 3)
+    and dtype uint8. The frames are appended to the file as they come, and the number of frames
+    in the header is filled in when the writer is closed.
+
+    Methods:
+    ---------------
+    write
+    close
+    ---------------
+    """
+
+    def __init__(self, filename):
+        """
+        Constructor for the FrameArchiveWriter class
+        :param filename: String, name of the .npy file
+        """
+        self.filename = filename
+        self.frame_shape = None
+        self.n_frames = 0
+        self._file = None
+
+    def _write_header(self):
+        """
+        Writes the header of the .npy file, in version 1.0 of the format, padded to a fixed
+        length.
+        :return: None
+        """
+        header = repr({'descr': '|u1', 'fortran_order': False,
+                       'shape': (self.n_frames,) + self.frame_shape})
+        length = _ARCHIVE_HEADER_LENGTH - 10
+        self._file.seek(0)
+        self._file.write(np.lib.format.magic(1, 0) + struct.pack('<H', length) +
+                         header.ljust(length - 1).encode('latin1') + b'\n')
+
+    def write(self, frame):
+        """
+        Appends one frame to the archive.
+        :param frame: numpy array, RGBA image with shape (height, width, 4) and dtype uint8
+        :return: None
+        """
+        if self._file is None:
+            self.frame_shape = frame.shape[:2] + (3,)
+            self._file = open(self.filename, 'wb')
+            self._write_header()
+        elif frame.shape[:2] + (3,) != self.frame_shape:
+            raise ValueError('All frames of a movie must have the same shape')
+
+        self._file.write(np.ascontiguousarray(frame[..., :3], dtype=np.uint8))
+        self.n_frames += 1
+
+    def close(self):
+        """
+        Writes the number of frames to the header and closes the file.
+        :return: None
+        """
+        if self._file is None:
+            return
+
+        self._write_header()
+        self._file.close()
+        self._file = None
+
+
+def open_movie_writer(filename, fps=_DEFAULT_FPS, binary=_FFMPEG_BINARY):
+    """
+    Opens a writer for a movie, encoded by ffmpeg if it is installed, otherwise stored as a raw
+    frame archive with the same name and the extension .npy.
+    :param filename: String, name of the movie file
+    :param fps: Integer, frames per second
+    :param binary: String, name or path of the ffmpeg program
+    :return: FFmpegWriter or FrameArchiveWriter
+    """
+    if shutil.which(binary) is not None:
+        return FFmpegWriter(filename, fps, binary)
+    return FrameArchiveWriter(os.path.splitext(filename)[0] + '.npy')
@@ -0,0 +1,502 @@
+"""
+Island that is split into bands of rows, where every band is simulated by its own worker process.
+
+Feeding, birth, ageing, weight loss and death only involve the animals of one cell, so every band
+does them on its own animals. Only migration couples neighbouring cells: every band lets its
+animals migrate, and the animals that leave the band are sent through the main process to the
+band that owns their new cell, as a halo exchange. A year takes two round trips between the main
+process and the workers.
+"""
+
+import multiprocessing
+import weakref
+import numpy as np
+from biosim.island import Island
+from biosim.population import Population
+from biosim.rng import RandomPool
+
+__author__ = "Haris Karovic", "Isak Finnøy"
+__email__ = "harkarov@nmbu.no", "isfi@nmbu.no"
+
+
+class Band(Population):
+    """
+    Population of the animals in one band of rows of the island. The cells are indexed as in the
+    whole island, but the band only holds animals in the cells from first up to stop.
+
+    Methods:
+    ---------------
+    set_animal_parameters
+    set_landscape_parameters
+    emigrate
+    immigrate
+    end_year
+    snapshot
+    get_random_state
+    set_random_state
+    ---------------
+    """
+
+    def __init__(self, landscape_codes, neighbours, habitable, params, first, stop, seed):
+        """
+        Constructor for the Band class
+        :param landscape_codes: list, landscape code of every cell of the island
+        :param neighbours: 2D numpy array, index of the four adjacent cells of every cell
+        :param habitable: 1D numpy array of bool, whether animals can live in the cell
+        :param params: dict, parameters of the island, see Island.params
+        :param first: int, index of the first cell of the band
+        :param stop: int, index after the last cell of the band
+        :param seed: numpy.random.SeedSequence, seed of the random numbers of the band
+        """
+        species = [Island.species_types[name].with_params(params[name])
+                   for name in self.species_codes]
+        self.cell_types = {code: cell_type.with_params(*species, params=params[code])
+                           for code, cell_type in Island.cell_types.items()}
+        super().__init__([self.cell_types[code] for code in landscape_codes], neighbours,
+                         habitable, species, RandomPool(seed))
+        self.first = first
+        self.stop = stop
+
+    def set_animal_parameters(self, species, params):
+        """
+        Sets the parameters of one species in the band.
+        :param species: String, name of animal species
+        :param params: dict, new values of some of the parameters
+        :return: None
+        """
+        self.species_classes[self.species_codes[species]].set_params(params)
+
+    def set_landscape_parameters(self, landscape, params):
+        """
+        Sets the parameters of one landscape type in the band.
+        :param landscape: String, code letter for landscape
+        :param params: dict, new values of some of the parameters
+        :return: None
+        """
+        self.cell_types[landscape].set_params(params)
+
+    def emigrate(self):
+        """
+        Lets the animals migrate, and removes the animals that have moved out of the band.
+        :return: dict, 'species', 'age', 'weight' and 'cell' arrays of the animals that left
+        """
+        self.migration()
+        leaving = (self.cell < self.first) | (self.cell >= self.stop)
+        emigrants = {'species': self.species[leaving], 'age': self.age[leaving],
+                     'weight': self.weight[leaving], 'cell': self.cell[leaving]}
+        self.remove_animals(~leaving)
+        return emigrants
+
+    def immigrate(self, immigrants):
+        """
+        Adds animals that have moved into the band. They have already migrated this year.
+        :param immigrants: dict, 'species', 'age', 'weight' and 'cell' arrays of the animals
+        :return: None
+        """
+        first = len(self)
+        self.add_animals(immigrants['species'], immigrants['cell'], immigrants['age'],
+                         immigrants['weight'])
+        self.has_migrated[first:] = True
+
+    def end_year(self):
+        """
+        Resets the has_migrated status of every animal.
+        :return: None
+        """
+        self.has_migrated[:] = False
+
+    def snapshot(self):
+        """
+        Copies the state of every animal in the band.
+        :return: dict, 'species', 'age', 'weight', 'fitness' and 'cell' arrays
+        """
+        return {'species': self.species, 'age': self.age, 'weight': self.weight,
+                'fitness': self.fitness, 'cell': self.cell}
+
+    def get_random_state(self):
+        """
+        Returns the state of the random numbers of the band.
+        :return: dict, state of the RandomPool of the band
+        """
+        return self.rng.state
+
+    def set_random_state(self, state):
+        """
+        Restores the state of the random numbers of the band.
+        :param state: dict, as returned by get_random_state
+        :return: None
+        """
+        self.rng.state = state
+
+
+def _run_band(connection, band_args):
+    """
+    Main loop of a worker process. Every message is a list of (method, *args) tuples that are
+    called on the band in order, and the list of results is sent back. None stops the worker.
+    :param connection: multiprocessing Connection to the main process
+    :param band_args: tuple, arguments of the Band constructor
+    :return: None
+    """
+    band = Band(*band_args)
+    while True:
+        calls = connection.recv()
+        if calls is None:
+            break
+        try:
+            results = [getattr(band, name)(*args) for name, *args in calls]
+        except Exception as error:
+            connection.send(('error', error))
+        else:
+            connection.send(('ok', results))
+    connection.close()
+
+
+def _stop_workers(connections, workers):
+    """
+    Stops the worker processes of a ParallelIsland.
+    :param connections: list, connections to the workers
+    :param workers: list, worker processes
+    :return: None
+    """
+    for connection in connections:
+        try:
+            connection.send(None)
+        except (OSError, EOFError):
+            pass
+    for worker in workers:
+        worker.join()
+
+
+class ParallelIsland(Island):
+    """
+    Island where the map is split into bands of rows, balanced by the number of habitable cells,
+    and every band is simulated by its own worker process as a Band. Every band draws its random
+    numbers from its own stream, spawned from the seed of the island, so the results only depend
+    on that seed and on the number of bands.
+
+    The workers are stopped by close, or when the island is garbage collected.
+
+    Methods:
+    ---------------
+    close
+    ---------------
+    """
+
+    def __init__(self, insert_map, init_animals, seed=None, processes=None):
+        """
+        Constructor for the ParallelIsland class
+        :param insert_map: str, strings ordered in a square pattern
+        :param init_animals: list, list of dictionary, places herbivores and carnivores on the map
+        :param seed: int, seed of the random numbers of the island, see biosim.rng
+        :param processes: int, number of bands, defaults to the number of CPUs. There are never
+                          more bands than rows in the map.
+        """
+        self.processes = processes or multiprocessing.cpu_count()
+        super().__init__(insert_map, init_animals, seed)
+
+    def set_map_coordinates(self, map_input):
+        """
+        Takes a string arranged as a matrix, representing the island, and gives every location
+        its landscape class. No cells are made, since the animals live in the bands.
+        :param map_input: str, arranged like a matrix representing the island
+        :return: dict, dictionary with location and landscape class as a key-value pair
+        """
+        return {(y_index + 1, x_index + 1): self.cell_types[cell]
+                for y_index, line in enumerate(self.check_map(map_input))
+                for x_index, cell in enumerate(line)}
+
+    def index_cells(self):
+        """
+        Builds the lookup tables of the island, splits the rows of the map into bands and starts
+        one worker process per band.
+        :return: None
+        """
+        super().index_cells()
+        n_rows = max(y for y, x in self.locations)
+        width = len(self.locations) // n_rows
+        n_bands = max(1, min(self.processes, n_rows))
+
+        habitable_per_row = np.cumsum(self.habitable.reshape(n_rows, width).sum(axis=1))
+        cuts = np.searchsorted(habitable_per_row,
+                               habitable_per_row[-1] * np.arange(1, n_bands) / n_bands)
+        rows = np.r_[0, np.unique(np.clip(cuts + 1, 1, n_rows - 1)), n_rows]
+        self.bands = [(int(start) * width, int(stop) * width)
+                      for start, stop in zip(rows[:-1], rows[1:])]
+        self.band_of_cell = np.repeat(np.arange(len(self.bands)),
+                                      [stop - first for first, stop in self.bands])
+
+        codes = {cell_type: code for code, cell_type in self.cell_types.items()}
+        landscape_codes = [codes[cell_type] for cell_type in self.map.values()]
+        seeds = self.seed_sequence.spawn(len(self.bands))
+
+        self._connections = []
+        workers = []
+        for (first, stop), seed in zip(self.bands, seeds):
+            connection, worker_connection = multiprocessing.Pipe()
+            band_args = (landscape_codes, self.neighbours, self.habitable, self.params,
+                         first, stop, seed)
+            worker = multiprocessing.Process(target=_run_band,
+                                             args=(worker_connection, band_args), daemon=True)
+            worker.start()
+            self._connections.append(connection)
+            workers.append(worker)
+        self._finalizer = weakref.finalize(self, _stop_workers, self._connections, workers)
+
+    def seed_random_streams(self):
+        """
+        The random numbers of the bands are seeded by index_cells, when the workers are started.
+        :return: None
+        """
+        pass
+
+    def close(self):
+        """
+        Stops the worker processes. The island can not be used afterwards.
+        :return: None
+        """
+        self._finalizer()
+
+    def _broadcast(self, calls):
+        """
+        Sends calls to every band, and waits for all of them to finish.
+        :param calls: list of tuples (method, *args), or list with one such list per band
+        :return: list, results of the calls for every band
+        """
+        per_band = calls if calls and isinstance(calls[0], list) else [calls] * len(self.bands)
+        for connection, band_calls in zip(self._connections, per_band):
+            connection.send(band_calls)
+
+        replies = [connection.recv() for connection in self._connections]
+        for status, result in replies:
+            if status == 'error':
+                raise result
+        return [result for status, result in replies]
+
+    def _gather(self):
+        """
+        Collects the state of every animal on the island from all bands.
+        :return: dict, 'species', 'age', 'weight', 'fitness' and 'cell' arrays
+        """
+        snapshots = [results[0] for results in self._broadcast([('snapshot',)])]
+        return {key: np.concatenate([snapshot[key] for snapshot in snapshots])
+                for key in snapshots[0]}
+
+    def _counts(self):
+        """
+        Number of herbivores and carnivores in every cell.
+        :return: tuple of two 1D numpy arrays
+        """
+        counts = [results[0] for results in self._broadcast([('counts',)])]
+        return (sum(herbivores for herbivores, carnivores in counts),
+                sum(carnivores for herbivores, carnivores in counts))
+
+    def set_animal_parameters(self, species, params):
+        """
+        Sets the parameters of one species on this island and in every band.
+        :param species: String, name of animal species
+        :param params: dict, new values of some of the parameters
+        :return: None
+        """
+        super().set_animal_parameters(species, params)
+        self._broadcast([('set_animal_parameters', species, params)])
+
+    def set_landscape_parameters(self, landscape, params):
+        """
+        Sets the parameters of one landscape type on this island and in every band.
+        :param landscape: String, code letter for landscape
+        :param params: dict, new values of some of the parameters
+        :return: None
+        """
+        super().set_landscape_parameters(landscape, params)
+        self._broadcast([('set_landscape_parameters', landscape, params)])
+
+    def population_per_cell(self):
+        """
+        Returns the number of herbivores and carnivores in every cell, as arrays with the shape
+        of the map, collected from the counts kept by every band.
+        :return: tuple of two 2D numpy arrays
+        """
+        self.cell_counts[0], self.cell_counts[1] = self._counts()
+        return super().population_per_cell()
+
+    def _collect_statistics(self):
+        """
+        Collects the statistics returned by the statistics method from all bands.
+        :return: dict
+        """
+        animals = self._gather()
+        statistics = {}
+        for species, code in Band.species_codes.items():
+            selected = animals['species'] == code
+            statistics[species] = {'fitness': animals['fitness'][selected],
+                                   'age': animals['age'][selected].astype(float),
+                                   'weight': animals['weight'][selected]}
+        return statistics
+
+    def _per_species(self, key):
+        """
+        Splits one value of every animal into herbivores and carnivores.
+        :param key: str, 'fitness', 'age' or 'weight'
+        :return: list, two lists
+        """
+        animals = self._gather()
+        herbivores = animals['species'] == 0
+        return animals[key][herbivores].tolist(), animals[key][~herbivores].tolist()
+
+    def fitness_list(self):
+        """
+        Returns lists of the fitness of the herbivores and carnivores currently on the island.
+        :return: list, two lists
+        """
+        return self._per_species('fitness')
+
+    def age_list(self):
+        """
+        Returns lists of the ages of the herbivores and carnivores currently on the island
+        :return: list, two lists
+        """
+        return self._per_species('age')
+
+    def weight_list(self):
+        """
+        List of the weights of the herbivores and carnivores currently on the island.
+        :return: list, two lists
+        """
+        return self._per_species('weight')
+
+    def place_population(self, init_pop):
+        """
+        Method that places animals in the cells that constitutes the island, by sending them to
+        the band that owns the cell.
+        :param init_pop: list of dict, animals to be placed on the island
+        :return: None
+        """
+        per_band = [[] for _ in self.bands]
+        for position in init_pop:
+            loc = position['loc']
+            if loc not in self.map.keys():
+                raise KeyError('nonexistent loc in the map provided')
+            if not self.map[loc].migrate_to:
+                raise ValueError('Animal can not live in water')
+            index = self.cell_index[loc]
+            per_band[self.band_of_cell[index]].append(('place_animals', index, position['pop']))
+        self._broadcast(per_band)
+        self._statistics = None
+
+    def get_animals(self):
+        """
+        Returns every animal on the island as arrays, band by band.
+        :return: dict, 'species', 'age', 'weight' and 'cell' numpy arrays
+        """
+        animals = self._gather()
+        del animals['fitness']
+        return animals
+
+    def set_animals(self, animals):
+        """
+        Replaces every animal on the island, without any checks on the input. Every animal is
+        sent to the band that owns its cell.
+        :param animals: dict, 'species', 'age', 'weight' and 'cell' arrays, see get_animals
+        :return: None
+        """
+        owner = self.band_of_cell[animals['cell']]
+        calls = []
+        for band in range(len(self.bands)):
+            selected = owner == band
+            calls.append([('replace_animals', animals['species'][selected],
+                           animals['cell'][selected], animals['age'][selected],
+                           animals['weight'][selected])])
+        self._broadcast(calls)
+        self._statistics = None
+
+    def get_random_states(self):
+        """
+        Returns the states of the random numbers of every band.
+        :return: list of dict, states of the bit generators of the bands
+        """
+        return [results[0] for results in self._broadcast([('get_random_state',)])]
+
+    def set_random_states(self, states):
+        """
+        Restores the states of the random numbers of every band.
+        :param states: list, one state per band, as returned by get_random_states
+        :return: None
+        """
+        if len(states) != len(self.bands):
+            raise ValueError('Expected one random state per band, got {}'.format(len(states)))
+        self._broadcast([[('set_random_state', state)] for state in states])
+
+    def _exchange(self, emigrants):
+        """
+        Sends the animals that have left their band to the band that owns their new cell.
+        :param emigrants: list, emigrants of every band, see Band.emigrate
+        :return: list, one ('immigrate', immigrants) call per band
+        """
+        moved = {key: np.concatenate([band[key] for band in emigrants]) for key in emigrants[0]}
+        owner = self.band_of_cell[moved['cell']]
+        return [('immigrate', {key: values[owner == band] for key, values in moved.items()})
+                for band in range(len(self.bands))]
+
+    def procreate_cells_map(self):
+        """
+        Method that lets animals in a cell procreate and instantiates newborns.
+        :return: None
+        """
+        self._broadcast([('birth_cycle',)])
+
+    def feed_cells_island(self):
+        """
+        Method that updates the fodder in the cells, and makes all the animals eat.
+        :return: None
+        """
+        self._broadcast([('grow_fodder',), ('feed_herbivores',), ('feed_carnivores',)])
+
+    def age_in_cells(self):
+        """
+        Method that ages the animals by one year.
+        :return: None
+        """
+        self._broadcast([('age_animals',)])
+
+    def weightloss_island(self):
+        """
+        Method that makes the animals lose weight on an annual basis.
+        :return: None
+        """
+        self._broadcast([('weight_loss',)])
+
+    def update_fitness_island(self):
+        """
+        Method that computes the fitness of all animals on the island.
+        :return: None
+        """
+        self._broadcast([('update_fitness',)])
+
+    def die_island(self):
+        """
+        Method that lets the animals die.
+        :return: None
+        """
+        self._broadcast([('death',)])
+
+    def migration_island(self):
+        """
+        Method that lets the animals migrate to adjacent habitable cells, also across bands.
+        :return: None
+        """
+        emigrants = [results[0] for results in self._broadcast([('emigrate',)])]
+        self._broadcast([[call] for call in self._exchange(emigrants)])
+
+    def run_function_one_year(self):
+        """
+        Function that simulates one cycle of the island with two round trips to the bands. The
+        first does feeding, birth and migration, the second hands over the animals that moved to
+        another band, and does ageing, weight loss and death.
+        :return: None
+        """
+        results = self._broadcast([('grow_fodder',), ('feed_herbivores',),
+                                   ('feed_carnivores',), ('birth_cycle',), ('emigrate',)])
+        immigrants = self._exchange([band_results[-1] for band_results in results])
+        self._broadcast([[call, ('age_animals',), ('weight_loss',), ('death',), ('end_year',)]
+                         for call in immigrants])
+        self.year += 1
@@ -0,0 +1,93 @@
+from collections.abc import Mapping
+
+__author__ = "Haris Karovic", "Isak Finnøy"
+__email__ = "harkarov@nmbu.no", "isfi@nmbu.no"
+
+
+class Parameters(Mapping):
+    """
+    Frozen set of named parameters. Every parameter is stored in a slot, so it can be read as an
+    attribute, e.g params.beta, which is cheaper than a dict lookup. It can also be read like a
+    dict, e.g params['beta'], and compares equal to a dict with the same items.
+
+    The names of the parameters are given by _fields in the subclasses. A Parameters object is
+    never changed, use replace to get a copy with new values.
+    """
+    _fields = ()
+    __slots__ = ()
+
+    def __init__(self, values=None, **kwargs):
+        """
+        Constructor for the Parameters class
+        :param values: dict, value of every parameter
+        :param kwargs: values of parameters given by name
+        """
+        values = dict(values or {}, **kwargs)
+        for key in values:
+            if key not in self._fields:
+                raise KeyError('Invalid parameter name: ' + key)
+        for key in self._fields:
+            if key not in values:
+                raise KeyError('Missing parameter: ' + key)
+            object.__setattr__(self, key, values[key])
+
+    def __setattr__(self, key, value):
+        raise AttributeError('Parameters can not be changed, use replace')
+
+    def __delattr__(self, key):
+        raise AttributeError('Parameters can not be changed, use replace')
+
+    def __getitem__(self, key):
+        if key not in self._fields:
+            raise KeyError(key)
+        return getattr(self, key)
+
+    def __iter__(self):
+        return iter(self._fields)
+
+    def __len__(self):
+        return len(self._fields)
+
+    def __repr__(self):
+        return '{}({})'.format(type(self).__name__, dict(self))
+
+    def __reduce__(self):
+        return type(self), (dict(self),)
+
+    def replace(self, new_params):
+        """
+        Returns a copy of the parameters where some of the values are replaced.
+        :param new_params: dict, new values of some of the parameters
+        :return: Parameters, of the same type as this one
+        """
+        for key in new_params:
+            if key not in self._fields:
+                raise KeyError('Invalid parameter name: ' + key)
+        values = dict(self)
+        values.update(new_params)
+        return type(self)(values)
+
+
+class HerbivoreParams(Parameters):
+    """
+    Parameters of the Herbivore species.
+    """
+    _fields = ('w_birth', 'sigma_birth', 'beta', 'eta', 'a_half', 'phi_age', 'w_half',
+               'phi_weight', 'mu', 'gamma', 'zeta', 'xi', 'omega', 'F')
+    __slots__ = _fields
+
+
+class CarnivoreParams(Parameters):
+    """
+    Parameters of the Carnivore species.
+    """
+    _fields = HerbivoreParams._fields + ('DeltaPhiMax',)
+    __slots__ = _fields
+
+
+class FodderParams(Parameters):
+    """
+    Parameters of the landscape types where fodder grows, i.e Highland and Lowland.
+    """
+    _fields = ('f_max',)
+    __slots__ = _fields
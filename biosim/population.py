@@ -0,0 +1,368 @@
+import numpy as np
+from biosim.animals import Herbivore, Carnivore
+from biosim.rng import get_rng
+
+__author__ = "Haris Karovic", "Isak Finnøy"
+__email__ = "harkarov@nmbu.no", "isfi@nmbu.no"
+
+
+class Population:
+    """
+    Structure-of-arrays store for every animal on the island. Instead of one Python object per
+    animal, the age, weight, fitness, species, has_migrated status and cell index of all animals
+    are kept in contiguous numpy arrays, and the yearly phases are done as batched array operations
+    that follow the same rules as the Animals and Cell classes.
+
+    Cells are identified by their index in the row-major order of the island map. The number of
+    animals of every species in every cell is kept in the array cell_counts, which is updated
+    whenever animals are added, removed or migrate.
+
+    The random numbers are drawn from the RandomPool rng, with one call per phase for all
+    animals where the phase allows it.
+
+    Methods:
+    ---------------
+    add_animals
+    place_animals
+    remove_animals
+    replace_animals
+    update_fitness
+    counts
+    grow_fodder
+    feed_herbivores
+    feed_carnivores
+    birth_cycle
+    migration
+    age_animals
+    weight_loss
+    death
+    ---------------
+    """
+    species_classes = (Herbivore, Carnivore)
+    species_codes = {'Herbivore': 0, 'Carnivore': 1}
+
+    def __init__(self, landscape, neighbours, habitable, species_classes=None, rng=None):
+        """
+        Constructor for the Population class
+        :param landscape: list, landscape class (Highland, Lowland, Desert or Sea) of every cell
+        :param neighbours: 2D numpy array, index of the four adjacent cells of every cell
+        :param habitable: 1D numpy array of bool, whether animals can live in the cell
+        :param species_classes: tuple, herbivore and carnivore class whose parameters are used,
+                                defaults to Herbivore and Carnivore
+        :param rng: RandomPool or numpy.random.Generator, defaults to the default generator
+                    of biosim.rng
+        """
+        self.rng = get_rng(rng)
+        if species_classes is not None:
+            self.species_classes = tuple(species_classes)
+        self.landscape = list(landscape)
+        self.n_cells = len(self.landscape)
+        self.neighbours = np.asarray(neighbours, dtype=np.int64)
+        self.habitable = np.asarray(habitable, dtype=bool)
+        self.fodder = np.zeros(self.n_cells)
+
+        self.species = np.empty(0, dtype=np.int8)
+        self.age = np.empty(0, dtype=np.int64)
+        self.weight = np.empty(0, dtype=float)
+        self.fitness = np.empty(0, dtype=float)
+        self.cell = np.empty(0, dtype=np.int64)
+        self.has_migrated = np.empty(0, dtype=bool)
+        self.cell_counts = np.zeros((len(self.species_classes), self.n_cells), dtype=np.int64)
+
+        self.grow_fodder()
+
+    def __len__(self):
+        return len(self.species)
+
+    def _param(self, name, species=None):
+        """
+        Returns the value of a species parameter for every animal.
+        :param name: str, name of the parameter
+        :param species: 1D numpy array, species codes, defaults to all animals
+        :return: 1D numpy array
+        """
+        if species is None:
+            species = self.species
+        values = np.array([cls.params[name] for cls in self.species_classes])
+        return values[species]
+
+    @staticmethod
+    def _group_by_cell(cells):
+        """
+        Groups positions by cell.
+        :param cells: 1D numpy array, cell index of every position
+        :return: list of tuples (cell, positions), positions are given in their original order
+        """
+        if len(cells) == 0:
+            return []
+        order = np.argsort(cells, kind='stable')
+        sorted_cells = cells[order]
+        starts = np.flatnonzero(np.r_[True, sorted_cells[1:] != sorted_cells[:-1]])
+        return [(sorted_cells[start], group)
+                for start, group in zip(starts, np.split(order, starts[1:]))]
+
+    def add_animals(self, species, cells, ages, weights):
+        """
+        Appends animals to the population. No checks are done on the input.
+        :param species: int or 1D array, species codes of the animals
+        :param cells: 1D array, cell index of the animals
+        :param ages: 1D array, ages of the animals
+        :param weights: 1D array, weights of the animals
+        :return: None
+        """
+        n = len(cells)
+        species = np.broadcast_to(np.asarray(species, dtype=np.int8), (n,))
+        first = len(self)
+
+        self.species = np.concatenate((self.species, species))
+        self.age = np.concatenate((self.age, np.asarray(ages, dtype=np.int64)))
+        self.weight = np.concatenate((self.weight, np.asarray(weights, dtype=float)))
+        self.fitness = np.concatenate((self.fitness, np.zeros(n)))
+        self.cell = np.concatenate((self.cell, np.asarray(cells, dtype=np.int64)))
+        self.has_migrated = np.concatenate((self.has_migrated, np.zeros(n, dtype=bool)))
+        np.add.at(self.cell_counts, (self.species[first:], self.cell[first:]), 1)
+        self.update_fitness(np.arange(first, len(self)))
+
+    def place_animals(self, cell, list_of_animals):
+        """
+        Places animals from a list of dictionaries into a cell, with the same checks as
+        Cell.place_animals and the Animals constructor.
+        :param cell: int, index of the cell
+        :param list_of_animals: list of dict, animals to be placed
+        :return: None
+        """
+        if not isinstance(list_of_animals, list):
+            raise TypeError('list_of_animals has to be of type list')
+
+        species, ages, weights = [], [], []
+        for animal in list_of_animals:
+            age = animal['age']
+            weight = animal['weight']
+            code = self.species_codes[animal['species']]
+
+            if age != int(age):
+                raise TypeError("'age' must be of type int ")
+            if weight is not None:
+                if not isinstance(weight, (int, float)):
+                    raise TypeError('Weight must be either of type int or type float')
+                if weight < 0:
+                    raise ValueError("'weight' must be greater than or equal to zero")
+            if age < 0:
+                raise ValueError("'age' must be greater than or equal to zero")
+
+            if weight is None:
+                params = self.species_classes[code].params
+                weight = self.rng.normal(params.w_birth, params.sigma_birth)
+
+            species.append(code)
+            ages.append(age)
+            weights.append(weight)
+
+        self.add_animals(np.array(species), np.full(len(species), cell), ages, weights)
+
+    def remove_animals(self, keep):
+        """
+        Removes animals from the population.
+        :param keep: 1D numpy array of bool, True for the animals that remain
+        :return: None
+        """
+        np.subtract.at(self.cell_counts, (self.species[~keep], self.cell[~keep]), 1)
+        self.species = self.species[keep]
+        self.age = self.age[keep]
+        self.weight = self.weight[keep]
+        self.fitness = self.fitness[keep]
+        self.cell = self.cell[keep]
+        self.has_migrated = self.has_migrated[keep]
+
+    def replace_animals(self, species, cells, ages, weights):
+        """
+        Replaces every animal in the population. No checks are done on the input.
+        :param species: 1D array, species codes of the animals
+        :param cells: 1D array, cell index of the animals
+        :param ages: 1D array, ages of the animals
+        :param weights: 1D array, weights of the animals
+        :return: None
+        """
+        self.remove_animals(np.zeros(len(self), dtype=bool))
+        self.add_animals(species, cells, ages, weights)
+
+    def update_fitness(self, index=None):
+        """
+        Computes the fitness of the animals with one call to Animals.fitness_batch per species.
+        :param index: 1D numpy array, positions of the animals to update, defaults to all animals
+        :return: None
+        """
+        if index is None:
+            index = np.arange(len(self))
+        species = self.species[index]
+        for code, species_class in enumerate(self.species_classes):
+            animals = index[species == code]
+            self.fitness[animals] = species_class.fitness_batch(self.age[animals],
+                                                                self.weight[animals],
+                                                                species_class.params)
+
+    def counts(self):
+        """
+        Number of herbivores and carnivores in every cell. The counts are kept up to date as
+        animals are added, removed or migrate, so this does not look at the animals.
+        :return: tuple of two 1D numpy arrays of length n_cells, views of cell_counts
+        """
+        return self.cell_counts[0], self.cell_counts[1]
+
+    def grow_fodder(self):
+        """
+        Sets the fodder of every cell to the f_max parameter of its landscape type. Landscape
+        types without f_max get no fodder.
+        :return: None
+        """
+        self.fodder = np.array([cell_type.params.get('f_max', 0.0)
+                                for cell_type in self.landscape], dtype=float)
+
+    def feed_herbivores(self):
+        """
+        Herbivores eat in random order within each cell. With the herbivores of a cell in that
+        order, the k-th herbivore finds fodder - k*F left, so the amount eaten by every herbivore
+        can be computed at once, without looping.
+        :return: None
+        """
+        herbivores = np.flatnonzero(self.species == 0)
+        if len(herbivores) == 0:
+            return
+
+        params = self.species_classes[0].params
+        order = np.lexsort((self.rng.random(len(herbivores)), self.cell[herbivores]))
+        herbivores = herbivores[order]
+        cells = self.cell[herbivores]
+
+        starts = np.flatnonzero(np.r_[True, cells[1:] != cells[:-1]])
+        lengths = np.diff(np.r_[starts, len(cells)])
+        rank = np.arange(len(cells)) - np.repeat(starts, lengths)
+
+        eaten = np.clip(self.fodder[cells] - params.F * rank, 0, params.F)
+        self.weight[herbivores] += params.beta * eaten
+        self.fodder -= np.bincount(cells, weights=eaten, minlength=self.n_cells)
+        self.update_fitness(herbivores)
+
+    def feed_carnivores(self):
+        """
+        Carnivores prey on the herbivores in their cell, the fittest carnivore first, each trying
+        to kill the weakest herbivores first, following the rules of Carnivore.eat_carn.
+        :return: None
+        """
+        herbivores = np.flatnonzero(self.species == 0)
+        carnivores = np.flatnonzero(self.species == 1)
+        herbs_in_cell = {cell: herbivores[group]
+                         for cell, group in self._group_by_cell(self.cell[herbivores])}
+        carns_in_cell = [(cell, carnivores[group])
+                         for cell, group in self._group_by_cell(self.cell[carnivores])
+                         if cell in herbs_in_cell]
+        if not carns_in_cell:
+            return
+
+        params = self.species_classes[1].params
+        killed = np.zeros(len(self), dtype=bool)
+
+        for cell, carns in carns_in_cell:
+            herbs = herbs_in_cell[cell]
+            herbs = herbs[np.argsort(self.fitness[herbs], kind='stable')]
+            carns = carns[np.argsort(-self.fitness[carns], kind='stable')]
+
+            herb_fitness = self.fitness[herbs].tolist()
+            herb_weight = self.weight[herbs].tolist()
+            killed_in_cell = [False] * len(herbs)
+            first_alive = 0
+
+            for carn in carns:
+                fitness = self.fitness[carn]
+                amount_eaten = 0
+                while first_alive < len(herbs) and killed_in_cell[first_alive]:
+                    first_alive += 1
+
+                for j in range(first_alive, len(herbs)):
+                    if killed_in_cell[j]:
+                        continue
+                    if amount_eaten >= params.F or fitness <= herb_fitness[j]:
+                        break
+
+                    difference = fitness - herb_fitness[j]
+                    if difference < params.DeltaPhiMax:
+                        slain = self.rng.random() < difference / params.DeltaPhiMax
+                    else:
+                        slain = True
+
+                    if slain:
+                        eaten = min(herb_weight[j], params.F - amount_eaten)
+                        amount_eaten += eaten
+                        self.weight[carn] += params.beta * eaten
+                        self.update_fitness(np.array([carn]))
+                        fitness = self.fitness[carn]
+                        killed_in_cell[j] = True
+                        killed[herbs[j]] = True
+
+        self.remove_animals(~killed)
+
+    def birth_cycle(self):
+        """
+        Every animal with at least one other animal of the same species in its cell may give
+        birth, following the rules of Animals.birth. Newborns are appended at the end.
+        :return: None
+        """
+        n_same = np.zeros(len(self), dtype=np.int64)
+        for code, counts in enumerate(self.counts()):
+            same_species = self.species == code
+            n_same[same_species] = counts[self.cell[same_species]]
+
+        w_birth = self._param('w_birth')
+        sigma_birth = self._param('sigma_birth')
+        p_birth = np.minimum(1, self._param('gamma') * self.fitness * (n_same - 1))
+
+        able = (n_same > 1) & (self.weight >= self._param('zeta') * (w_birth + sigma_birth))
+        birth_weight = self.rng.normal(w_birth, sigma_birth)
+        loss = self._param('xi') * birth_weight
+        gives_birth = able & (self.rng.random(len(self)) < p_birth) & (loss < self.weight)
+
+        parents = np.flatnonzero(gives_birth)
+        self.weight[parents] -= loss[parents]
+        self.update_fitness(parents)
+        self.add_animals(self.species[parents], self.cell[parents],
+                         np.zeros(len(parents)), birth_weight[parents])
+
+    def migration(self):
+        """
+        Every animal that has not migrated yet this year moves to one of the four adjacent cells
+        with probability mu * fitness. The animal stays if the chosen cell is not habitable.
+        :return: None
+        """
+        moves = (self._param('mu') * self.fitness > self.rng.random(len(self))) & ~self.has_migrated
+        destination = self.neighbours[self.cell, self.rng.integers(0, 4, len(self))]
+        moves &= self.habitable[destination]
+
+        np.subtract.at(self.cell_counts, (self.species[moves], self.cell[moves]), 1)
+        np.add.at(self.cell_counts, (self.species[moves], destination[moves]), 1)
+        self.cell[moves] = destination[moves]
+        self.has_migrated[:] = True
+
+    def age_animals(self):
+        """
+        Ages every animal by one year.
+        :return: None
+        """
+        self.age += 1
+        self.update_fitness()
+
+    def weight_loss(self):
+        """
+        Every animal loses eta times its weight.
+        :return: None
+        """
+        self.weight -= self._param('eta') * self.weight
+        self.update_fitness()
+
+    def death(self):
+        """
+        Animals with no weight die, the others die with probability omega * (1 - fitness).
+        :return: None
+        """
+        prob_death = self._param('omega') * (1 - self.fitness)
+        dead = (self.weight <= 0) | (prob_death > self.rng.random(len(self)))
+        self.remove_animals(~dead)
@@ -0,0 +1,177 @@
+"""
+Streaming storage of the results of a simulation, year by year.
+
+The results are stored in a directory with one subdirectory per chunk of years. Every chunk holds
+one .npy file per column:
+
+    Year             1D, the year
+    Herbivore        1D, number of herbivores on the island
+    Carnivore        1D, number of carnivores on the island
+    Herbivore_cells  3D, number of herbivores in every cell, with shape (years, rows, columns)
+    Carnivore_cells  3D, number of carnivores in every cell
+
+Plain .npy files are used rather than .npz archives, since they can be memory-mapped, so a range
+of years can be read without loading the rest of the run.
+"""
+
+import os
+import numpy as np
+
+__author__ = "Haris Karovic", "Isak Finnøy"
+__email__ = "harkarov@nmbu.no", "isfi@nmbu.no"
+
+_COLUMNS = ('Year', 'Herbivore', 'Carnivore', 'Herbivore_cells', 'Carnivore_cells')
+_CHUNK_NAME = 'chunk_{:06d}'
+
+
+def _chunk_dirs(directory):
+    """
+    Lists the chunks in a results directory, in the order they were written.
+    :param directory: String, results directory
+    :return: list of String, paths of the chunks
+    """
+    names = sorted(name for name in os.listdir(directory)
+                   if name.startswith('chunk_') and not name.endswith('.tmp'))
+    return [os.path.join(directory, name) for name in names]
+
+
+class ResultsWriter:
+    """
+    Appends the results of every year to a results directory. The years are kept in preallocated
+    buffers, and written as a new chunk when chunk_years years have been collected or when flush
+    is called, so the memory used does not grow with the length of the run. New chunks are added
+    after the chunks already in the directory.
+
+    Methods:
+    ---------------
+    append
+    flush
+    ---------------
+    """
+
+    def __init__(self, directory, map_shape, chunk_years=100):
+        """
+        Constructor for the ResultsWriter class
+        :param directory: String, results directory, made if it does not exist
+        :param map_shape: tuple, number of rows and columns of the map
+        :param chunk_years: int, largest number of years in one chunk
+        """
+        if chunk_years < 1:
+            raise ValueError('chunk_years must be at least 1')
+
+        os.makedirs(directory, exist_ok=True)
+        self.directory = directory
+        self.map_shape = tuple(map_shape)
+        self.chunk_years = chunk_years
+        self._n_chunks = len(_chunk_dirs(directory))
+        self._n_years = 0
+
+        self._buffers = {'Year': np.zeros(chunk_years, dtype=np.int64),
+                         'Herbivore': np.zeros(chunk_years, dtype=np.int64),
+                         'Carnivore': np.zeros(chunk_years, dtype=np.int64),
+                         'Herbivore_cells': np.zeros((chunk_years,) + self.map_shape,
+                                                     dtype=np.int32),
+                         'Carnivore_cells': np.zeros((chunk_years,) + self.map_shape,
+                                                     dtype=np.int32)}
+
+    def append(self, year, herbivore_cells, carnivore_cells):
+        """
+        Adds the results of one year.
+        :param year: int, the year
+        :param herbivore_cells: 2D array, number of herbivores in every cell of the map
+        :param carnivore_cells: 2D array, number of carnivores in every cell of the map
+        :return: None
+        """
+        row = self._n_years
+        self._buffers['Year'][row] = year
+        self._buffers['Herbivore_cells'][row] = herbivore_cells
+        self._buffers['Carnivore_cells'][row] = carnivore_cells
+        self._buffers['Herbivore'][row] = self._buffers['Herbivore_cells'][row].sum()
+        self._buffers['Carnivore'][row] = self._buffers['Carnivore_cells'][row].sum()
+        self._n_years += 1
+
+        if self._n_years == self.chunk_years:
+            self.flush()
+
+    def flush(self):
+        """
+        Writes the years collected since the last chunk as a new chunk. The chunk is written
+        under a temporary name first, so readers never see a half-written chunk.
+        :return: None
+        """
+        if self._n_years == 0:
+            return
+
+        path = os.path.join(self.directory, _CHUNK_NAME.format(self._n_chunks))
+        temporary_path = path + '.tmp'
+        os.makedirs(temporary_path, exist_ok=True)
+        for column in _COLUMNS:
+            np.save(os.path.join(temporary_path, column + '.npy'),
+                    self._buffers[column][:self._n_years])
+        os.replace(temporary_path, path)
+
+        self._n_chunks += 1
+        self._n_years = 0
+
+
+class ResultsReader:
+    """
+    Reads the results written by a ResultsWriter. Every chunk is memory-mapped, so only the years
+    that are read are loaded from disk.
+
+    Methods:
+    ---------------
+    read
+    ---------------
+    """
+
+    def __init__(self, directory):
+        """
+        Constructor for the ResultsReader class
+        :param directory: String, results directory
+        """
+        self.directory = directory
+        self._chunks = _chunk_dirs(directory)
+        self._years = [np.load(os.path.join(chunk, 'Year.npy')) for chunk in self._chunks]
+
+    @property
+    def years(self):
+        """
+        Every year in the results.
+        :return: 1D numpy array
+        """
+        if not self._years:
+            return np.zeros(0, dtype=np.int64)
+        return np.concatenate(self._years)
+
+    def read(self, first_year=None, last_year=None):
+        """
+        Reads the results of a range of years. If the range lies within one chunk, the arrays are
+        read-only memory-mapped views of the file, otherwise only the selected years of every
+        chunk are loaded.
+        :param first_year: int, first year to read, defaults to the first year in the results
+        :param last_year: int, last year to read, defaults to the last year in the results
+        :return: dict, column name as key and numpy array as value, see the module docstring
+        """
+        selected = []
+        for chunk, years in zip(self._chunks, self._years):
+            keep = np.ones(len(years), dtype=bool)
+            if first_year is not None:
+                keep &= years >= first_year
+            if last_year is not None:
+                keep &= years <= last_year
+            rows = np.flatnonzero(keep)
+            if len(rows):
+                selected.append((chunk, slice(rows[0], rows[-1] + 1)))
+
+        if not self._chunks:
+            raise ValueError('No results in ' + self.directory)
+        if not selected:
+            selected = [(self._chunks[0], slice(0, 0))]
+
+        results = {}
+        for column in _COLUMNS:
+            parts = [np.load(os.path.join(chunk, column + '.npy'), mmap_mode='r')[rows]
+                     for chunk, rows in selected]
+            results[column] = parts[0] if len(parts) == 1 else np.concatenate(parts)
+        return results
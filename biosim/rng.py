@@ -0,0 +1,199 @@
+"""
+Random number streams of a simulation.
+
+Every island draws its random numbers from RandomPool streams, made from the seed of the
+simulation with numpy.random.SeedSequence, which spawns independent streams:
+
+    Island            one stream per cell of the map, in row-major order, so the random numbers
+                      used in a cell do not depend on the other cells or on the order in which
+                      the cells are visited
+    ArrayIsland       one stream, for the batched draws over all animals
+    ParallelIsland    one stream per band, drawn from by the worker process of the band
+
+A RandomPool spawns two numpy.random.Generator objects from its seed. The first one only draws
+the uniform numbers, in blocks that are handed out one or many at a time, and the second one
+draws everything else, i.e the normal birth weights, the directions of migration and the
+shuffles. The k-th uniform number used by a stream is therefore the k-th number drawn by the
+first generator, whatever the size of the blocks, and the results of a simulation only depend on
+its seed.
+
+Animals and cells that are used on their own, outside an island, draw from a default generator,
+which can be seeded with seed_default_rng.
+"""
+
+import numpy as np
+
+__author__ = "Haris Karovic", "Isak Finnøy"
+__email__ = "harkarov@nmbu.no", "isfi@nmbu.no"
+
+_default_rng = np.random.default_rng()
+_BLOCK_SIZE = 1024
+
+
+def seed_default_rng(seed=None):
+    """
+    Replaces the default generator by a new one made from a seed.
+    :param seed: int, seed of the generator, None gives a random seed
+    :return: None
+    """
+    global _default_rng
+    _default_rng = np.random.default_rng(seed)
+
+
+def get_rng(rng=None):
+    """
+    Returns the generator to draw from.
+    :param rng: numpy.random.Generator, or None for the default generator
+    :return: numpy.random.Generator
+    """
+    return _default_rng if rng is None else rng
+
+
+def spawn_generators(seed_sequence, n_streams):
+    """
+    Spawns independent generators from a seed sequence. The seed sequence remembers how many
+    streams it has spawned, so every call gives new streams.
+    :param seed_sequence: numpy.random.SeedSequence
+    :param n_streams: int, number of generators
+    :return: list of numpy.random.Generator
+    """
+    return [np.random.Generator(np.random.PCG64(child))
+            for child in seed_sequence.spawn(n_streams)]
+
+
+def spawn_pools(seed_sequence, n_streams, block_size=_BLOCK_SIZE):
+    """
+    Spawns independent random pools from a seed sequence, see spawn_generators.
+    :param seed_sequence: numpy.random.SeedSequence
+    :param n_streams: int, number of pools
+    :param block_size: int, number of uniform numbers drawn at a time by every pool
+    :return: list of RandomPool
+    """
+    return [RandomPool(child, block_size) for child in seed_sequence.spawn(n_streams)]
+
+
+def get_states(pools):
+    """
+    Returns the states of some random pools.
+    :param pools: list of RandomPool
+    :return: list of dict, the states, which can be stored as JSON
+    """
+    return [pool.state for pool in pools]
+
+
+def set_states(pools, states):
+    """
+    Restores the states returned by get_states.
+    :param pools: list of RandomPool
+    :param states: list of dict, one state per pool
+    :return: None
+    """
+    if len(states) != len(pools):
+        raise ValueError('Expected {} random states, got {}'.format(len(pools), len(states)))
+    for pool, state in zip(pools, states):
+        pool.state = state
+
+
+class RandomPool:
+    """
+    Stream of random numbers that draws its uniform numbers in large blocks, since drawing one
+    number costs several times more in the call to numpy than in making the number. It has the
+    methods of numpy.random.Generator that the simulation uses, so it can be given wherever a
+    generator is expected.
+
+    Methods:
+    ---------------
+    random
+    normal
+    integers
+    shuffle
+    ---------------
+    """
+
+    def __init__(self, seed_sequence, block_size=_BLOCK_SIZE):
+        """
+        Constructor for the RandomPool class
+        :param seed_sequence: numpy.random.SeedSequence, seed of the pool
+        :param block_size: int, number of uniform numbers drawn at a time
+        """
+        self.block_size = block_size
+        self.uniforms, self.generator = spawn_generators(seed_sequence, 2)
+        self._block_start = self.uniforms.bit_generator.state
+        self._block = np.empty(0)
+        self._position = 0
+
+    def _draw_block(self, n):
+        """
+        Draws a new block of at least n uniform numbers, which starts with the numbers of the
+        old block that were not used. The block is the numbers drawn after _block_start, so
+        _block_start is moved past the used numbers with PCG64.advance, which does not draw them.
+        :param n: int, number of uniform numbers that are needed
+        :return: None
+        """
+        unused = self._block[self._position:]
+        if len(unused):
+            bit_generator = np.random.PCG64()
+            bit_generator.state = self._block_start
+            bit_generator.advance(self._position)
+            self._block_start = bit_generator.state
+        else:
+            self._block_start = self.uniforms.bit_generator.state
+        new = self.uniforms.random(max(self.block_size, n - len(unused)))
+        self._block = np.concatenate((unused, new)) if len(unused) else new
+        self._position = 0
+
+    def random(self, size=None):
+        """
+        Returns the next uniform numbers of the pool, in [0, 1).
+        :param size: int, number of numbers, None for a single float
+        :return: float, or 1D numpy array of length size
+        """
+        if size is None:
+            if self._position >= len(self._block):
+                self._draw_block(1)
+            self._position += 1
+            return self._block[self._position - 1]
+
+        if self._position + size > len(self._block):
+            self._draw_block(size)
+        self._position += size
+        return self._block[self._position - size:self._position]
+
+    def normal(self, loc=0.0, scale=1.0, size=None):
+        """
+        Draws from a normal distribution, see numpy.random.Generator.normal.
+        """
+        return self.generator.normal(loc, scale, size)
+
+    def integers(self, low, high=None, size=None):
+        """
+        Draws random integers, see numpy.random.Generator.integers.
+        """
+        return self.generator.integers(low, high, size)
+
+    def shuffle(self, x):
+        """
+        Shuffles a sequence in place, see numpy.random.Generator.shuffle.
+        """
+        self.generator.shuffle(x)
+
+    @property
+    def state(self):
+        """
+        State of the pool. Instead of the unused uniform numbers, it holds the state of the
+        uniform generator before the first number of the current block, so the block can be
+        drawn again.
+        :return: dict, which can be stored as JSON
+        """
+        return {'uniforms': self._block_start,
+                'generator': self.generator.bit_generator.state,
+                'block_length': len(self._block),
+                'position': self._position}
+
+    @state.setter
+    def state(self, state):
+        self.uniforms.bit_generator.state = state['uniforms']
+        self._block_start = state['uniforms']
+        self._block = self.uniforms.random(state['block_length'])
+        self._position = state['position']
+        self.generator.bit_generator.state = state['generator']
@@ -1,20 +1,35 @@
 import numpy as np
-import matplotlib.pyplot as plt
-from biosim.island import Island
-from biosim.landscape import Lowland, Sea, Highland, Desert
-from biosim.animals import Herbivore, Carnivore
-from biosim.visualization import Visualization
-import pandas as pd
+from biosim.island import Island, ArrayIsland
+from biosim.parallel import ParallelIsland
+from biosim.results import ResultsWriter
+from biosim.movie import encode_images, open_movie_writer
+import functools
 import os
-import subprocess
+import json
 
-_FFMPEG_BINARY = 'ffmpeg'
-_CONVERT_BINARY = 'magick'
 
 _DEFAULT_GRAPHICS_DIR = os.path.join('results/')
 _DEFAULT_GRAPHICS_NAME = 'bs'
 _DEFAULT_MOVIE_FORMAT = 'mp4'
 
+_BACKENDS = {'objects': Island,
+             'arrays': ArrayIsland,
+             'parallel': ParallelIsland}
+
+
+class _simulation_or_class_method:
+    """
+    Decorator for methods that are called on a simulation, or on the BioSim class as before the
+    parameters belonged to each simulation. The method gets the simulation, or the class.
+    """
+
+    def __init__(self, method):
+        self.method = method
+        functools.update_wrapper(self, method)
+
+    def __get__(self, sim, cls):
+        return functools.partial(self.method, cls if sim is None else sim)
+
 
 class BioSim:
     """
@@ -22,27 +37,48 @@ class BioSim:
     """
     def __init__(self, island_map, ini_pop, seed=1,
                  ymax_animals=None, cmax_animals=None, hist_specs=None,
-                 img_base=None, img_fmt="png"):
+                 img_base=None, img_fmt="png", backend='objects', headless=False,
+                 processes=None, offscreen=False):
         """
         :param island_map: Multi-line string specifying island geography
         :param ini_pop: List of dictionaries specifying initial population
-        :param seed: Integer used as random number seed
+        :param seed: Integer used as random number seed, see biosim.rng
         :param ymax_animals: Number specifying y-axis limit for graph showing animal numbers
         :param cmax_animals: Dict specifying color-code limits for animal densities
         :param hist_specs: Specifications for histograms, see below
         :param img_base: String with beginning of file name for figures, including path
         :param img_fmt: String with file type for figures, e.g. ’png’
+        :param backend: String, 'objects' stores every animal as an object, 'arrays' stores all
+                        animals in numpy arrays, 'parallel' splits the island into bands of rows
+                        that are simulated by separate worker processes
+        :param headless: Bool, if True no graphics are made and matplotlib is never imported,
+                         the results are only available through history, statistics and
+                         animal_distribution
+        :param processes: Integer, number of worker processes of the 'parallel' backend, defaults
+                          to the number of CPUs
+        :param offscreen: Bool, if True the graphics are drawn on an off-screen canvas and only
+                          saved as images, no window is shown
         """
 
-        np.random.seed(seed)
+        if backend not in _BACKENDS:
+            raise ValueError('backend must be one of: ' + ', '.join(_BACKENDS))
+
+        self.backend = backend
         self._year = 0
         self._final_year = None
         self.inserted_map = island_map
-        self.island = Island(island_map, ini_pop)
+        if backend == 'parallel':
+            self.island = ParallelIsland(island_map, ini_pop, seed=seed, processes=processes)
+        else:
+            self.island = _BACKENDS[backend](island_map, ini_pop, seed=seed)
         self.img_base = img_base
         self.img_fmt = img_fmt
         self.img_ctr = 0
         self.hist_specs = hist_specs
+        self.headless = headless
+        self._history = {'Year': [], 'Herbivore': [], 'Carnivore': []}
+        self.results_writer = None
+        self.movie_writer = None
 
         if img_base is None:
             self.img_base = _DEFAULT_GRAPHICS_DIR+_DEFAULT_GRAPHICS_NAME
@@ -62,10 +98,12 @@ class BioSim:
         self._cmax_carn = cmax_carn
     #    self.vis_years = None
 
-        # set up graphics
-        self.visualization = Visualization()
-        self.visualization.graphics_setup(rgb_map=self.create_rgb_map(island_map))
-        # self.visualization.histogram_updates(self.island.fitness_list())
+        # set up graphics, matplotlib is only imported when graphics are made
+        self.visualization = None
+        if not headless:
+            from biosim.visualization import Visualization
+            self.visualization = Visualization(offscreen=offscreen)
+            self.visualization.graphics_setup(rgb_map=self.create_rgb_map(island_map))
 
     def simulate(self, num_years, vis_years=1, img_years=None):
         """
@@ -81,59 +119,169 @@ class BioSim:
             img_years = vis_years
 
         self._final_year = self._year + num_years
-
+        if not self.headless:
+            self.visualization.prepare_line_graph(self._final_year, vis_years)
 
         while self._year < self._final_year:
             self.island.run_function_one_year()
-
-            if self._year % vis_years == 0:
-                self.visualization.changing_text.set_text('Year:' + str(self._year))
-                self.visualization.update_graphics(vis_years, self.create_population_heatmap(),
-                                                   self.island.num_animals_per_species)
-
-                self.visualization.histogram_fitness_updates(self.island.fitness_list()[0],
-                                                             self.island.fitness_list()[1],
-                                                             self.hist_specs)
-                self.visualization.histogram_age_updates(self.island.age_list()[0],
-                                                         self.island.age_list()[1],
+            self._record_year()
+
+            if not self.headless:
+                if self._year % vis_years == 0:
+                    self.visualization.changing_text.set_text('Year:' + str(self._year))
+                    self.visualization.update_graphics(vis_years,
+                                                       self.create_population_heatmap(),
+                                                       self.island.num_animals_per_species)
+                    self.visualization.histogram_updates(self.island.statistics(),
                                                          self.hist_specs)
-                self.visualization.histogram_weight_updates(self.island.weight_list()[0],
-                                                            self.island.weight_list()[1],
-                                                            self.hist_specs)
 
-            if self._year % img_years == 0:
-                self.save_graphics(img_years)
+                if self._year % img_years == 0:
+                    self.save_graphics(img_years)
 
             self._year += 1
 
+        if self.results_writer is not None:
+            self.results_writer.flush()
 
-    @staticmethod
-    def set_animal_parameters(species, params):
+    def _record_year(self):
         """
-        Set parameters for animal species.
-        :param species: String, name of animal species
-        :param params: Dict with valid parameter specification for species
+        Appends the number of animals per species after the year just simulated to the history,
+        and to the results writer, if results are recorded.
+        :return: None
         """
+        counts = self.island.num_animals_per_species
+        self._history['Year'].append(self._year + 1)
+        self._history['Herbivore'].append(counts['Herbivore'])
+        self._history['Carnivore'].append(counts['Carnivore'])
 
-        if species == 'Herbivore':
-            Herbivore.set_params(params)
+        if self.results_writer is not None:
+            herbivore_cells, carnivore_cells = self.population_per_cell()
+            self.results_writer.append(self._year + 1, herbivore_cells, carnivore_cells)
 
-        if species == 'Carnivore':
-            Carnivore.set_params(params)
+    def record_results(self, directory, chunk_years=100):
+        """
+        Starts recording the number of animals on the island and in every cell after every year
+        to a results directory, see biosim.results. The results are written in chunks of at most
+        chunk_years years, and at the end of every call to simulate, and can be read with
+        biosim.results.ResultsReader.
+        :param directory: String, results directory
+        :param chunk_years: Integer, largest number of years kept in memory before writing
+        :return: None
+        """
+        self.results_writer = ResultsWriter(directory, self.island.map_shape, chunk_years)
 
-    @staticmethod
-    def set_landscape_parameters(landscape, params):
+    def population_per_cell(self):
+        """
+        Number of herbivores and carnivores in every cell, as arrays with the shape of the map,
+        see Island.population_per_cell.
+        :return: tuple of two 2D numpy arrays
+        """
+        return self.island.population_per_cell()
+
+    def save_checkpoint(self, path):
+        """
+        Saves the full state of the simulation to a binary numpy .npz file: the map, the year, the
+        history, the parameters, every animal as arrays of species, age, weight and cell, and the
+        state of the random numbers. The simulation can be continued from the file with
+        load_checkpoint, and gives the same results as if it had never stopped. The file is
+        written under a temporary name first, so a crash never leaves a half-written checkpoint.
+        :param path: String, name of the file
+        :return: None
+        """
+        animals = self.island.get_animals()
+        params = {name: dict(values) for name, values in self.island.params.items()}
+
+        temporary_path = path + '.tmp'
+        with open(temporary_path, 'wb') as checkpoint:
+            np.savez(checkpoint,
+                     island_map=np.array(self.inserted_map),
+                     backend=np.array(self.backend),
+                     params=np.array(json.dumps(params)),
+                     year=np.array([self._year, self.island.year, self.img_ctr]),
+                     history_year=np.array(self._history['Year'], dtype=np.int64),
+                     history_herbivore=np.array(self._history['Herbivore'], dtype=np.int64),
+                     history_carnivore=np.array(self._history['Carnivore'], dtype=np.int64),
+                     species=animals['species'],
+                     age=animals['age'],
+                     weight=animals['weight'],
+                     cell=animals['cell'],
+                     random_states=np.array(json.dumps(self.island.get_random_states())))
+        os.replace(temporary_path, path)
+
+    @classmethod
+    def load_checkpoint(cls, path, **kwargs):
         """
-        Set parameters for landscape type.
+        Makes a simulation from a file written by save_checkpoint, ready to continue where the
+        saved simulation stopped.
+        :param path: String, name of the file
+        :param kwargs: Other arguments to the BioSim constructor, e.g headless or img_base. The
+                       backend defaults to the one of the saved simulation. With another backend
+                       the simulation continues from the same animals, but with other random
+                       numbers. With the 'parallel' backend, the number of processes must be the
+                       same as when it was saved.
+        :return: BioSim
+        """
+        with np.load(path) as checkpoint:
+            data = {key: checkpoint[key] for key in checkpoint.files}
+
+        saved_backend = str(data['backend'])
+        kwargs.setdefault('backend', saved_backend)
+        sim = cls(str(data['island_map']), [], **kwargs)
+        for name, values in json.loads(str(data['params'])).items():
+            if name in sim.island.species:
+                sim.set_animal_parameters(name, values)
+            else:
+                sim.set_landscape_parameters(name, values)
+
+        sim._year, sim.island.year, sim.img_ctr = data['year'].tolist()
+        sim._history = {'Year': data['history_year'].tolist(),
+                        'Herbivore': data['history_herbivore'].tolist(),
+                        'Carnivore': data['history_carnivore'].tolist()}
+        sim.island.set_animals({key: data[key] for key in ('species', 'age', 'weight', 'cell')})
+
+        if sim.backend == saved_backend:
+            sim.island.set_random_states(json.loads(str(data['random_states'])))
+        return sim
+
+    @_simulation_or_class_method
+    def set_animal_parameters(self, species, params):
+        """
+        Set parameters for animal species. Called on a simulation, the parameters only apply to
+        that simulation. Called on the BioSim class, they become the defaults of the species,
+        used by the simulations made afterwards.
+        :param species: String, name of animal species
+        :param params: Dict with valid parameter specification for species
+        """
+        if isinstance(self, BioSim):
+            self.island.set_animal_parameters(species, params)
+        elif species not in Island.species_types:
+            raise KeyError('Invalid species: ' + str(species))
+        else:
+            Island.species_types[species].set_params(params)
+
+    @_simulation_or_class_method
+    def set_landscape_parameters(self, landscape, params):
+        """
+        Set parameters for landscape type. Called on a simulation, the parameters only apply to
+        that simulation. Called on the BioSim class, they become the defaults of the landscape
+        type, used by the simulations made afterwards.
         :param landscape: String, code letter for landscape
         :param params: Dict with valid parameter specification for landscape
         """
+        if isinstance(self, BioSim):
+            self.island.set_landscape_parameters(landscape, params)
+        elif landscape not in Island.cell_types:
+            raise KeyError('Invalid landscape: ' + str(landscape))
+        else:
+            Island.cell_types[landscape].set_params(params)
 
-        cell_types = {'H': Highland,
-                      'L': Lowland,
-                      'D': Desert,
-                      'W': Sea}
-        cell_types[landscape].set_params(params)
+    @property
+    def params(self):
+        """
+        Parameters of the simulation.
+        :return: dict, species or landscape code as key and frozen Parameters as value
+        """
+        return self.island.params
 
     @property
     def year(self):
@@ -143,6 +291,22 @@ class BioSim:
         """
         return self._year
 
+    @property
+    def history(self):
+        """
+        Number of animals per species after every simulated year.
+        :return: dict, with lists 'Year', 'Herbivore' and 'Carnivore'
+        """
+        return self._history
+
+    @property
+    def statistics(self):
+        """
+        Fitness, age and weight of all animals on the island, see Island.statistics.
+        :return: dict
+        """
+        return self.island.statistics()
+
     @property
     def num_animals(self):
         """
@@ -166,10 +330,7 @@ class BioSim:
         horizontally and vertically of the map simulated.
         :returns: int, positive integers, width and height of map.
         """
-        lines = self.inserted_map.strip()
-        lines = lines.split('\n')
-        lenx_map = len(lines[0])
-        leny_map = len(lines)
+        leny_map, lenx_map = self.island.map_shape
         return lenx_map, leny_map
 
     @staticmethod
@@ -192,19 +353,16 @@ class BioSim:
     @property
     def animal_distribution(self):
         """
-        Used pandas to make a dataframe with the size 4x273.
-        The 4 columns contain Row, Column, number of herbivores, number of carnivores.
+        Pandas dataframe with one row per cell, with the columns Row, Col, Herbivore and
+        Carnivore. pandas is only imported when this is used.
         :return: pandas dataframe
         """
-        data_dict = {'Row': [], 'Col': [], 'Herbivore': [], 'Carnivore': []}
-        for loc, cell in self.island.map.items():
-            x, y = loc
-            data_dict['Row'].append(x)
-            data_dict['Col'].append(y)
-            data_dict['Herbivore'].append(cell.n_herbivores)
-            data_dict['Carnivore'].append(cell.n_carnivores)
-        df = pd.DataFrame.from_dict(data_dict)
-        return df
+        import pandas as pd
+
+        herbivores, carnivores = self.population_per_cell()
+        rows, cols = np.indices(herbivores.shape) + 1
+        return pd.DataFrame({'Row': rows.ravel(), 'Col': cols.ravel(),
+                             'Herbivore': herbivores.ravel(), 'Carnivore': carnivores.ravel()})
 
     def add_population(self, population):
         """
@@ -216,59 +374,72 @@ class BioSim:
 
     def create_population_heatmap(self):
         """
-        This function creates a two dimensional array that will be used further to plot the
-        concentration on the heatmaps for herbivores and carnivores.
-
-        The dataframe from animal distribution is used. The Herbivore and Carnivore columns are
-        extracted and converted into a 1x273 one dimensional numpy array, the array is then
-        reshaped into a two dimensional numpy array which tells us how many animals are in each
-        cell. The two dimensional array resembles the map.
-
-        x_len and y_len are the length and width of the map, which is used to reshape the arrays.
+        This function returns the two dimensional arrays that will be used further to plot the
+        concentration on the heatmaps for herbivores and carnivores. The arrays resemble the map,
+        and tell how many animals are in each cell. On the object and array backends they are
+        views of the counts that the yearly phases keep up to date, on the parallel backend they
+        are collected from the bands, see Island.population_per_cell.
         :returns: 2D numpy arrays
         """
+        return self.population_per_cell()
 
-        x_len, y_len = self.length_of_map()
-
-        df = self.animal_distribution
-        df.set_index(['Row', 'Col'], inplace=True)
-        herb_array = np.asarray(df['Herbivore']).reshape(y_len, x_len)
-        carn_array = np.asarray(df['Carnivore']).reshape(y_len, x_len)
+    def record_movie(self, filename=None, fps=10, movie_fmt=_DEFAULT_MOVIE_FORMAT):
+        """
+        Starts recording a movie of the graphics, see biosim.movie. Every frame that would be
+        saved as an image by save_graphics is rendered and given straight to the movie writer
+        instead, so no image files are written. The movie is finished by make_movie.
+        If ffmpeg is not installed, the frames are stored as a raw frame archive with the
+        extension .npy.
+        :param filename: String, name of the movie file, defaults to img_base with the
+                         extension movie_fmt
+        :param fps: Integer, frames per second
+        :param movie_fmt: String, format of the movie when no file name is given, e.g 'mp4'
+        :return: None
+        """
+        if self.headless:
+            raise RuntimeError('No images are made in headless mode')
 
-        return herb_array, carn_array
+        if filename is None:
+            filename = '{}.{}'.format(self.img_base, movie_fmt)
+        self.movie_writer = open_movie_writer(filename, fps)
 
     def make_movie(self, movie_fmt=_DEFAULT_MOVIE_FORMAT):
         """
-        Make movie function in case we want to try to make a video automatically withh ffmpeg.
-        :param movie_fmt:
-        :return: None
+        Finishes the movie started by record_movie. If no movie is being recorded, a movie is
+        encoded with ffmpeg from the images saved by save_graphics.
+        :param movie_fmt: String, format of the movie made from the images, e.g 'mp4'
+        :return: String, name of the movie file
         """
 
         if self.img_base is None:
             raise RuntimeError('No filename is defined')
+        if self.headless:
+            raise RuntimeError('No images are made in headless mode')
+
+        if self.movie_writer is not None:
+            movie_writer, self.movie_writer = self.movie_writer, None
+            movie_writer.close()
+            return movie_writer.filename
 
-        if movie_fmt == 'mp4':
-            try:
-                subprocess.check_call([_FFMPEG_BINARY,
-                                       '-i', '{_%05d.png'.format(self.img_base),
-                                       '-y', 'profile:v', 'baseline',
-                                       '-level', 'yuv420p',
-                                       '{}-{}'.format(self.img_base, movie_fmt)])
-            except subprocess.CalledProcessError as err:
-                raise RuntimeError('ERROR: ffmpeg failed with: {}'. format(err))
+        filename = '{}.{}'.format(self.img_base, movie_fmt)
+        encode_images('{}_%05d.{}'.format(self.img_base, self.img_fmt), filename)
+        return filename
 
     def save_graphics(self, img_years):
         """
-        Function used to make photos of the plot.
+        Function used to make photos of the plot, or frames of the movie if one is recorded.
         :return: None
         """
 
-        if self.img_base is None:
+        if self.img_base is None or self.headless:
             return
 
         if self._year % img_years == 0:
+            if self.movie_writer is not None:
+                self.movie_writer.write(self.visualization.render())
+                return
 
-            plt.savefig('{base}_{num:05d}.{type}'.format(base=self.img_base,
-                                                         num=self.img_ctr,
-                                                         type=self.img_fmt))
+            self.visualization.save_frame('{base}_{num:05d}.{type}'.format(base=self.img_base,
+                                                                           num=self.img_ctr,
+                                                                           type=self.img_fmt))
             self.img_ctr += 1
@@ -0,0 +1,128 @@
+"""
+Runs many headless BioSim simulations with different parameters on a pool of processes.
+
+A parameter grid is a dict where every key names one parameter as '<target>.<parameter>', the
+target being an animal species or a landscape code, e.g. 'Herbivore.zeta', 'Carnivore.F' or
+'L.f_max', and every value is a list of the values to try. Every combination of values is one
+configuration of the sweep.
+"""
+
+import itertools
+import multiprocessing
+import numpy as np
+import pandas as pd
+from biosim.simulation import BioSim
+from biosim.animals import Herbivore, Carnivore
+from biosim.landscape import Highland, Lowland, Desert, Sea
+
+__author__ = "Haris Karovic", "Isak Finnøy"
+__email__ = "harkarov@nmbu.no", "isfi@nmbu.no"
+
+_TARGETS = {'Herbivore': Herbivore,
+            'Carnivore': Carnivore,
+            'H': Highland,
+            'L': Lowland,
+            'D': Desert,
+            'W': Sea}
+
+
+def expand_grid(param_grid):
+    """
+    Lists every configuration of a parameter grid. Every parameter name is checked against the
+    parameters of its target, so a misspelt name fails here and not in a worker process.
+    :param param_grid: dict, parameter name as key and list of values as value
+    :return: list of dict, parameter name as key and one value as value
+    """
+    if not isinstance(param_grid, dict):
+        raise TypeError('param_grid must be of type dict')
+    for name in param_grid:
+        target, _, param = name.partition('.')
+        if target not in _TARGETS or param not in _TARGETS[target].params:
+            raise KeyError('Invalid parameter name: ' + name)
+
+    names = list(param_grid)
+    return [dict(zip(names, values))
+            for values in itertools.product(*(param_grid[name] for name in names))]
+
+
+def _current_params():
+    """
+    Copies the current parameters of all animal species and landscape types.
+    :return: dict, target as key and dict of parameters as value
+    """
+    return {target: dict(cls.params) for target, cls in _TARGETS.items()}
+
+
+def _set_params(sim, base_params, config):
+    """
+    Sets the parameters of a simulation to base_params, with one configuration on top.
+    :param sim: BioSim, the simulation
+    :param base_params: dict, from _current_params
+    :param config: dict, one configuration from expand_grid
+    :return: None
+    """
+    params = {target: dict(values) for target, values in base_params.items()}
+    for name, value in config.items():
+        target, _, param = name.partition('.')
+        params[target][param] = value
+
+    for target, values in params.items():
+        if target in ('Herbivore', 'Carnivore'):
+            sim.set_animal_parameters(target, values)
+        else:
+            sim.set_landscape_parameters(target, values)
+
+
+def _run_single(task):
+    """
+    Runs one configuration of the sweep. The parameters are set on the simulation itself, so
+    nothing leaks between runs in the same worker process. The population is added after the
+    parameters are set, so animals without a weight get it from the parameters of the run.
+    :param task: tuple, (base_params, config, island_map, ini_pop, num_years, seed, backend)
+    :return: dict, history of the simulation
+    """
+    base_params, config, island_map, ini_pop, num_years, seed, backend = task
+    sim = BioSim(island_map, [], seed=seed, headless=True, backend=backend)
+    _set_params(sim, base_params, config)
+    sim.add_population(ini_pop)
+    sim.simulate(num_years)
+    return sim.history
+
+
+def run_sweep(island_map, ini_pop, param_grid, num_years, seed=1, processes=None,
+              backend='objects'):
+    """
+    Runs one headless simulation for every configuration of the parameter grid, spread over a
+    pool of processes. Every run starts from the parameters in effect when run_sweep is called,
+    with the configuration applied on top, and gets its own seed, spawned from seed with
+    numpy.random.SeedSequence, so the results do not depend on which process ran what.
+    :param island_map: Multi-line string specifying island geography
+    :param ini_pop: List of dictionaries specifying initial population
+    :param param_grid: dict, parameter name as key and list of values as value
+    :param num_years: int, number of years to simulate in every run
+    :param seed: int, seed used to spawn the seeds of the runs
+    :param processes: int, number of processes, defaults to the number of CPUs
+    :param backend: String, backend of BioSim, 'objects' or 'arrays'
+    :return: pandas DataFrame with one row per run and year, with columns 'Run', 'Seed', one
+             column per parameter in the grid, 'Year', 'Herbivore' and 'Carnivore'
+    """
+    configs = expand_grid(param_grid)
+    seeds = [int(child.generate_state(1)[0])
+             for child in np.random.SeedSequence(seed).spawn(len(configs))]
+    base_params = _current_params()
+    tasks = [(base_params, config, island_map, ini_pop, num_years, run_seed, backend)
+             for config, run_seed in zip(configs, seeds)]
+
+    with multiprocessing.Pool(processes) as pool:
+        histories = pool.map(_run_single, tasks)
+
+    tables = []
+    for run, (config, run_seed, history) in enumerate(zip(configs, seeds, histories)):
+        table = pd.DataFrame(history)
+        for name, value in reversed(list(config.items())):
+            table.insert(0, name, value)
+        table.insert(0, 'Seed', run_seed)
+        table.insert(0, 'Run', run)
+        tables.append(table)
+
+    return pd.concat(tables, ignore_index=True)
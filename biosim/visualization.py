@@ -1,19 +1,35 @@
 import matplotlib.pyplot as plt
+from matplotlib.backends.backend_agg import FigureCanvasAgg
+from matplotlib.figure import Figure
+from matplotlib.transforms import Bbox
 import numpy as np
 
 
 class Visualization:
     """
     This class sets up the visualization and updates of plots.
+
+    Frames are rendered by render with blitting: the parts of the figure that do not change
+    are drawn once and kept, and for every frame mostly just the data is drawn on top of them.
+    With offscreen=True the figure is drawn on its own Agg canvas, no window
+    is shown and plt.pause is never called, so the graphics only cost the time to render the
+    frames that are saved.
     """
 
-    def __init__(self):
+    def __init__(self, offscreen=False):
         """
         This is the constructor of the class.
+        :param offscreen: bool, draw on an off-screen canvas instead of in a window
         """
+        self.offscreen = offscreen
+        self._background = None
+        self._background_axes = 0
+        self._axes_backgrounds = {}
         self.steps = 0
-        self.current_herbivore_data = []
-        self.current_carnivore_data = []
+        self._line_years = np.zeros(0)
+        self._line_herbivores = np.zeros(0)
+        self._line_carnivores = np.zeros(0)
+        self._line_ymax = 0
 
     # These will be initated by the graphics_setup function
         self.fig_win = None
@@ -27,8 +43,11 @@ class Visualization:
         self.carnies_axis = None
         self.island_map_ax = None
         self.linegraph_ax = None
+        self.herbivore_line = None
+        self.carnivore_line = None
         self.year_txt = None
         self.changing_text = None
+        self.histograms = {}
 
     def graphics_setup(self, rgb_map=None):
         """
@@ -40,8 +59,12 @@ class Visualization:
         :param rgb_map: The rgb map of the island.
         :return: None
         """
-        self.fig_win = plt.figure(figsize=(16, 10))
-        plt.axis('off')
+        if self.offscreen:
+            self.fig_win = Figure(figsize=(16, 10))
+            FigureCanvasAgg(self.fig_win)
+        else:
+            self.fig_win = plt.figure(figsize=(16, 10))
+            plt.axis('off')
 
         self.fitness_ax = self.fig_win.add_subplot(6, 3, 16)
         self.fitness_ax.title.set_text('Histogram fitness')
@@ -72,8 +95,13 @@ class Visualization:
         # Let us create island at the beginning since it is constant
         self.island_map_ax.imshow(rgb_map)
 
-        # Line graphs
+        # Line graphs, the same two lines are updated with new data every year
         self.linegraph_ax = self.fig_win.add_axes([0.5, 0.65, 0.4, 0.3])
+        self.linegraph_ax.title.set_text('# of animals by species')
+        self.linegraph_ax.set_xlabel('years')
+        self.linegraph_ax.set_ylabel('number of species')
+        self.herbivore_line, = self.linegraph_ax.plot([], [], '-', color='g', linewidth=0.5)
+        self.carnivore_line, = self.linegraph_ax.plot([], [], '-', color='r', linewidth=0.5)
 
         # Year counter
         self.year_txt = self.fig_win.add_axes([0.5, 0.95, 0.05, 0.05])
@@ -81,7 +109,50 @@ class Visualization:
         self.changing_text = self.year_txt.text(0.2, 0.5, 'Year:' + str(0),
                                                 fontdict={'weight': 'bold', 'size': 16})
 
-        plt.pause(0.01)
+        if not self.offscreen:
+            plt.pause(0.01)
+
+    @property
+    def current_herbivore_data(self):
+        """
+        Number of herbivores at every update of the line graph.
+        :return: 1D numpy array
+        """
+        return self._line_herbivores[:self.steps]
+
+    @property
+    def current_carnivore_data(self):
+        """
+        Number of carnivores at every update of the line graph.
+        :return: 1D numpy array
+        """
+        return self._line_carnivores[:self.steps]
+
+    def _reserve_line_data(self, length):
+        """
+        Makes room for at least length points in the arrays behind the line graph. The arrays are
+        only reallocated when they are too short, and then keep the points already shown.
+        :param length: int, number of points
+        :return: None
+        """
+        if length <= len(self._line_years):
+            return
+        for name in ('_line_years', '_line_herbivores', '_line_carnivores'):
+            old_data = getattr(self, name)
+            data = np.zeros(length)
+            data[:len(old_data)] = old_data
+            setattr(self, name, data)
+
+    def prepare_line_graph(self, final_year, years):
+        """
+        Allocates the arrays behind the line graph for a simulation up to final_year, and fixes
+        the x-axis, so that updating the line graph takes the same time every year.
+        :param final_year: int, last year of the simulation
+        :param years: int, years between every update of the line graph
+        :return: None
+        """
+        self._reserve_line_data(self.steps + final_year // years + 1)
+        self.linegraph_ax.set_xlim(0, final_year)
 
     def update_graphics(self, years, distribution_array=None, num_species_dict=None):
         """
@@ -118,26 +189,223 @@ class Visualization:
         else:
             self.carnies_axis.set_data(distribution_array[1])
 
-        # line graph plot update:
-        self.current_herbivore_data.append(num_species_dict['Herbivore'])
-        self.current_carnivore_data.append(num_species_dict['Carnivore'])
+        # line graph plot update, only the data of the two lines changes
+        if self.steps > len(self._line_years):
+            self._reserve_line_data(2 * self.steps)
+        index = self.steps - 1
+        self._line_years[index] = index * years
+        self._line_herbivores[index] = num_species_dict['Herbivore']
+        self._line_carnivores[index] = num_species_dict['Carnivore']
 
-        length = len(self.current_carnivore_data)
-        x_value = list(np.arange(length))
-        x_value2 = []
-        for val in x_value:
-            x_value2.append(val*years)
+        self.herbivore_line.set_data(self._line_years[:self.steps], self.current_herbivore_data)
+        self.carnivore_line.set_data(self._line_years[:self.steps], self.current_carnivore_data)
 
-        self.linegraph_ax.set_ylim(0, (max(self.current_herbivore_data)))
+        if self._line_years[index] > self.linegraph_ax.get_xlim()[1]:
+            self.linegraph_ax.set_xlim(0, 2 * self._line_years[index])
+        if num_species_dict['Herbivore'] > self._line_ymax:
+            self._line_ymax = num_species_dict['Herbivore']
+            self.linegraph_ax.set_ylim(0, self._line_ymax)
 
-        self.linegraph_ax.title.set_text('# of animals by species')
-        self.linegraph_ax.set_xlabel('years')
-        self.linegraph_ax.set_ylabel('number of species')
+        if not self.offscreen:
+            plt.pause(1e-6)
 
-        self.linegraph_ax.plot(x_value2, self.current_herbivore_data, '-', color='g', linewidth=0.5)
-        self.linegraph_ax.plot(x_value2, self.current_carnivore_data, '-', color='r', linewidth=0.5)
+    @property
+    def _changing_axes(self):
+        """
+        The axes whose content changes from frame to frame.
+        :return: list of axes
+        """
+        return [self.linegraph_ax, self.fitness_ax, self.age_ax, self.weight_ax,
+                self.heatmap_herbies_ax, self.heatmap_carnies_ax, self.year_txt]
+
+    @staticmethod
+    def _data_artists(ax):
+        """
+        The artists of an axes that are drawn for every frame, i.e the data and the spines, which
+        are drawn on top of the data.
+        :param ax: axes
+        :return: list of artists, in the order they are drawn
+        """
+        artists = ax.images + ax.collections + ax.patches + ax.lines + ax.texts
+        if ax.axison:
+            artists += list(ax.spines.values())
+        return sorted((artist for artist in artists if artist.get_visible()),
+                      key=lambda artist: artist.get_zorder())
+
+    @staticmethod
+    def _tight_region(ax, renderer):
+        """
+        Finds the area covered by an axes, with its ticks, labels and title.
+        :param ax: axes
+        :param renderer: renderer of the canvas
+        :return: Bbox, in display coordinates, padded by two pixels for antialiasing
+        """
+        return ax.get_tightbbox(renderer).padded(2)
+
+    @staticmethod
+    def _region_slices(region, shape):
+        """
+        Finds the pixels of the image buffer that a region of the figure covers. The rows of the
+        buffer go from the top of the figure, while the display coordinates go from the bottom.
+        :param region: Bbox, region in display coordinates
+        :param shape: tuple, shape of the image buffer
+        :return: tuple of two slices, rows and columns of the buffer
+        """
+        height, width = shape[:2]
+        x0, y0, x1, y1 = region.extents
+        rows = slice(max(int(height - y1), 0), min(int(np.ceil(height - y0)), height))
+        columns = slice(max(int(x0), 0), min(int(np.ceil(x1)), width))
+        return rows, columns
+
+    def _draw_decorations(self, axes, regions, renderer, buffer):
+        """
+        Draws the frame, ticks and labels of some of the changing axes on the background, and
+        keeps the result as the background of every axes.
+        :param axes: list of axes to draw
+        :param regions: dict, axes as key and the region to clear before drawing as value
+        :param renderer: renderer of the canvas
+        :param buffer: numpy array, RGBA buffer of the canvas
+        :return: None
+        """
+        for ax in axes:
+            rows, columns = self._region_slices(regions[ax], buffer.shape)
+            buffer[rows, columns] = self._background[rows, columns]
+        for ax in axes:
+            artists = self._data_artists(ax)
+            for artist in artists:
+                artist.set_visible(False)
+            ax.draw(renderer)
+            for artist in artists:
+                artist.set_visible(True)
+        for ax in axes:
+            region = self._tight_region(ax, renderer)
+            rows, columns = self._region_slices(region, buffer.shape)
+            self._axes_backgrounds[ax] = (ax.viewLim.get_points().copy(), region,
+                                          buffer[rows, columns].copy())
+
+    def _draw_background(self):
+        """
+        Draws the whole figure once without the changing axes and keeps it as the background,
+        and then draws the changing axes on top of it.
+        :return: None
+        """
+        canvas = self.fig_win.canvas
+        for ax in self._changing_axes:
+            ax.set_visible(False)
+        canvas.draw()
+        self._background = np.array(canvas.buffer_rgba())
+        self._background_axes = len(self.fig_win.axes)
+        for ax in self._changing_axes:
+            ax.set_visible(True)
+
+        renderer = canvas.get_renderer()
+        regions = {ax: Bbox.from_extents(0, 0, 0, 0) for ax in self._changing_axes}
+        self._axes_backgrounds = {}
+        self._draw_decorations(self._changing_axes, regions, renderer,
+                               np.asarray(canvas.buffer_rgba()))
+
+    def render(self):
+        """
+        Renders the current frame into the buffer of the canvas, with blitting.
+
+        The figure without the changing axes is drawn only the first time, and again if axes
+        have been added to the figure, e.g the colorbars of the heatmaps. The frame, ticks and
+        labels of a changing axes are drawn again only if its limits have changed, otherwise
+        they are copied from the last time they were drawn. Only the data, i.e the lines,
+        images, histograms and the year, is drawn for every frame.
+        :return: numpy array, RGBA image of the figure, a view of the canvas buffer
+        """
+        canvas = self.fig_win.canvas
+        if self._background is None or len(self.fig_win.axes) != self._background_axes:
+            self._draw_background()
+        renderer = canvas.get_renderer()
+        buffer = np.asarray(canvas.buffer_rgba())
+
+        regions = {}
+        changed = []
+        for ax in self._changing_axes:
+            limits, regions[ax], _ = self._axes_backgrounds[ax]
+            if not np.array_equal(ax.viewLim.get_points(), limits):
+                changed.append(ax)
+            for text in ax.texts:
+                # the text may grow outside the area of the axes, e.g the year
+                extent = text.get_window_extent(renderer)
+                if not np.array_equal(Bbox.union([regions[ax], extent]).extents,
+                                      regions[ax].extents):
+                    regions[ax] = Bbox.union([regions[ax], extent.padded(2)])
+                    changed.append(ax)
+
+        for ax in self._changing_axes:
+            if ax not in changed:
+                _, region, pixels = self._axes_backgrounds[ax]
+                rows, columns = self._region_slices(region, buffer.shape)
+                buffer[rows, columns] = pixels
+
+        # clearing the region of an axes also clears the part of other axes in the region, and
+        # new ticks and labels may reach into the region of other axes, so these axes have to be
+        # drawn again as well
+        drawn = []
+        while changed:
+            drawn += changed
+            changed = [ax for ax in self._changing_axes if ax not in drawn and
+                       any(regions[ax].overlaps(regions[other]) for other in drawn)]
+            if not changed:
+                self._draw_decorations(drawn, regions, renderer, buffer)
+                for ax in drawn:
+                    regions[ax] = Bbox.union([regions[ax], self._axes_backgrounds[ax][1]])
+                changed = [ax for ax in self._changing_axes if ax not in drawn and
+                           any(regions[ax].overlaps(regions[other]) for other in drawn)]
+
+        for ax in self._changing_axes:
+            for artist in self._data_artists(ax):
+                ax.draw_artist(artist)
+        return buffer
+
+    def save_frame(self, filename):
+        """
+        Renders the current frame and writes it to an image file, without drawing the figure
+        again like savefig does.
+        :param filename: str, name of the file, the extension gives the image format
+        :return: None
+        """
+        if not hasattr(self.fig_win.canvas, 'buffer_rgba'):
+            self.fig_win.savefig(filename)
+            return
+        plt.imsave(filename, self.render())
 
-        plt.pause(1e-6)
+    def _histogram(self, name, ax, title, hist_spec_dict):
+        """
+        Returns the histogram of one property, and makes it the first time, or again if the
+        specification of the property has changed.
+        :param name: str, 'fitness', 'age' or 'weight'
+        :param ax: the axes of the histogram
+        :param title: str, title of the histogram
+        :param hist_spec_dict: dict containing parameters in order to plot axes.
+        :return: Histogram
+        """
+        spec = None if hist_spec_dict is None else hist_spec_dict.get(name)
+        histogram = self.histograms.get(name)
+        if histogram is None or histogram.spec != spec:
+            if histogram is not None:
+                histogram.remove()
+            histogram = Histogram(ax, title, spec)
+            self.histograms[name] = histogram
+        return histogram
+
+    def histogram_updates(self, statistics, hist_spec_dict=None):
+        """
+        Updates the histograms for fitness, age and weight from one statistics snapshot.
+        :param statistics: dict, snapshot from Island.statistics, species as key and dict with
+                           'fitness', 'age' and 'weight' arrays as value
+        :param hist_spec_dict: dict containing parameters in order to plot axes.
+        :return: None
+        """
+        herbivores = statistics['Herbivore']
+        carnivores = statistics['Carnivore']
+        self.histogram_fitness_updates(herbivores['fitness'], carnivores['fitness'],
+                                       hist_spec_dict)
+        self.histogram_age_updates(herbivores['age'], carnivores['age'], hist_spec_dict)
+        self.histogram_weight_updates(herbivores['weight'], carnivores['weight'], hist_spec_dict)
 
     def histogram_fitness_updates(self, fitness_list_herb=None,
                                   fitness_list_carn=None,
@@ -149,22 +417,8 @@ class Visualization:
         :param hist_spec_dict: dict containing parameters in order to plot axes.
         :return: None
         """
-
-        if hist_spec_dict is None:
-            self.fitness_ax.clear()
-            self.fitness_ax.title.set_text('Histogram of fitness')
-            self.fitness_ax.hist(fitness_list_herb, bins=10, histtype='step', color='g')
-            self.fitness_ax.hist(fitness_list_carn, bins=10, histtype='step', color='r')
-
-        else:
-
-            fit_bins = (int(hist_spec_dict['fitness']['max'] / hist_spec_dict['fitness']['delta']))
-            self.fitness_ax.clear()
-            self.fitness_ax.title.set_text('Histogram of fitness')
-            self.fitness_ax.hist(fitness_list_herb, bins=fit_bins, histtype='step', color='g',
-                                 range=(0, hist_spec_dict['fitness']['max']))
-            self.fitness_ax.hist(fitness_list_carn, bins=fit_bins, histtype='step', color='r',
-                                 range=(0, hist_spec_dict['fitness']['max']))
+        self._histogram('fitness', self.fitness_ax, 'Histogram of fitness',
+                        hist_spec_dict).update(fitness_list_herb, fitness_list_carn)
 
     def histogram_age_updates(self, age_list_herb=None,
                               age_list_carn=None,
@@ -176,22 +430,8 @@ class Visualization:
         :param hist_spec_dict: hist_spec_dict: dict containing parameters in order to plot axes.
         :return: None
         """
-
-        if hist_spec_dict is None:
-            self.age_ax.clear()
-            self.age_ax.title.set_text('Histogram of age')
-            self.age_ax.hist(age_list_herb, bins=10, histtype='step', color='g')
-            self.age_ax.hist(age_list_carn, bins=10, histtype='step', color='r')
-
-        else:
-
-            fit_bins = (int(hist_spec_dict['age']['max'] / hist_spec_dict['age']['delta']))
-            self.age_ax.clear()
-            self.age_ax.title.set_text('Histogram of age')
-            self.age_ax.hist(age_list_herb, bins=fit_bins, histtype='step', color='g',
-                             range=(0, hist_spec_dict['age']['max']))
-            self.age_ax.hist(age_list_carn, bins=fit_bins, histtype='step', color='r',
-                             range=(0, hist_spec_dict['age']['max']))
+        self._histogram('age', self.age_ax, 'Histogram of age',
+                        hist_spec_dict).update(age_list_herb, age_list_carn)
 
     def histogram_weight_updates(self, weight_list_herb=None,
                                  weight_list_carn=None,
@@ -203,19 +443,81 @@ class Visualization:
         :param hist_spec_dict: hist_spec_dict: dict containing parameters in order to plot axes.
         :return: None
         """
+        self._histogram('weight', self.weight_ax, 'Histogram of weight',
+                        hist_spec_dict).update(weight_list_herb, weight_list_carn)
 
-        if hist_spec_dict is None:
-            self.weight_ax.clear()
-            self.weight_ax.title.set_text('Histogram of weight')
-            self.weight_ax.hist(weight_list_herb, bins=10, histtype='step', color='g')
-            self.weight_ax.hist(weight_list_carn, bins=10, histtype='step', color='r')
 
+class Histogram:
+    """
+    Histogram of one property of the herbivores and carnivores, drawn as one green and one red
+    step outline, like ax.hist with histtype='step'. The two step artists are made once, and
+    every update only gives them new heights. With a specification, the bins are fixed from 0 to
+    max with width delta. Without one, there are 10 bins over the range of the values of each
+    species, as with ax.hist, so the bin edges change with the values. The limits of the axes
+    only grow, and the y-limit is doubled when a count reaches above it, like the line graph, so
+    the limits seldom change and the frame of the axes can be copied when blitting.
+
+    Methods:
+    ---------------
+    update
+    remove
+    ---------------
+    """
+
+    def __init__(self, ax, title, spec=None):
+        """
+        Constructor for the Histogram class
+        :param ax: the axes of the histogram
+        :param title: str, title of the histogram
+        :param spec: dict, with 'max' and 'delta' of the bins, or None
+        """
+        self.ax = ax
+        self.spec = spec
+        if spec is None:
+            self.bins = 10
+            self.range = None
+            edges = np.linspace(0, 1, self.bins + 1)
         else:
+            self.bins = int(spec['max'] / spec['delta'])
+            self.range = (0, spec['max'])
+            edges = np.linspace(0, spec['max'], self.bins + 1)
+
+        ax.set_xlim(edges[0], edges[-1])
+        ax.set_ylim(0, 1)
+        ax.title.set_text(title)
+        self.herbivore_steps = ax.stairs(np.zeros(self.bins), edges, color='g')
+        self.carnivore_steps = ax.stairs(np.zeros(self.bins), edges, color='r')
 
-            fit_bins = (int(hist_spec_dict['weight']['max'] / hist_spec_dict['weight']['delta']))
-            self.weight_ax.clear()
-            self.weight_ax.title.set_text('Histogram of weight')
-            self.weight_ax.hist(weight_list_herb, bins=fit_bins, histtype='step', color='g',
-                                range=(0, hist_spec_dict['weight']['max']))
-            self.weight_ax.hist(weight_list_carn, bins=fit_bins, histtype='step', color='r',
-                                range=(0, hist_spec_dict['weight']['max']))
+    def update(self, herbivore_values, carnivore_values):
+        """
+        Counts the values in the bins and updates the heights of the step artists. The limits of
+        the axes are only changed if the steps reach outside them.
+        :param herbivore_values: array-like, values of the herbivores
+        :param carnivore_values: array-like, values of the carnivores
+        :return: None
+        """
+        xmin, xmax = self.ax.get_xlim()
+        ymax = self.ax.get_ylim()[1]
+        for steps, values in ((self.herbivore_steps, herbivore_values),
+                              (self.carnivore_steps, carnivore_values)):
+            counts, edges = np.histogram(values, bins=self.bins, range=self.range)
+            if self.range is None:
+                steps.set_data(counts, edges)
+                xmin, xmax = min(xmin, edges[0]), max(xmax, edges[-1])
+            else:
+                steps.set_data(counts)
+            if counts.max() > ymax:
+                ymax = 2 * counts.max()
+
+        if (xmin, xmax) != self.ax.get_xlim():
+            self.ax.set_xlim(xmin, xmax)
+        if ymax != self.ax.get_ylim()[1]:
+            self.ax.set_ylim(0, ymax)
+
+    def remove(self):
+        """
+        Removes the step artists from the axes.
+        :return: None
+        """
+        self.herbivore_steps.remove()
+        self.carnivore_steps.remove()
@@ -0,0 +1,70 @@
+# -*- coding: utf-8 -*-
+
+import tracemalloc
+import timeit
+
+from biosim.animals import Herbivore
+
+"""
+Memory and attribute access benchmark for the animals.
+
+Compares Herbivore, which keeps its attributes in slots, with an animal that keeps the same
+attributes in an instance dictionary, as the animals did before they got slots.
+"""
+
+__author__ = "Haris Karovic", "Isak Finnøy"
+__email__ = "harkarov@nmbu.no", "isfi@nmbu.no"
+
+N_ANIMALS = 200000
+
+
+class DictHerbivore:
+    """
+    Animal with the attributes of Herbivore in an instance dictionary.
+    """
+
+    def __init__(self, age, weight):
+        self._age = age
+        self._weight = weight
+        self._fitness = None
+        self._fitness_params = None
+        self.has_migrated = False
+
+
+def bytes_per_animal(species):
+    """
+    Memory allocated for every animal when N_ANIMALS animals are kept in a list.
+    :param species: class, called with age and weight
+    :return: float, bytes per animal
+    """
+    tracemalloc.start()
+    before = tracemalloc.get_traced_memory()[0]
+    animals = [species(5, 20.0) for _ in range(N_ANIMALS)]
+    after = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    del animals
+    return (after - before) / N_ANIMALS
+
+
+def access_time(animal):
+    """
+    Time to read the weight and write has_migrated of an animal.
+    :param animal: Herbivore or DictHerbivore
+    :return: float, nanoseconds per access
+    """
+    n = 1000000
+    seconds = timeit.timeit('animal._weight; animal.has_migrated = True', number=n,
+                            globals={'animal': animal})
+    return 1e9 * seconds / n
+
+
+if __name__ == '__main__':
+    slotted = bytes_per_animal(Herbivore)
+    with_dict = bytes_per_animal(DictHerbivore)
+    print('Memory per animal, {} animals:'.format(N_ANIMALS))
+    print('  with __dict__   {:6.1f} bytes'.format(with_dict))
+    print('  with __slots__  {:6.1f} bytes  ({:.0%} less)'.format(slotted,
+                                                                  1 - slotted / with_dict))
+    print('Attribute access:')
+    print('  with __dict__   {:6.1f} ns'.format(access_time(DictHerbivore(5, 20.0))))
+    print('  with __slots__  {:6.1f} ns'.format(access_time(Herbivore(5, 20.0))))
@@ -0,0 +1,21 @@
+import numpy as np
+import pytest
+
+__author__ = 'Haris Karovic', 'Isak Finnøy'
+__email__ = 'harkarov@nmbu.no', 'isfi@nmbu.no'
+
+
+@pytest.fixture
+def fixed_rng(mocker):
+    """
+    Makes random number generators whose random method always returns the given value, and whose
+    integers method returns zeros if zero_integers is set. The other methods draw from a seeded
+    generator.
+    """
+    def make(value, zero_integers=False):
+        rng = mocker.Mock(wraps=np.random.default_rng(1))
+        rng.random.return_value = value
+        if zero_integers:
+            rng.integers.side_effect = lambda low, high, size: np.zeros(size, dtype=int)
+        return rng
+    return make
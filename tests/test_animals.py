@@ -1,4 +1,5 @@
 from biosim.animals import Herbivore, Carnivore, Animals
+import numpy as np
 import pytest
 from scipy.stats import kstest
 ALPHA = 0.01
@@ -80,6 +81,50 @@ class TestAnimals:
         s = Species()
         assert isinstance(s, Animals)
 
+    @pytest.mark.parametrize('Species', [Herbivore, Carnivore])
+    def test_slots(self, Species):
+        """
+        Tests that the animals of a species, and of a subclass made by with_params, have no
+        instance dictionary, but still have their public attributes.
+        """
+        for s in Species(3, 10.0), Species.with_params()(3, 10.0):
+            assert not hasattr(s, '__dict__')
+            s.has_migrated = True
+            assert (s.age, s.weight, s.has_migrated) == (3, 10.0, True)
+            with pytest.raises(AttributeError):
+                s.colour = 'brown'
+
+    @pytest.mark.parametrize('Species', [Herbivore, Carnivore])
+    def test_from_arrays(self, Species):
+        """
+        Tests that from_arrays gives the same animals as the constructor, draws the weights that
+        are None, and raises the errors of the constructor for invalid ages and weights.
+        """
+        animals = Species.from_arrays(np.array([0, 3, 10]), [5.0, None, 20])
+        assert all(type(animal) is Species for animal in animals)
+        assert [animal.age for animal in animals] == [0, 3, 10]
+        assert animals[0].weight == 5.0 and animals[2].weight == 20
+        assert animals[1].weight > 0
+        assert [animal.fitness for animal in animals[::2]] == \
+            [Species(0, 5.0).fitness, Species(10, 20).fitness]
+        assert not any(animal.has_migrated for animal in animals)
+        assert Species.from_arrays([]) == []
+
+        weights = np.array([None, 5.0], dtype=object)
+        Species.from_arrays([1, 2], weights)
+        assert weights.tolist() == [None, 5.0]
+
+        with pytest.raises(TypeError):
+            Species.from_arrays([1.5], [10.0])
+        with pytest.raises(TypeError):
+            Species.from_arrays([1], ['heavy'])
+        with pytest.raises(ValueError):
+            Species.from_arrays([1], [-10.0])
+        with pytest.raises(ValueError):
+            Species.from_arrays([-1], [10.0])
+        with pytest.raises(ValueError):
+            Species.from_arrays([1, 2], [10.0])
+
     @pytest.mark.parametrize('Species', [Herbivore, Carnivore])
     def test_initial_weight(self, Species):
         """
@@ -150,6 +195,86 @@ class TestAnimals:
         f2 = s.fitness
         assert f1 == f2
 
+    @pytest.mark.parametrize('Species', [Herbivore, Carnivore])
+    def test_fitness_batch(self, Species):
+        """
+        Testing that fitness_batch gives the same fitness as update_fitness for every animal,
+        including zero fitness for animals without weight.
+        """
+        ages = [0, 2, 10, 50]
+        weights = [0.0, 5.0, 20.0, 40.0]
+        expected = [Species(age, weight).fitness for age, weight in zip(ages, weights)]
+        fitness = Species.fitness_batch(np.array(ages), np.array(weights), Species.params)
+        assert fitness == pytest.approx(expected)
+        assert fitness[0] == 0
+
+    def test_update_fitness_batch(self):
+        """
+        Testing that update_fitness_batch only recomputes stale fitness values, for animals of
+        both species in the same list.
+        """
+        h = Herbivore(2, 5.0)
+        c = Carnivore(2, 5.0)
+        fresh = Herbivore(2, 5.0)
+        for animal in h, c, fresh:
+            animal.age = 10
+            animal.weight = 30.0
+        fresh.fitness = 0.5
+        h.mark_fitness_stale()
+        c.mark_fitness_stale()
+        Animals.update_fitness_batch([h, c, fresh])
+        assert h.fitness == pytest.approx(Herbivore(10, 30.0).fitness)
+        assert c.fitness == pytest.approx(Carnivore(10, 30.0).fitness)
+        assert fresh.fitness == 0.5
+
+    @pytest.mark.parametrize('Species', [Herbivore, Carnivore])
+    def test_stale_fitness(self, Species):
+        """
+        Testing that fitness marked as stale is computed when it is read.
+        """
+        s = Species(2, 5.0)
+        s.weight = 30.0
+        s.mark_fitness_stale()
+        assert s.fitness == pytest.approx(Species(2, 30.0).fitness)
+
+    @pytest.mark.parametrize('Species', [Herbivore, Carnivore])
+    def test_fitness_cached(self, Species, mocker):
+        """
+        Testing that fitness is only computed when read, and only again after age or weight has
+        changed.
+        """
+        s = Species(2, 5.0)
+        spy = mocker.spy(Species, 'update_fitness')
+        s.update_age()
+        s.yearly_weight_loss()
+        s.eat(5.0)
+        assert spy.call_count == 0
+        f1 = s.fitness
+        f2 = s.fitness
+        assert spy.call_count == 1
+        assert f1 == f2
+        s.weight = 30.0
+        assert s.fitness_stale
+        assert s.fitness > f1
+        assert spy.call_count == 2
+
+    @pytest.mark.parametrize('Species', [Herbivore, Carnivore])
+    def test_set_params_invalidates_fitness(self, Species):
+        """
+        Testing that set_params marks the cached fitness of every animal of that species as stale.
+        """
+        s = Species(2, 5.0)
+        old_phi_weight = Species.params['phi_weight']
+        assert s.fitness_stale
+        s.update_fitness()
+        assert not s.fitness_stale
+        Species.set_params({'phi_weight': 2 * old_phi_weight})
+        try:
+            assert s.fitness_stale
+            assert s.fitness == pytest.approx(Species(2, 5.0).fitness)
+        finally:
+            Species.set_params({'phi_weight': old_phi_weight})
+
     @pytest.mark.parametrize('Species', [Herbivore, Carnivore])
     def test_fitness(self, Species):
         """
@@ -212,31 +337,31 @@ class TestAnimals:
         with pytest.raises(TypeError, match='params must be of type dict'):
             assert h.set_params([1])
 
-    def test_birth(self, mocker):
+    def test_birth(self, fixed_rng):
         """
-        Testing the birth function. Mocks out the random function with 0, guaranteeing that the
-        probability for death exceeds the random function, which should yield the boolean True.
+        Testing the birth function. Gives it a generator whose random numbers are 0, guaranteeing
+        that the probability for birth exceeds the random number, which should yield a newborn.
         """
-        mocker.patch("numpy.random.uniform", return_value=0)
+        rng = fixed_rng(0)
         h = Herbivore(2, 50.0)
         c = Carnivore(3, 50.0)
         h2 = Herbivore(0, 0)
-        herb = h.birth(30)
-        carni = c.birth(50)
+        herb = h.birth(30, rng)
+        carni = c.birth(50, rng)
         assert isinstance(herb, Herbivore)
         assert isinstance(carni, Carnivore)
-        assert h2.birth(10) is None
+        assert h2.birth(10, rng) is None
 
-    def test_death(self, mocker):
+    def test_death(self, fixed_rng):
         """
-        Testing the death function. Mocks out the random function with 0, guaranteeing that the
-        probability for death exceeds the random function, which should yield the boolean True.
+        Testing the death function. Gives it a generator whose random numbers are 0, guaranteeing
+        that the probability for death exceeds the random number, which should yield True.
         """
-        mocker.patch("numpy.random.uniform", return_value=0)
+        rng = fixed_rng(0)
         h = Herbivore(2, 5.0)
         c = Carnivore(3, 7.0)
-        dead_herb = h.death()
-        dead_carn = c.death()
+        dead_herb = h.death(rng)
+        dead_carn = c.death(rng)
         assert dead_herb is True
         assert dead_carn is True
 
@@ -248,37 +373,37 @@ class TestAnimals:
         h = Herbivore(0, 0)
         assert h.death() is True
 
-    def test_migrate(self, mocker):
+    def test_migrate(self, fixed_rng):
         """
-        Testing the migration function. Mocks out the random function with 0, guaranteeing that the
-        probability for migration exceeds the random function, which will then yield the boolean
-        True.
+        Testing the migration function. Gives it a generator whose random numbers are 0,
+        guaranteeing that the probability for migration exceeds the random number, which will then
+        yield the boolean True.
         """
-        mocker.patch('numpy.random.uniform', return_value=0)
+        rng = fixed_rng(0)
         h = Herbivore(2, 5.0)
         c = Carnivore(3, 7.0)
-        move_herb = h.migrate()
-        move_carn = c.migrate()
+        move_herb = h.migrate(rng)
+        move_carn = c.migrate(rng)
         assert move_herb is True
         assert move_carn is True
 
-    def test_slay(self, mocker):
+    def test_slay(self, fixed_rng):
 
-        mocker.patch('numpy.random.uniform', return_value=0)
+        rng = fixed_rng(0)
 
         h = Herbivore()
         c = Carnivore()
         h.fitness = 10
         c.fitness = 5
 
-        carn_slay_herb = c.slay(h)
+        carn_slay_herb = c.slay(h, rng)
 
         h2 = Herbivore()
         c2 = Carnivore()
         h2.fitness = 5
         c2.fitness = 10
 
-        carn_slay_herb2 = c2.slay(h2)
+        carn_slay_herb2 = c2.slay(h2, rng)
 
         assert carn_slay_herb is False
         assert carn_slay_herb2 is True
@@ -294,15 +419,15 @@ class TestAnimals:
 
             assert len(dead_herbs) == 0
 
-    def test_slay2(self, mocker):
-        mocker.patch('numpy.random.uniform', return_value=1)
+    def test_slay2(self, fixed_rng):
+        rng = fixed_rng(1)
         h3 = Herbivore()
         c3 = Carnivore()
+        c3.set_params({'DeltaPhiMax': 0.1})
         h3.fitness = 5
         c3.fitness = 10
-        c3.set_params({'DeltaPhiMax': 0.1})
 
-        carn_slay_herb3 = c3.slay(h3)
+        carn_slay_herb3 = c3.slay(h3, rng)
         assert carn_slay_herb3 is True
 
     def test_eat_carn2(self):
@@ -312,8 +437,8 @@ class TestAnimals:
         h_list = [h]
 
         c = Carnivore(5, 20)
-        c.fitness = 20
         c.set_params({'DeltaPhiMax': 10.0})
+        c.fitness = 20
         c.eat_carn(h_list)
         assert c.weight == 20 + 0.75 * h.weight
 
@@ -324,9 +449,9 @@ class TestAnimals:
         h_list = [h]
 
         c = Carnivore(5, 20)
+        c.set_params({'DeltaPhiMax': 10.0})
         c.fitness = 20
         old_weight = c.weight
-        c.set_params({'DeltaPhiMax': 10.0})
         c.eat_carn(h_list)
         assert c.weight == old_weight + c.params['beta'] * (h.weight-10)
 
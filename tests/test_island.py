@@ -1,5 +1,6 @@
 from biosim.animals import Herbivore, Carnivore
-from biosim.island import Island
+from biosim.island import Island, ArrayIsland
+import numpy as np
 import pytest
 import textwrap
 
@@ -66,6 +67,21 @@ class TestIsland:
         i = Island(default_maps, default_population)
         assert i.num_animals == 190
 
+    def test_num_animals_after_cell_change(self):
+        """
+        Tests that the counts of the island follow changes made directly to the cells, without
+        going through the island, once the animals have been counted again.
+        """
+        i = Island(default_maps, default_population)
+        i.map[(10, 10)].current_herbivores.extend([Herbivore(5, 20.0) for _ in range(12)])
+        i.map[(11, 10)].current_carnivores = [Carnivore(5, 20.0)]
+        assert i.num_animals == 190
+        i._count_animals()
+        assert i.num_animals == 190 + 12 + 1
+        assert i.num_animals_per_species == {'Herbivore': 162, 'Carnivore': 41}
+        assert i.animals_in_cells()[(11, 10)] == (0, 1)
+        assert i.population_per_cell()[0][9, 9] == 162
+
     def test_num_per_species(self):
         """
         Tests that num_animals_per_species returns a dictionary with the correct number of
@@ -75,6 +91,25 @@ class TestIsland:
         exp_dict = {'Herbivore': 150, 'Carnivore': 40}
         assert i.num_animals_per_species == exp_dict
 
+    @pytest.mark.parametrize('IslandType', [Island, ArrayIsland])
+    def test_statistics(self, IslandType):
+        """
+        Tests that statistics returns the fitness, age and weight of both species as numpy arrays
+        equal to the lists from fitness_list, age_list and weight_list, and that the snapshot is
+        cached until the year advances.
+        """
+        i = IslandType(default_maps, default_population)
+        stats = i.statistics()
+        for species, index in (('Herbivore', 0), ('Carnivore', 1)):
+            assert isinstance(stats[species]['fitness'], np.ndarray)
+            assert stats[species]['fitness'] == pytest.approx(i.fitness_list()[index])
+            assert stats[species]['age'].tolist() == i.age_list()[index]
+            assert stats[species]['weight'].tolist() == i.weight_list()[index]
+        assert i.statistics() is stats
+        i.run_function_one_year()
+        assert i.statistics() is not stats
+        assert len(i.statistics()['Herbivore']['age']) == i.num_animals_per_species['Herbivore']
+
     def test_check_map(self):
         """
         Tests that the check_map method determines the properties of the map of the island, and
@@ -153,12 +188,11 @@ class TestIsland:
         cords_dict = i.set_map_coordinates(default_maps)
         assert isinstance(cords_dict, dict)
 
-    def test_procreation_cells_map(self, mocker):
+    def test_procreation_cells_map(self, fixed_rng):
         """
         Asserts that the method procreation_cells_map makes animals in the various cells they
         populate procreate.
         """
-        mocker.patch("numpy.random.uniform", return_value=0)
         init_herbs = [{'loc': (10, 9),
                       'pop': [{'species': 'Herbivore',
                                'age': 5,
@@ -171,6 +205,8 @@ class TestIsland:
                               for _ in range(20)]}]
         fertile_population = init_herbs + init_carns
         i = Island(default_maps, fertile_population)
+        for cell in i.map.values():
+            cell.rng = fixed_rng(0)
         i.procreate_cells_map()
         assert i.num_animals_per_species['Herbivore'] > 20
         assert i.num_animals_per_species['Carnivore'] > 20
@@ -228,12 +264,13 @@ class TestIsland:
         assert sum(new_weights_carn) < sum(old_weights_carn)
         assert sum(new_weights_herb) < sum(old_weights_herb)
 
-    def test_die_island(self, mocker):
+    def test_die_island(self, fixed_rng):
         """
         Asserts that the die_island function makes sure that the animals die across all the cells.
         """
-        mocker.patch("numpy.random.uniform", return_value=0)
         i = Island(default_maps, default_population)
+        for cell in i.map.values():
+            cell.rng = fixed_rng(0)
         old_n_herbs = i.num_animals_per_species['Herbivore']
         old_n_carns = i.num_animals_per_species['Carnivore']
         i.die_island()
@@ -278,20 +315,68 @@ class TestIsland:
         adjacent_cells = [(11, 10), (9, 10), (10, 11), (10, 9)]
         assert i.get_adj_cells((10, 10)) == adjacent_cells
 
-    def test_migration_island(self, mocker):
+    def test_index_cells(self):
+        """
+        Asserts that the neighbour table holds the index of the adjacent cells given by
+        get_adj_cells, that the habitable mask matches the landscape types, and that the list of
+        habitable cells contains no water cells.
+        """
+        i = Island(default_maps, default_population)
+        index = i.cell_index[(10, 10)]
+        assert i.locations[index] == (10, 10)
+        assert [i.locations[adj] for adj in i.neighbours[index]] == i.get_adj_cells((10, 10))
+        assert i.neighbours.shape == (len(i.map), 4)
+        assert i.habitable.tolist() == [cell.migrate_to for cell in i.map.values()]
+        assert len(i.habitable_cells) == default_maps.count('L') + default_maps.count('H') + \
+            default_maps.count('D')
+        assert all(cell.migrate_to for cell in i.habitable_cells)
+
+    def test_migration_island(self, fixed_rng):
         """
         Asserts that the Island method migration_island migrates animals to an adjacent cell.
-        For the sake of simplicity, we mock out the numpy.random.randint to always return the same
-        adjacent cell, in this case (11, 10). Asserts that number of animals present in the cell
-        increases from zero to a number larger than zero.
+        For the sake of simplicity, the generator of the cell always draws the same adjacent cell,
+        in this case (11, 10). Asserts that number of animals present in the cell increases from
+        zero to a number larger than zero.
         """
-        mocker.patch("numpy.random.randint", return_value=0)
         i = Island(default_maps, default_population)
+        i.map[(10, 10)].rng = fixed_rng(0, zero_integers=True)
         old_pop_destination = i.map[11, 10].n_herbivores + i.map[(11, 10)].n_carnivores
         i.migration_island()
         new_pop_destination = i.map[11, 10].n_herbivores + i.map[(11, 10)].n_carnivores
         assert old_pop_destination == 0
         assert new_pop_destination > 0
+        assert i.num_animals == 190
+
+    def test_migration_island_once(self, fixed_rng):
+        """
+        Asserts that every animal migrates at most once a year, even when every animal wants to
+        move. All animals move from (10, 10) to (11, 10) and none continue to (12, 10).
+        """
+        i = Island(default_maps, default_population)
+        for cell in i.map.values():
+            cell.rng = fixed_rng(0, zero_integers=True)
+        i.migration_island()
+        assert i.map[(10, 10)].n_animals == (0, 0)
+        assert i.map[(11, 10)].n_animals == (150, 40)
+        assert i.map[(12, 10)].n_animals == (0, 0)
+
+    def test_migration_reproducible(self):
+        """
+        Asserts that two islands simulated with the same seed end up with exactly the same animals
+        in the same order in every cell.
+        """
+        islands = []
+        for _ in range(2):
+            i = Island(default_maps, default_population, seed=12345)
+            for _ in range(3):
+                i.run_function_one_year()
+            islands.append(i)
+        for loc, cell in islands[0].map.items():
+            other = islands[1].map[loc]
+            assert [h.weight for h in cell.current_herbivores] == \
+                [h.weight for h in other.current_herbivores]
+            assert [c.weight for c in cell.current_carnivores] == \
+                [c.weight for c in other.current_carnivores]
 
     def test_run_function_one_year(self):
         """
@@ -344,3 +429,33 @@ class TestIsland:
             for animal in cell.current_herbivores + cell.current_carnivores:
                 assert animal.has_migrated is False  # asserts that the animal's has_migrated
         # status is reset to false after each cyclus
+
+    def test_array_island_constructor(self):
+        """
+        Asserts that ArrayIsland places the same animals in the same cells as Island.
+        """
+        i = Island(default_maps, default_population)
+        a = ArrayIsland(default_maps, default_population)
+        assert a.num_animals == i.num_animals
+        assert a.num_animals_per_species == i.num_animals_per_species
+        assert a.animals_in_cells() == i.animals_in_cells()
+        assert sorted(a.weight_list()[0]) == sorted(i.weight_list()[0])
+        assert a.fitness_list()[1] == pytest.approx(i.fitness_list()[1])
+        with pytest.raises(ValueError):
+            a.place_population([{'loc': (1, 1),
+                                 'pop': [{'species': 'Herbivore', 'age': 5, 'weight': 40}]}])
+
+    def test_array_island_run_function_one_year(self):
+        """
+        Asserts that one year on an ArrayIsland ages the surviving animals, lets animals migrate
+        out of the initial cell and advances the year.
+        """
+        a = ArrayIsland(default_maps, default_population)
+        a.run_function_one_year()
+        assert a.year == 1
+        assert set(a.age_list()[0]) <= {1, 6}
+        assert set(a.age_list()[1]) <= {1, 6}
+        occupied = [loc for loc, (n_herbs, n_carns) in a.animals_in_cells().items()
+                    if n_herbs + n_carns > 0]
+        assert len(occupied) > 1
+        assert not a.population.has_migrated.any()
@@ -1,5 +1,6 @@
 from biosim.animals import Herbivore, Carnivore
 from biosim.landscape import Cell, Lowland, Highland, Sea
+import numpy as np
 import pytest
 
 __author__ = "Haris Karovic", "Isak Finnøy"
@@ -85,15 +86,13 @@ class TestLandscape:
         assert c.place_animals(h_list) == c.current_herbivores.append(h_list)
         assert c.place_animals(c_list) == c.current_carnivores.append(c_list)
 
-    def test_birth_cycle(self, mocker):
+    def test_birth_cycle(self, fixed_rng):
         """
-        Tests if birth_cycle method results in increase of Herbivores. Mocks out the random
-        function, numpy.random.uniform, with return_value 0, which implies birth_cycle always
-        returns new herbivore and carnivore objects, which should yield larger number of animals
-        in the cell.
+        Tests if birth_cycle method results in increase of Herbivores. Gives the cell a generator
+        whose random numbers are 0, which implies birth_cycle always returns new herbivore and
+        carnivore objects, which should yield larger number of animals in the cell.
         """
-        mocker.patch('numpy.random.uniform', return_value=0)
-        low = Lowland()
+        low = Lowland(fixed_rng(0))
         low.current_herbivores = [Herbivore(5, 100), Herbivore(5, 100)]
         low.current_carnivores = [Carnivore(5, 100), Carnivore(5, 100)]
         low.birth_cycle()
@@ -101,6 +100,24 @@ class TestLandscape:
         assert len(low.current_herbivores) >= 3
         assert len(low.current_carnivores) >= 3
 
+    def test_births(self, fixed_rng):
+        """
+        Tests that births follows the rules of Animals.birth: animals that are too light or
+        alone do not give birth, the others do when the random number is 0, and every parent
+        loses xi times the weight of its newborn.
+        """
+        low = Lowland(fixed_rng(0))
+        herbs = [Herbivore(5, 100.0), Herbivore(5, 10.0), Herbivore(5, 100.0)]
+        newborns = low.births(herbs, Herbivore)
+        params = Herbivore.params
+
+        assert len(newborns) == 2
+        assert all(type(newborn) is Herbivore and newborn.age == 0 for newborn in newborns)
+        assert herbs[1].weight == 10.0
+        for parent, newborn in zip(herbs[::2], newborns):
+            assert parent.weight == pytest.approx(100.0 - params.xi * newborn.weight)
+        assert low.births([Herbivore(5, 100.0)], Herbivore) == []
+
     def test_death_in_cell(self):
         """
         Asserts that setting the fitness and weight of animals to 0 results in death. Which is
@@ -121,6 +138,23 @@ class TestLandscape:
         assert len(c.current_herbivores) == 1
         assert len(c.current_carnivores) == 2
 
+    def test_death_in_cell_single_draw(self, fixed_rng):
+        """
+        Asserts that death_in_cell draws the random numbers for all animals in one call, and that
+        the surviving animals keep their order.
+        """
+        c = Cell()
+        c.current_herbivores = [Herbivore(5, 20.0) for _ in range(6)]
+        c.current_carnivores = [Carnivore(5, 20.0) for _ in range(4)]
+        herbs = list(c.current_herbivores)
+        carns = list(c.current_carnivores)
+        draws = [0, 1, 0, 1, 1, 1, 1, 0, 1, 0]
+        c.rng = fixed_rng(np.array(draws))
+        c.death_in_cell()
+        assert c.rng.random.call_count == 1
+        assert c.current_herbivores == [herbs[1], herbs[3], herbs[4], herbs[5]]
+        assert c.current_carnivores == [carns[0], carns[2]]
+
     def test_weight_loss(self):
         """
         Testing if the weight_loss_cell method results in loss of weight. Does this by creating a
@@ -135,6 +169,22 @@ class TestLandscape:
             assert c.current_herbivores[i].weight < 10.0
             assert c.current_carnivores[i].weight < 10.0
 
+    def test_update_fitness_cell(self):
+        """
+        Testing that update_fitness_cell gives every animal in the cell the fitness it would get
+        from update_fitness after ageing and losing weight.
+        """
+        c = Cell()
+        c.current_herbivores = [Herbivore(2, 10.0) for _ in range(5)]
+        c.current_carnivores = [Carnivore(2, 10.0) for _ in range(5)]
+        c.age_animals()
+        c.weight_loss_cell()
+        c.update_fitness_cell()
+        for animal in c.current_herbivores + c.current_carnivores:
+            expected = type(animal)(animal.age, animal.weight).fitness
+            assert not animal.fitness_stale
+            assert animal.fitness == pytest.approx(expected)
+
     def test_feed_herbivore(self):
         """
         Asserting that feed_herbivore method only increases the weight of the herbivore if there is
@@ -154,13 +204,12 @@ class TestLandscape:
         for herb in c.current_herbivores:
             assert herb.weight - weight > 0
 
-    def test_feed_carnivore(self, mocker):
+    def test_feed_carnivore(self, fixed_rng):
         """
         Checks if the feed_carnivores result in the expected sorting of the herbivores and
         carnivores according to their fitness, and whether the carnivores eat the weakest herbivore.
         """
-        c = Cell()
-        mocker.patch("numpy.random.uniform", return_value=1)
+        c = Cell(fixed_rng(1))
         c.current_carnivores = [Carnivore(4, 8.0), Carnivore(2, 4.0), Carnivore(6, 12.0)]
         c.current_herbivores = [Herbivore(6, 30.0), Herbivore(2, 0.1), Herbivore(4, 40.0)]
         c.feed_carnivores()
@@ -170,6 +219,22 @@ class TestLandscape:
         assert c.current_herbivores[1].fitness < c.current_herbivores[2].fitness
         #assert len(c.current_herbivores) < 3
 
+    def test_feed_carnivore_kills(self, fixed_rng):
+        """
+        Checks that carnivores kill the weakest herbivores first, that each herbivore is killed
+        at most once, and that the surviving herbivores are still sorted by fitness.
+        """
+        c = Cell(fixed_rng(0))
+        c.current_herbivores = [Herbivore(50, 5.0 + i) for i in range(20)]
+        c.current_carnivores = [Carnivore(5, 40.0) for _ in range(2)]
+        weakest = sorted(c.current_herbivores, key=lambda herb: herb.fitness)
+        c.feed_carnivores()
+        n_killed = 20 - c.n_herbivores
+        assert n_killed > 0
+        assert c.current_herbivores == weakest[n_killed:]
+        for carn in c.current_carnivores:
+            assert carn.weight > 40.0
+
     @pytest.mark.parametrize('FerCells', [Lowland, Highland])
     def test_feed_all(self, FerCells):
         """
@@ -193,21 +258,6 @@ class TestLandscape:
         assert low.current_herbivores[0].age == 10
         assert low.current_herbivores[1].age == 3
 
-    def test_add_immigrants(self):
-        """
-        Tests that the add_immigrants method adds new animals to the current animals in the cell.
-        Starts by defining current_herbivores and current_carnivores, then checking if they increase
-        by the number of immigrants we add.
-        """
-        cell = Cell()
-        cell.current_carnivores = [Carnivore() for _ in range(10)]
-        cell.current_herbivores = [Herbivore() for _ in range(10)]
-        immigrants = [Herbivore(), Carnivore()]
-        cell.add_immigrants(immigrants)
-        assert cell.n_carnivores == 11 and cell.n_herbivores == 11
-        with pytest.raises(TypeError):
-            assert cell.add_immigrants((3, 2))
-
     def test_remove_emigrants(self):
         """
         Tests that remove_emigrants removes emigrating animals from the current animals in the cell-
@@ -223,41 +273,43 @@ class TestLandscape:
         with pytest.raises(TypeError):
             assert cell.remove_emigrants((2, 3))
 
-    def test_emigration(self, mocker):
+    def test_remove_emigrants_order(self):
         """
-        Testing that emigration method moves animals from one cell to another if the probability
-        test numpy.random.uniform is lower than the probability of moving, which should imply that
-        the emigration method should return True.
+        Tests that the animals staying in the cell keep their order after remove_emigrants.
         """
-        mocker.patch("numpy.random.uniform", return_value=0)
         cell = Cell()
+        cell.current_herbivores = [Herbivore() for _ in range(10)]
+        cell.current_carnivores = [Carnivore() for _ in range(10)]
+        herbs = list(cell.current_herbivores)
+        carns = list(cell.current_carnivores)
+        cell.remove_emigrants(herbs[::3] + carns[1::2])
+        assert cell.current_herbivores == [herb for i, herb in enumerate(herbs) if i % 3 != 0]
+        assert cell.current_carnivores == carns[::2]
+
+    def test_emigration(self, fixed_rng):
+        """
+        Testing that emigration gives every animal a destination among the adjacent cells if the
+        random number of the cell is lower than the probability of moving, and leaves the animals
+        in the cell, since moving them is left to the island.
+        """
+        cell = Cell(fixed_rng(0))
         adj_cells = [(10, 10), (10, 10), (10, 10), (10, 10)]
-        carn = Carnivore()
-        carn.has_migrated = False
-        cell.current_carnivores.append(carn)
-        herb = Herbivore()
-        herb.has_migrated = False
-        cell.current_herbivores.append(herb)
-        emigrants = cell.emigration(adj_cells)
-        assert isinstance(emigrants, dict)
-        assert emigrants[(10, 10)] == cell.current_carnivores + cell.current_herbivores
+        cell.current_carnivores.append(Carnivore())
+        cell.current_herbivores.extend([Herbivore(), Herbivore()])
+        herb_destinations, carn_destinations = cell.emigration(adj_cells)
+        assert herb_destinations == [(10, 10), (10, 10)]
+        assert carn_destinations == [(10, 10)]
+        assert cell.n_animals == (2, 1)
 
-    def test_emigration_exceptions(self):
+    def test_emigration_stay(self, fixed_rng):
         """
-        Asserting that emigration method throws exceptions according to the scenarios which are
-        expected to cause them.
+        Testing that animals stay, i.e get None as destination, if the random number of the cell is
+        higher than the probability of moving.
         """
-        cell = Cell()
-        with pytest.raises(TypeError):
-            assert cell.emigration({'1337': 1337})
-        with pytest.raises(ValueError):
-            assert cell.emigration([(1, 1)])
-        with pytest.raises(TypeError):
-            assert cell.emigration([[1], [2], [3], [4]])
-        with pytest.raises(ValueError):
-            assert cell.emigration([(1, 1, 1), (1, 1, 1), (1, 1, 1), (1, 1, 1)])
-        with pytest.raises(TypeError):
-            assert cell.emigration([(0.5, 0.5), (0.5, 0.5), (0.5, 0.5), (0.5, 0.5)])
+        cell = Cell(fixed_rng(1))
+        cell.current_carnivores.append(Carnivore())
+        cell.current_herbivores.append(Herbivore())
+        assert cell.emigration([(1, 2), (3, 2), (2, 3), (2, 1)]) == ([None], [None])
 
     def test_set_params(self):
         """
@@ -0,0 +1,131 @@
+from biosim.movie import FFmpegWriter, FrameArchiveWriter, open_movie_writer
+from biosim.simulation import BioSim
+import os
+import sys
+import textwrap
+import numpy as np
+import pytest
+
+__author__ = 'Haris Karovic', 'Isak Finnøy'
+__email__ = 'harkarov@nmbu.no', 'isfi@nmbu.no'
+
+
+def frames(n_frames, height=4, width=6):
+    """
+    RGBA frames with different content.
+    """
+    rng = np.random.RandomState(1)
+    return [rng.randint(0, 256, (height, width, 4)).astype(np.uint8) for _ in range(n_frames)]
+
+
+@pytest.fixture
+def fake_ffmpeg(tmpdir):
+    """
+    Program that stands in for ffmpeg. It copies the standard input to the output file, which
+    is the last argument, writes the other arguments next to it, and fails if the output file
+    name contains 'fail'.
+    """
+    script = tmpdir.join('ffmpeg')
+    script.write(textwrap.dedent("""\
+        #!{}
+        import sys
+        output = sys.argv[-1]
+        with open(output + '.args', 'w') as args:
+            args.write(' '.join(sys.argv[1:]))
+        with open(output, 'wb') as movie:
+            movie.write(sys.stdin.buffer.read())
+        if 'fail' in output:
+            sys.stderr.write('could not encode')
+            sys.exit(1)
+        """.format(sys.executable)))
+    script.chmod(0o755)
+    return str(script)
+
+
+class TestMovie:
+    """
+    Tests for the movie writers.
+    """
+
+    def test_ffmpeg_writer(self, tmpdir, fake_ffmpeg):
+        """
+        Tests that the raw frames are piped to ffmpeg, with their size and format.
+        """
+        filename = str(tmpdir.join('movie.mp4'))
+        writer = FFmpegWriter(filename, fps=5, binary=fake_ffmpeg)
+        for frame in frames(3):
+            writer.write(frame)
+        writer.close()
+
+        with open(filename, 'rb') as movie:
+            assert movie.read() == b''.join(frame.tobytes() for frame in frames(3))
+        with open(filename + '.args') as args:
+            args = args.read().split()
+        assert args[args.index('-s') + 1] == '6x4'
+        assert args[args.index('-pix_fmt') + 1] == 'rgba'
+        assert args[args.index('-r') + 1] == '5'
+
+    def test_ffmpeg_failure(self, tmpdir, fake_ffmpeg):
+        """
+        Tests that a RuntimeError with the message of ffmpeg is raised if ffmpeg fails, that the
+        file with the messages is closed anyway, and that no more frames can be written, so ffmpeg
+        is not started again.
+        """
+        writer = FFmpegWriter(str(tmpdir.join('fail.mp4')), binary=fake_ffmpeg)
+        writer.write(frames(1)[0])
+        with pytest.raises(RuntimeError, match='could not encode'):
+            writer.close()
+        assert writer._errors.closed
+        with pytest.raises(RuntimeError, match='closed'):
+            writer.write(frames(1)[0])
+        writer.close()
+
+    def test_frame_archive(self, tmpdir):
+        """
+        Tests that the archive can be memory-mapped and holds the RGB part of every frame.
+        """
+        filename = str(tmpdir.join('movie.npy'))
+        writer = FrameArchiveWriter(filename)
+        for frame in frames(12):
+            writer.write(frame)
+        writer.close()
+
+        archive = np.load(filename, mmap_mode='r')
+        assert archive.shape == (12, 4, 6, 3)
+        assert np.array_equal(archive, np.array(frames(12))[..., :3])
+
+    def test_different_shapes(self, tmpdir):
+        """
+        Tests that frames of different shapes can not be written to one movie.
+        """
+        writer = FrameArchiveWriter(str(tmpdir.join('movie.npy')))
+        writer.write(frames(1)[0])
+        with pytest.raises(ValueError):
+            writer.write(frames(1, height=5)[0])
+        writer.close()
+
+    def test_fallback(self, tmpdir):
+        """
+        Tests that a frame archive is written when ffmpeg is not installed.
+        """
+        writer = open_movie_writer(str(tmpdir.join('movie.mp4')), binary='no-such-ffmpeg')
+        assert isinstance(writer, FrameArchiveWriter)
+        assert writer.filename == str(tmpdir.join('movie.npy'))
+
+    def test_record_movie(self, tmpdir, mocker):
+        """
+        Tests that a simulation recording a movie gives one frame per image year to the movie
+        writer and writes no image files.
+        """
+        mocker.patch('shutil.which', return_value=None)
+        sim = BioSim('WWW\nWLW\nWWW',
+                     [{'loc': (2, 2), 'pop': [{'species': 'Herbivore', 'age': 5, 'weight': 20}
+                                              for _ in range(10)]}],
+                     seed=1, img_base=str(tmpdir.join('bs')), offscreen=True)
+        sim.record_movie()
+        sim.simulate(num_years=4, vis_years=1, img_years=2)
+        filename = sim.make_movie()
+
+        assert filename == str(tmpdir.join('bs.npy'))
+        assert np.load(filename, mmap_mode='r').shape[0] == 2
+        assert sorted(os.listdir(str(tmpdir))) == ['bs.npy']
@@ -0,0 +1,116 @@
+from biosim.parallel import ParallelIsland
+import pytest
+
+__author__ = 'Haris Karovic', 'Isak Finnøy'
+__email__ = 'harkarov@nmbu.no', 'isfi@nmbu.no'
+
+band_map = """\
+WWWWWW
+WLLLLW
+WLHHLW
+WLLDLW
+WHHLLW
+WLLLLW
+WWWWWW"""
+
+
+def make_population(species, n):
+    """
+    n animals of one species in every habitable cell of band_map.
+    """
+    rows = band_map.splitlines()
+    return [{'loc': (y + 1, x + 1),
+             'pop': [{'species': species, 'age': 5, 'weight': 20.0} for _ in range(n)]}
+            for y, row in enumerate(rows) for x, code in enumerate(row) if code != 'W']
+
+
+@pytest.fixture
+def island():
+    """
+    ParallelIsland split into three bands, closed after the test.
+    """
+    parallel_island = ParallelIsland(band_map, make_population('Herbivore', 10), seed=1,
+                                     processes=3)
+    yield parallel_island
+    parallel_island.close()
+
+
+class TestParallelIsland:
+    """
+    Tests for the ParallelIsland class.
+    """
+
+    def test_bands(self, island):
+        """
+        Tests that the bands are whole rows that cover the map in order, with every cell owned by
+        exactly one band.
+        """
+        width = len(band_map.splitlines()[0])
+        assert len(island.bands) == 3
+        assert island.bands[0][0] == 0
+        assert island.bands[-1][1] == len(island.locations)
+        for (first, stop), (next_first, _) in zip(island.bands[:-1], island.bands[1:]):
+            assert stop == next_first
+            assert first % width == 0 and stop % width == 0
+        assert island.band_of_cell.tolist() == sorted(island.band_of_cell.tolist())
+
+    def test_map_without_cells(self, island):
+        """
+        Tests that the map of the main process holds the landscape classes, not cells, since the
+        animals live in the bands.
+        """
+        assert island.map[(1, 1)] is island.cell_types['W']
+        assert island.map[(3, 3)] is island.cell_types['H']
+        assert all(isinstance(cell_type, type) for cell_type in island.map.values())
+
+    def test_place_population(self, island):
+        """
+        Tests that placed animals end up in their cells, and that invalid animals raise the same
+        errors as the other islands.
+        """
+        assert island.num_animals_per_species == {'Herbivore': 10 * 20, 'Carnivore': 0}
+        assert island.animals_in_cells()[(3, 3)] == (10, 0)
+        with pytest.raises(ValueError):
+            island.place_population([{'loc': (2, 2), 'pop': [{'species': 'Herbivore',
+                                                              'age': -1, 'weight': 20}]}])
+        with pytest.raises(ValueError):
+            island.place_population([{'loc': (1, 1), 'pop': []}])
+
+    def test_migration_across_bands(self, island):
+        """
+        Tests that animals that migrate out of their band are handed to the band that owns their
+        new cell, and that no animal is lost.
+        """
+        before = island.animals_in_cells()
+        island.set_animal_parameters('Herbivore', {'mu': 100.0})
+        island.migration_island()
+        after = island.animals_in_cells()
+        assert sum(n for n, _ in after.values()) == sum(n for n, _ in before.values())
+        assert after != before
+        assert all(island.map[loc].migrate_to for loc, (n, _) in after.items() if n > 0)
+
+    def test_run_one_year(self, island):
+        """
+        Tests that a year can be run on all bands, and that the statistics agree with the counts.
+        """
+        island.place_population(make_population('Carnivore', 2))
+        for _ in range(3):
+            island.run_function_one_year()
+        counts = island.num_animals_per_species
+        assert island.year == 3
+        assert len(island.statistics()['Herbivore']['age']) == counts['Herbivore']
+        assert len(island.fitness_list()[1]) == counts['Carnivore']
+
+    def test_reproducible(self):
+        """
+        Tests that two islands made with the same seed give the same result.
+        """
+        results = []
+        for _ in range(2):
+            parallel_island = ParallelIsland(band_map, make_population('Herbivore', 10), seed=3,
+                                             processes=2)
+            for _ in range(3):
+                parallel_island.run_function_one_year()
+            results.append(parallel_island.animals_in_cells())
+            parallel_island.close()
+        assert results[0] == results[1]
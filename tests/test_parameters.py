@@ -0,0 +1,64 @@
+from biosim.parameters import HerbivoreParams, FodderParams
+from biosim.animals import Herbivore
+import pickle
+import pytest
+
+__author__ = 'Haris Karovic', 'Isak Finnøy'
+__email__ = 'harkarov@nmbu.no', 'isfi@nmbu.no'
+
+
+class TestParameters:
+    """
+    Tests for the frozen Parameters classes.
+    """
+
+    def test_access(self):
+        """
+        Tests that parameters can be read both as attributes and as items, and that they compare
+        equal to a dict with the same items.
+        """
+        params = FodderParams(f_max=800.0)
+        assert params.f_max == params['f_max'] == 800.0
+        assert params == {'f_max': 800.0}
+        assert dict(params) == {'f_max': 800.0}
+        assert params.get('omega', 0.0) == 0.0
+
+    def test_frozen(self):
+        """
+        Tests that parameters can not be changed, and that replace returns a changed copy.
+        """
+        params = FodderParams(f_max=800.0)
+        with pytest.raises(AttributeError):
+            params.f_max = 100.0
+        new_params = params.replace({'f_max': 100.0})
+        assert new_params.f_max == 100.0
+        assert params.f_max == 800.0
+
+    def test_invalid_names(self):
+        """
+        Tests that unknown and missing parameter names raise a KeyError.
+        """
+        with pytest.raises(KeyError):
+            FodderParams(f_max=800.0, omega=0.4)
+        with pytest.raises(KeyError):
+            HerbivoreParams(f_max=800.0)
+        with pytest.raises(KeyError):
+            FodderParams(f_max=800.0).replace({'omega': 0.4})
+
+    def test_pickle(self):
+        """
+        Tests that parameters survive pickling, so they can be sent to other processes.
+        """
+        params = Herbivore.params
+        assert pickle.loads(pickle.dumps(params)) == params
+
+    def test_with_params(self):
+        """
+        Tests that set_params on a subclass made by with_params leaves the species untouched.
+        """
+        omega = Herbivore.params.omega
+        Species = Herbivore.with_params()
+        Species.set_params({'omega': omega / 2})
+        assert Species.params.omega == omega / 2
+        assert Herbivore.params.omega == omega
+        assert isinstance(Species(5, 20.0), Herbivore)
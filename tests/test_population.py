@@ -0,0 +1,149 @@
+from biosim.animals import Herbivore, Carnivore
+from biosim.landscape import Lowland, Highland, Desert, Sea
+from biosim.population import Population
+import numpy as np
+import pytest
+
+__author__ = 'Haris Karovic', 'Isak Finnøy'
+__email__ = 'harkarov@nmbu.no', 'isfi@nmbu.no'
+
+
+@pytest.fixture
+def population():
+    """
+    Population on a one-dimensional strip of cells Sea, Lowland, Highland, Desert, Sea.
+    """
+    landscape = [Sea, Lowland, Highland, Desert, Sea]
+    neighbours = [[max(i - 1, 0), min(i + 1, 4), max(i - 1, 0), min(i + 1, 4)] for i in range(5)]
+    habitable = [cell_type.migrate_to for cell_type in landscape]
+    return Population(landscape, neighbours, habitable)
+
+
+class TestPopulation:
+    """
+    Tests that the batched array operations of Population follow the rules of the object model.
+    """
+
+    def test_place_animals(self, population):
+        """
+        Tests that place_animals adds the animals to the right cell, and that invalid input raises
+        the same errors as the Animals constructor.
+        """
+        population.place_animals(1, [{'species': 'Herbivore', 'age': 5, 'weight': 20}
+                                     for _ in range(10)])
+        population.place_animals(2, [{'species': 'Carnivore', 'age': 5, 'weight': 20}
+                                     for _ in range(3)])
+        herbivores, carnivores = population.counts()
+        assert len(population) == 13
+        assert herbivores.tolist() == [0, 10, 0, 0, 0]
+        assert carnivores.tolist() == [0, 0, 3, 0, 0]
+        with pytest.raises(TypeError, match='list_of_animals has to be of type list'):
+            population.place_animals(1, 'string')
+        with pytest.raises(ValueError):
+            population.place_animals(1, [{'species': 'Herbivore', 'age': -1, 'weight': 20}])
+
+    @pytest.mark.parametrize('Species', [Herbivore, Carnivore])
+    def test_fitness(self, population, Species):
+        """
+        Tests that the batched fitness equals the fitness of the corresponding animal objects.
+        """
+        ages = [0, 3, 10, 40]
+        weights = [0.0, 5.0, 20.0, 35.0]
+        population.place_animals(1, [{'species': Species.__name__, 'age': age, 'weight': weight}
+                                     for age, weight in zip(ages, weights)])
+        expected = [Species(age, weight).fitness for age, weight in zip(ages, weights)]
+        assert population.fitness == pytest.approx(expected)
+
+    def test_age_and_weight_loss(self, population):
+        """
+        Tests that age_animals and weight_loss give the same ages and weights as the object model.
+        """
+        population.place_animals(1, [{'species': 'Herbivore', 'age': 2, 'weight': 10.0},
+                                     {'species': 'Carnivore', 'age': 4, 'weight': 30.0}])
+        herb, carn = Herbivore(2, 10.0), Carnivore(4, 30.0)
+        for animal in herb, carn:
+            animal.update_age()
+            animal.yearly_weight_loss()
+        population.age_animals()
+        population.weight_loss()
+        assert population.age.tolist() == [3, 5]
+        assert population.weight == pytest.approx([herb.weight, carn.weight])
+        assert population.fitness == pytest.approx([herb.fitness, carn.fitness])
+
+    def test_feed_herbivores(self, population):
+        """
+        Tests that herbivores eat F each until the fodder in the cell runs out, and that herbivores
+        in cells without fodder do not eat.
+        """
+        n_herbs = 100
+        population.place_animals(1, [{'species': 'Herbivore', 'age': 5, 'weight': 10.0}
+                                     for _ in range(n_herbs)])
+        population.place_animals(3, [{'species': 'Herbivore', 'age': 5, 'weight': 10.0}])
+        population.feed_herbivores()
+
+        params = Herbivore.params
+        eaten = (population.weight - 10.0) / params['beta']
+        assert eaten[:n_herbs].sum() == pytest.approx(Lowland.params['f_max'])
+        assert eaten.max() == pytest.approx(params['F'])
+        assert eaten[n_herbs] == 0
+        assert population.fodder[1] == pytest.approx(0)
+        assert population.fodder[2] == Highland.params['f_max']
+
+    def test_feed_carnivores(self, fixed_rng, population):
+        """
+        Tests that a carnivore much fitter than the herbivores eats until it has eaten F.
+        """
+        population.rng = fixed_rng(0)
+        population.place_animals(1, [{'species': 'Herbivore', 'age': 50, 'weight': 20.0}
+                                     for _ in range(10)])
+        population.place_animals(1, [{'species': 'Carnivore', 'age': 5, 'weight': 40.0}])
+        population.feed_carnivores()
+        herbivores, carnivores = population.counts()
+        assert herbivores[1] == 10 - int(np.ceil(Carnivore.params['F'] / 20.0))
+        assert population.weight[population.species == 1][0] == \
+            pytest.approx(40.0 + Carnivore.params['beta'] * Carnivore.params['F'])
+
+    def test_birth_cycle(self, fixed_rng, population):
+        """
+        Tests that heavy animals give birth when the random draw is fixed at 0, and that a lone
+        animal never gives birth.
+        """
+        population.rng = fixed_rng(0)
+        population.place_animals(1, [{'species': 'Herbivore', 'age': 5, 'weight': 100.0}
+                                     for _ in range(2)])
+        population.place_animals(2, [{'species': 'Carnivore', 'age': 5, 'weight': 100.0}])
+        population.birth_cycle()
+        herbivores, carnivores = population.counts()
+        assert herbivores[1] == 4
+        assert carnivores[2] == 1
+        assert population.age[-2:].tolist() == [0, 0]
+        assert np.all(population.weight[:2] < 100.0)
+
+    def test_migration(self, fixed_rng, population):
+        """
+        Tests that animals only migrate to habitable cells, and only once a year.
+        """
+        population.rng = fixed_rng(0, zero_integers=True)
+        population.place_animals(1, [{'species': 'Herbivore', 'age': 5, 'weight': 20.0}])
+        population.place_animals(2, [{'species': 'Herbivore', 'age': 5, 'weight': 20.0}])
+        population.migration()
+        assert population.cell.tolist() == [1, 1]
+        assert population.counts()[0].tolist() == [0, 2, 0, 0, 0]
+        population.migration()
+        assert population.cell.tolist() == [1, 1]
+
+    def test_death(self, fixed_rng, population):
+        """
+        Tests that all animals die when the random draw is fixed at 0, and that animals without
+        weight die regardless.
+        """
+        population.place_animals(1, [{'species': 'Herbivore', 'age': 5, 'weight': 0.0}])
+        population.death()
+        assert len(population) == 0
+        assert population.counts()[0].tolist() == [0, 0, 0, 0, 0]
+
+        population.place_animals(1, [{'species': 'Herbivore', 'age': 5, 'weight': 20.0}
+                                     for _ in range(5)])
+        population.rng = fixed_rng(0)
+        population.death()
+        assert len(population) == 0
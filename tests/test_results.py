@@ -0,0 +1,63 @@
+from biosim.results import ResultsWriter, ResultsReader
+from biosim.simulation import BioSim
+import numpy as np
+import pytest
+
+__author__ = 'Haris Karovic', 'Isak Finnøy'
+__email__ = 'harkarov@nmbu.no', 'isfi@nmbu.no'
+
+
+class TestResults:
+    """
+    Tests for the streaming results writer and reader.
+    """
+
+    def test_write_and_read(self, tmpdir):
+        """
+        Tests that years written in several chunks are read back in order, that a range within
+        one chunk is memory-mapped, and that the writer keeps at most chunk_years years.
+        """
+        writer = ResultsWriter(str(tmpdir), (2, 3), chunk_years=4)
+        for year in range(1, 11):
+            writer.append(year, np.full((2, 3), year), np.ones((2, 3)))
+            assert writer._n_years < 4
+        writer.flush()
+
+        reader = ResultsReader(str(tmpdir))
+        assert reader.years.tolist() == list(range(1, 11))
+
+        results = reader.read(3, 6)
+        assert results['Year'].tolist() == [3, 4, 5, 6]
+        assert results['Herbivore'].tolist() == [18, 24, 30, 36]
+        assert results['Carnivore_cells'].shape == (4, 2, 3)
+
+        within_chunk = reader.read(5, 7)
+        assert isinstance(within_chunk['Herbivore_cells'], np.memmap)
+        assert reader.read(20)['Year'].tolist() == []
+
+    def test_empty_directory(self, tmpdir):
+        """
+        Tests that reading a directory without results raises a ValueError.
+        """
+        with pytest.raises(ValueError):
+            ResultsReader(str(tmpdir)).read()
+
+    def test_record_results(self, tmpdir):
+        """
+        Tests that a simulation that records its results writes the same totals as its history,
+        also over several calls to simulate.
+        """
+        sim = BioSim('WWWW\nWLHW\nWWWW',
+                     [{'loc': (2, 2), 'pop': [{'species': 'Herbivore', 'age': 5, 'weight': 20}
+                                              for _ in range(20)]}],
+                     seed=1, headless=True)
+        sim.record_results(str(tmpdir), chunk_years=3)
+        sim.simulate(5)
+        sim.simulate(2)
+
+        results = ResultsReader(str(tmpdir)).read()
+        assert results['Year'].tolist() == sim.history['Year']
+        assert results['Herbivore'].tolist() == sim.history['Herbivore']
+        herbivore_cells, carnivore_cells = sim.population_per_cell()
+        assert results['Herbivore_cells'][-1].tolist() == herbivore_cells.tolist()
+        assert herbivore_cells.shape == (3, 4)
@@ -0,0 +1,109 @@
+from biosim.rng import get_rng, seed_default_rng, spawn_generators, spawn_pools, get_states, \
+    set_states, RandomPool
+import json
+from biosim.island import Island
+import numpy as np
+import pytest
+
+__author__ = 'Haris Karovic', 'Isak Finnøy'
+__email__ = 'harkarov@nmbu.no', 'isfi@nmbu.no'
+
+small_map = """\
+WWWWWW
+WLWLLW
+WWWHLW
+WWWWWW"""
+
+
+class TestRng:
+    """
+    Tests for the random number streams in biosim.rng.
+    """
+
+    def test_default_rng(self):
+        """
+        Tests that get_rng returns the generator it is given, and that seeding the default
+        generator makes its draws reproducible.
+        """
+        rng = np.random.default_rng(1)
+        assert get_rng(rng) is rng
+        seed_default_rng(7)
+        first = get_rng().random(3)
+        seed_default_rng(7)
+        assert get_rng().random(3).tolist() == first.tolist()
+
+    def test_spawn_generators(self):
+        """
+        Tests that the streams spawned from the same seed are the same, that the streams of one
+        seed differ from each other, and that a second spawn gives new streams.
+        """
+        seed_sequence = np.random.SeedSequence(3)
+        draws = [rng.random() for rng in spawn_generators(seed_sequence, 3)]
+        again = [rng.random() for rng in spawn_generators(np.random.SeedSequence(3), 3)]
+        assert draws == again
+        assert len(set(draws)) == 3
+        assert [rng.random() for rng in spawn_generators(seed_sequence, 3)] != draws
+
+    def test_states(self):
+        """
+        Tests that restoring the states of some pools repeats their draws, also after the states
+        were stored as JSON, and that the number of states has to match the number of pools.
+        """
+        pools = spawn_pools(np.random.SeedSequence(5), 2, block_size=4)
+        for pool in pools:
+            pool.random(3)
+            pool.normal()
+        states = json.loads(json.dumps(get_states(pools)))
+        draws = [(pool.random(), pool.random(5).tolist(), pool.integers(0, 4)) for pool in pools]
+        set_states(pools, states)
+        assert [(pool.random(), pool.random(5).tolist(), pool.integers(0, 4))
+                for pool in pools] == draws
+        with pytest.raises(ValueError):
+            set_states(pools, states[:1])
+
+    @pytest.mark.parametrize('block_size', [1, 3, 1024])
+    def test_random_pool(self, block_size):
+        """
+        Tests that the uniform numbers of a pool are the numbers of its first generator in the
+        same order, whatever the size of the blocks and however many are taken at a time, and
+        that the other draws do not use them.
+        """
+        pool = RandomPool(np.random.SeedSequence(2), block_size)
+        uniforms, generator = spawn_generators(np.random.SeedSequence(2), 2)
+        drawn = [pool.random(), *pool.random(4), pool.normal(8.0, 1.5), *pool.random(2)]
+        assert drawn[:5] + drawn[6:] == uniforms.random(7).tolist()
+        assert drawn[5] == generator.normal(8.0, 1.5)
+
+    def test_pool_state_after_refills(self):
+        """
+        Tests that the state of a pool stays small when blocks are refilled with numbers left
+        over, so restoring it only draws the current block again, and that the restored pool
+        repeats the draws.
+        """
+        pool = RandomPool(np.random.SeedSequence(6), block_size=8)
+        for _ in range(500):
+            pool.random(5)
+            pool.random()
+            assert pool.state['block_length'] < 2 * pool.block_size
+        state = json.loads(json.dumps(pool.state))
+        draws = pool.random(20).tolist()
+        pool.state = state
+        assert pool.random(20).tolist() == draws
+
+    def test_island_cell_streams(self):
+        """
+        Tests that every cell of an island has its own stream, and that the stream of a cell only
+        depends on the seed, not on the animals in the other cells. The cell (2, 2) is surrounded
+        by water, so no animals can move in.
+        """
+        population = [{'loc': (2, 2), 'pop': [{'species': 'Herbivore', 'age': 5, 'weight': 20}
+                                               for _ in range(10)]}]
+        island = Island(small_map, population, seed=4)
+        crowded = Island(small_map, population + [
+            {'loc': (2, 4), 'pop': [{'species': 'Herbivore', 'age': 5, 'weight': 20}
+                                    for _ in range(10)]}], seed=4)
+        assert len({id(cell.rng) for cell in island.map.values()}) == len(island.map)
+        for _ in range(3):
+            island.run_function_one_year()
+            crowded.run_function_one_year()
+        assert island.map[(2, 2)].rng.random() == crowded.map[(2, 2)].rng.random()
@@ -0,0 +1,182 @@
+from biosim.simulation import BioSim
+from biosim.animals import Herbivore
+from biosim.landscape import Lowland
+import os
+import pickle
+import subprocess
+import sys
+import textwrap
+import threading
+import numpy as np
+import pytest
+
+__author__ = 'Haris Karovic', 'Isak Finnøy'
+__email__ = 'harkarov@nmbu.no', 'isfi@nmbu.no'
+
+small_map = """\
+WWWWW
+WLLHW
+WLDLW
+WWWWW"""
+
+small_population = [{'loc': (2, 2),
+                     'pop': [{'species': 'Herbivore', 'age': 5, 'weight': 20}
+                             for _ in range(50)]},
+                    {'loc': (2, 2),
+                     'pop': [{'species': 'Carnivore', 'age': 5, 'weight': 20}
+                             for _ in range(5)]}]
+
+
+class TestBioSim:
+    """
+    Tests for the BioSim class that go beyond the interface tests.
+    """
+
+    def test_invalid_backend(self):
+        """
+        Tests that an unknown backend raises a ValueError.
+        """
+        with pytest.raises(ValueError):
+            BioSim(small_map, small_population, seed=1, headless=True, backend='gpu')
+
+    @pytest.mark.parametrize('backend', ['objects', 'arrays', 'parallel'])
+    def test_headless_history(self, backend):
+        """
+        Tests that a headless simulation makes no graphics and records the number of animals per
+        species for every year.
+        """
+        sim = BioSim(small_map, small_population, seed=1, headless=True, backend=backend)
+        sim.simulate(num_years=5, vis_years=1, img_years=1)
+        assert sim.visualization is None
+        assert sim.history['Year'] == [1, 2, 3, 4, 5]
+        assert sim.history['Herbivore'][-1] == sim.num_animals_per_species['Herbivore']
+        assert sim.history['Carnivore'][-1] == sim.num_animals_per_species['Carnivore']
+        assert len(sim.statistics['Herbivore']['weight']) == sim.history['Herbivore'][-1]
+        with pytest.raises(RuntimeError):
+            sim.make_movie()
+
+    def test_headless_without_matplotlib(self):
+        """
+        Tests that a headless simulation never imports matplotlib or pandas, by running it in a
+        fresh interpreter.
+        """
+        code = textwrap.dedent("""
+            import sys
+            from biosim.simulation import BioSim
+            sim = BioSim('WWW\\nWLW\\nWWW',
+                         [{'loc': (2, 2), 'pop': [{'species': 'Herbivore', 'age': 5,
+                                                   'weight': 20}]}],
+                         seed=1, headless=True)
+            sim.simulate(3)
+            assert 'matplotlib' not in sys.modules
+            assert 'pandas' not in sys.modules
+            """)
+        repo_root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+        subprocess.run([sys.executable, '-c', code], check=True, cwd=repo_root)
+
+    def test_parameters_per_simulation(self):
+        """
+        Tests that parameters set on one simulation do not affect another simulation or the
+        default parameters, also when the simulations run at the same time in threads.
+        """
+        herb_params = dict(Herbivore.params)
+        sim_1 = BioSim(small_map, small_population, seed=1, headless=True)
+        sim_2 = BioSim(small_map, small_population, seed=1, headless=True, backend='arrays')
+        sim_1.set_animal_parameters('Herbivore', {'omega': 1.0})
+        sim_1.set_landscape_parameters('L', {'f_max': 0.0})
+
+        assert sim_1.params['Herbivore'].omega == 1.0
+        assert sim_2.params['Herbivore'] == herb_params
+        assert sim_2.params['L'].f_max == Lowland.params.f_max
+        assert Herbivore.params == herb_params
+
+        threads = [threading.Thread(target=sim.simulate, args=(5,)) for sim in (sim_1, sim_2)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        assert sim_1.year == sim_2.year == 5
+        assert sim_1.params['Herbivore'].omega == 1.0
+        assert Herbivore.params == herb_params
+
+    def test_pickle_animals_and_cells(self):
+        """
+        Tests that the animals and cells of a simulation with its own parameters can be pickled,
+        and that they keep those parameters.
+        """
+        sim = BioSim(small_map, small_population, seed=1, headless=True)
+        sim.set_animal_parameters('Herbivore', {'omega': 0.1})
+        sim.set_landscape_parameters('L', {'f_max': 100.0})
+        cell = sim.island.map[(2, 2)]
+
+        herbivores = pickle.loads(pickle.dumps(cell.current_herbivores))
+        assert [(h.age, h.weight) for h in herbivores] == \
+            [(h.age, h.weight) for h in cell.current_herbivores]
+        assert herbivores[0].params.omega == 0.1
+        assert type(herbivores[0]) is type(herbivores[1])
+        assert isinstance(herbivores[0], Herbivore)
+
+        restored = pickle.loads(pickle.dumps(cell))
+        assert isinstance(restored, Lowland)
+        assert restored.params.f_max == 100.0
+        assert restored.n_animals == cell.n_animals
+        assert type(restored.current_herbivores[0]) is restored.herbivore_class
+        assert restored.herbivore_class.params.omega == 0.1
+
+    def test_class_parameters(self, monkeypatch):
+        """
+        Tests that parameters set on the BioSim class become the defaults of the simulations made
+        afterwards, as before the parameters belonged to each simulation.
+        """
+        monkeypatch.setattr(Herbivore, 'params', Herbivore.params)
+        monkeypatch.setattr(Lowland, 'params', Lowland.params)
+        BioSim.set_animal_parameters('Herbivore', {'omega': 0.2})
+        BioSim.set_landscape_parameters('L', {'f_max': 500.0})
+        sim = BioSim(small_map, small_population, seed=1, headless=True)
+        assert sim.params['Herbivore'].omega == 0.2
+        assert sim.params['L'].f_max == 500.0
+        with pytest.raises(KeyError):
+            BioSim.set_animal_parameters('Omnivore', {'omega': 0.2})
+
+    @pytest.mark.parametrize('backend', ['objects', 'arrays', 'parallel'])
+    def test_checkpoint(self, tmpdir, backend):
+        """
+        Tests that a simulation continued from a checkpoint gives the same result as one that
+        never stopped, including parameters set on the simulation.
+        """
+        path = str(tmpdir.join('checkpoint.npz'))
+        sim = BioSim(small_map, small_population, seed=2, headless=True, backend=backend,
+                     processes=2)
+        sim.set_animal_parameters('Herbivore', {'zeta': 3.0})
+        sim.simulate(3)
+        sim.save_checkpoint(path)
+        sim.simulate(4)
+
+        resumed = BioSim.load_checkpoint(path, headless=True, processes=2)
+        assert resumed.year == 3
+        assert resumed.params['Herbivore'].zeta == 3.0
+        resumed.simulate(4)
+        assert resumed.history == sim.history
+        assert resumed.island.animals_in_cells() == sim.island.animals_in_cells()
+        assert resumed.statistics['Herbivore']['weight'] == \
+            pytest.approx(sim.statistics['Herbivore']['weight'])
+
+    @pytest.mark.parametrize('backend', ['objects', 'arrays', 'parallel'])
+    def test_population_per_cell(self, backend):
+        """
+        Tests that the per-cell counts kept by the island follow the animals through a few years,
+        and agree with animal_distribution.
+        """
+        sim = BioSim(small_map, small_population, seed=1, headless=True, backend=backend,
+                     processes=2)
+        sim.simulate(3)
+        herbivores, carnivores = sim.create_population_heatmap()
+        assert herbivores.shape == carnivores.shape == (4, 5)
+        assert herbivores.sum() == sim.num_animals_per_species['Herbivore']
+
+        animals = sim.island.get_animals()
+        expected = np.bincount(animals['cell'][animals['species'] == 1], minlength=20)
+        assert carnivores.ravel().tolist() == expected.tolist()
+
+        df = sim.animal_distribution
+        assert df.set_index(['Row', 'Col']).loc[(2, 3), 'Herbivore'] == herbivores[1, 2]
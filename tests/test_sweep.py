@@ -0,0 +1,73 @@
+from biosim.animals import Herbivore
+from biosim.landscape import Lowland
+from biosim.sweep import expand_grid, run_sweep
+import pytest
+
+__author__ = 'Haris Karovic', 'Isak Finnøy'
+__email__ = 'harkarov@nmbu.no', 'isfi@nmbu.no'
+
+sweep_map = """\
+WWWW
+WLHW
+WWWW"""
+
+sweep_population = [{'loc': (2, 2),
+                     'pop': [{'species': 'Herbivore', 'age': 5, 'weight': 20}
+                             for _ in range(20)]}]
+
+
+class TestSweep:
+    """
+    Tests for the parameter sweep runner.
+    """
+
+    def test_expand_grid(self):
+        """
+        Tests that expand_grid lists every combination of parameter values, and rejects
+        parameter names without a valid target or parameter.
+        """
+        configs = expand_grid({'Herbivore.zeta': [3.2, 3.5], 'L.f_max': [100, 200, 300]})
+        assert len(configs) == 6
+        assert {'Herbivore.zeta': 3.5, 'L.f_max': 200} in configs
+        with pytest.raises(KeyError):
+            expand_grid({'Dog.zeta': [1]})
+        with pytest.raises(KeyError):
+            expand_grid({'Herbivore.zetta': [1]})
+        with pytest.raises(KeyError):
+            expand_grid({'L.zeta': [1]})
+        with pytest.raises(TypeError):
+            expand_grid([('Herbivore.zeta', 1)])
+
+    def test_run_sweep(self):
+        """
+        Tests that run_sweep returns one row per run and year, that the result does not depend on
+        the number of processes, and that the parameters of the calling process are left untouched.
+        """
+        herb_params = dict(Herbivore.params)
+        low_params = dict(Lowland.params)
+        grid = {'L.f_max': [0.0, 800.0], 'Herbivore.omega': [0.4]}
+        table = run_sweep(sweep_map, sweep_population, grid, num_years=4, processes=2)
+
+        assert len(table) == 2 * 4
+        assert list(table.columns) == ['Run', 'Seed', 'L.f_max', 'Herbivore.omega', 'Year',
+                                       'Herbivore', 'Carnivore']
+        assert table.groupby('Run')['Year'].apply(list).tolist() == [[1, 2, 3, 4]] * 2
+        assert Herbivore.params == herb_params
+        assert Lowland.params == low_params
+
+        again = run_sweep(sweep_map, sweep_population, grid, num_years=4, processes=1)
+        assert again.equals(table)
+
+    def test_run_sweep_birth_weight(self):
+        """
+        Tests that animals placed without a weight get it from the parameters of the run. With a
+        birth weight of 0 and no fodder the herbivores never gain weight, and all die in the first
+        year.
+        """
+        population = [{'loc': (2, 2), 'pop': [{'species': 'Herbivore', 'age': 5, 'weight': None}
+                                              for _ in range(20)]}]
+        grid = {'Herbivore.w_birth': [0.0, 8.0], 'Herbivore.sigma_birth': [0.0],
+                'L.f_max': [0.0], 'H.f_max': [0.0]}
+        table = run_sweep(sweep_map, population, grid, num_years=1, processes=1)
+        assert table['Herbivore'].tolist()[0] == 0
+        assert table['Herbivore'].tolist()[1] > 0
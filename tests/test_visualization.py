@@ -0,0 +1,142 @@
+import matplotlib
+matplotlib.use('Agg')
+
+from biosim.visualization import Visualization
+import matplotlib.pyplot as plt
+import numpy as np
+import pytest
+
+__author__ = 'Haris Karovic', 'Isak Finnøy'
+__email__ = 'harkarov@nmbu.no', 'isfi@nmbu.no'
+
+
+@pytest.fixture
+def visualization():
+    """
+    Visualization with graphics set up for a small map, closed after the test.
+    """
+    vis = Visualization()
+    vis.graphics_setup(rgb_map=[[(0.0, 0.0, 1.0)] * 3] * 3)
+    yield vis
+    plt.close(vis.fig_win)
+
+
+class TestVisualization:
+    """
+    Tests for the Visualization class.
+    """
+
+    def test_line_graph(self, visualization):
+        """
+        Tests that the line graph keeps the same two lines, fed with every count so far, also
+        when more years are shown than were prepared for.
+        """
+        visualization.prepare_line_graph(final_year=4, years=2)
+        counts = np.zeros((2, 3, 3))
+        for step in range(6):
+            visualization.update_graphics(2, counts, {'Herbivore': 10 * step,
+                                                      'Carnivore': step})
+
+        assert visualization.linegraph_ax.get_lines() == [visualization.herbivore_line,
+                                                          visualization.carnivore_line]
+        years, herbivores = visualization.herbivore_line.get_data()
+        assert list(years) == [0, 2, 4, 6, 8, 10]
+        assert list(herbivores) == [0, 10, 20, 30, 40, 50]
+        assert list(visualization.current_carnivore_data) == [0, 1, 2, 3, 4, 5]
+        assert visualization.linegraph_ax.get_ylim()[1] >= 50
+        assert visualization.linegraph_ax.get_xlim()[1] >= 10
+
+    @pytest.mark.parametrize('hist_specs', [None, {'fitness': {'max': 1.0, 'delta': 0.05},
+                                                   'age': {'max': 60.0, 'delta': 2},
+                                                   'weight': {'max': 60, 'delta': 2}}])
+    def test_histograms(self, visualization, hist_specs):
+        """
+        Tests that the histograms keep the same two step artists every year, and that their
+        heights are the counts ax.hist would give.
+        """
+        rng = np.random.RandomState(1)
+        for _ in range(3):
+            values = {'fitness': rng.uniform(0, 1, 50), 'age': rng.uniform(0, 50, 50),
+                      'weight': rng.uniform(0, 50, 50)}
+            statistics = {'Herbivore': values, 'Carnivore': {key: value[:10]
+                                                             for key, value in values.items()}}
+            visualization.histogram_updates(statistics, hist_specs)
+
+        histogram = visualization.histograms['age']
+        assert len(visualization.age_ax.patches) == 2
+        heights = histogram.herbivore_steps.get_data().values
+        if hist_specs is None:
+            expected, _ = np.histogram(values['age'], bins=10)
+        else:
+            expected, _ = np.histogram(values['age'], bins=30, range=(0, 60))
+        assert heights.tolist() == expected.tolist()
+        assert visualization.age_ax.title.get_text() == 'Histogram of age'
+
+    def test_histogram_limits(self, visualization):
+        """
+        Tests that the limits of a histogram only grow, so they stay the same when the counts get
+        smaller, and that the y-limit is doubled when a count reaches above it.
+        """
+        specs = {'age': {'max': 60.0, 'delta': 2}}
+        values = np.full(30, 5.0)
+        for n_animals in (30, 20, 10):
+            statistics = {species: {'fitness': values[:n_animals], 'age': values[:n_animals],
+                                    'weight': values[:n_animals]}
+                          for species in ('Herbivore', 'Carnivore')}
+            visualization.histogram_updates(statistics, specs)
+            assert visualization.age_ax.get_ylim() == (0, 60)
+            assert visualization.age_ax.get_xlim() == (0, 60)
+            assert visualization.weight_ax.get_xlim()[0] <= 4.5
+            assert visualization.weight_ax.get_xlim()[1] >= 5.5
+
+    @pytest.mark.parametrize('offscreen', [True, False])
+    def test_render(self, offscreen, mocker):
+        """
+        Tests that every frame rendered with blitting is the same as the whole figure drawn by a
+        second Visualization given the same updates. Some frames only change the year text, or
+        only the limits of the line graph. Also tests that the off-screen canvas never calls
+        plt.pause.
+        """
+        pause = mocker.spy(plt, 'pause')
+        blitted, reference = Visualization(offscreen=offscreen), Visualization(offscreen=offscreen)
+        for vis in blitted, reference:
+            vis.graphics_setup(rgb_map=[[(0.0, 0.0, 1.0)] * 3] * 3)
+            vis.prepare_line_graph(final_year=8, years=1)
+
+        rng = np.random.RandomState(1)
+        changes = ['all', 'all', 'text', 'ylim', 'all', 'text', 'ylim', 'all']
+        for step, change in enumerate(changes):
+            counts = rng.randint(0, 50, (2, 3, 3))
+            values = {'fitness': rng.uniform(0, 1, 50), 'age': rng.uniform(0, 50, 50),
+                      'weight': rng.uniform(0, 50, 50)}
+            for vis in blitted, reference:
+                if change == 'ylim':
+                    vis.linegraph_ax.set_ylim(0, 1000 * step)
+                    continue
+                vis.changing_text.set_text('Year:' + str(10 ** step))
+                if change == 'all':
+                    vis.update_graphics(1, counts, {'Herbivore': 100 * step ** 2,
+                                                    'Carnivore': step})
+                    vis.histogram_updates({'Herbivore': values, 'Carnivore': values})
+
+            frame = blitted.render()
+            reference.fig_win.canvas.draw()
+            assert np.array_equal(frame, np.asarray(reference.fig_win.canvas.buffer_rgba())), \
+                'frame {} differs after changing {}'.format(step, change)
+
+        assert (pause.call_count == 0) == offscreen
+        plt.close(blitted.fig_win)
+        plt.close(reference.fig_win)
+
+    def test_save_frame(self, tmpdir):
+        """
+        Tests that a frame is written as an image of the whole figure.
+        """
+        vis = Visualization(offscreen=True)
+        vis.graphics_setup(rgb_map=[[(0.0, 0.0, 1.0)] * 3] * 3)
+        vis.update_graphics(1, np.ones((2, 3, 3)), {'Herbivore': 1, 'Carnivore': 1})
+        filename = str(tmpdir.join('frame.png'))
+        vis.save_frame(filename)
+
+        width, height = vis.fig_win.canvas.get_width_height()
+        assert plt.imread(filename).shape == (height, width, 4)